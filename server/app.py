@@ -9,10 +9,11 @@ app = Flask(__name__,
 app.config.from_object(Config)
 
 # Import routes after app creation to avoid circular imports
-from server.routes import game_routes
+from server.routes import game_routes, metrics_routes
 
 # Register blueprints
 app.register_blueprint(game_routes.bp)
+app.register_blueprint(metrics_routes.bp)
 
 @app.route('/')
 def index():
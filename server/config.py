@@ -10,10 +10,77 @@ class Config:
     # Game settings
     DEFAULT_MAP_WIDTH = 30
     DEFAULT_MAP_HEIGHT = 20
-    MAX_MAP_SIZE = 50
+    MAX_MAP_SIZE = 400
+
+    # Terrain generator for new maps: 'noise' (needs NumPy) or 'legacy'
+    TERRAIN_GENERATOR = 'noise'
+
+    # Side length (in hexes) of map chunks served by /map/tiles, and the most
+    # chunks one request may ask for
+    MAP_CHUNK_SIZE = 16
+    MAX_TILE_CHUNKS = 64
+
+    # Side length (in hexes) of spatial index buckets
+    SPATIAL_BUCKET_SIZE = 8
+
+    # Number of committed state versions kept for delta responses
+    STATE_JOURNAL_LENGTH = 256
+
+    # Commands per game that /undo can take back (redo is bounded by the undos)
+    UNDO_DEPTH = 32
+
+    # Most commands one /commands batch may carry
+    MAX_BATCH_COMMANDS = 256
+
+    # Recent events kept per game for /events reconnects, and the seconds an
+    # idle event stream waits before sending a keep-alive comment
+    EVENT_BUFFER_LENGTH = 1024
+    EVENT_KEEPALIVE_SECONDS = 15
+
+    # Distinct (attacker, health, defender, health, terrain) matchups kept in
+    # the combat odds cache
+    COMBAT_ODDS_CACHE_SIZE = 65536
+
+    # AI turns: worker threads for background turns, finished jobs kept for
+    # result lookups, and the seconds an AI turn may take (None: no limit)
+    AI_WORKERS = 4
+    AI_JOB_RETENTION = 256
+    AI_TURN_TIME_BUDGET = 5.0
+
+    # AI opponent of new games: 'rules' (greedy rule set) or 'mcts'
+    AI_OPPONENT = 'rules'
+
+    # Whether new games hide what a player's units and cities do not see
+    FOG_OF_WAR = True
+
+    # MCTS opponent: thinking seconds per turn (capped by the turn budget),
+    # rollout processes (0 searches in the calling thread), full turns
+    # played out by each rollout, and moves considered per unit
+    MCTS_TURN_SECONDS = 2.0
+    MCTS_WORKERS = 4
+    MCTS_ROLLOUT_TURNS = 2
+    MCTS_MOVE_CANDIDATES = 6
 
     # Save directory
     SAVE_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'saves')
 
+    # Save file format ('json' or 'binary') and whether binary saves are compressed
+    SAVE_FORMAT = 'json'
+    SAVE_COMPRESSION = True
+
+    # Save catalog file (in SAVE_DIR) and the byte budget of the parsed save cache
+    SAVE_CATALOG_FILE = 'catalog.json'
+    SAVE_CACHE_BYTES = 32 * 1024 * 1024
+
+    # Game sessions: games kept in memory before idle ones are evicted to
+    # SAVE_DIR/SESSION_SAVE_SUBDIR
+    MAX_ACTIVE_GAMES = 200
+    SESSION_SAVE_SUBDIR = 'sessions'
+    SESSION_SAVE_FORMAT = 'binary'
+
+    # Journaled saves: command logs with a full snapshot every N commands
+    JOURNAL_DIR = os.path.join(SAVE_DIR, 'journals')
+    JOURNAL_SNAPSHOT_INTERVAL = 50
+
     # Ensure save directory exists
     os.makedirs(SAVE_DIR, exist_ok=True)
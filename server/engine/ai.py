@@ -0,0 +1,64 @@
+"""Pluggable AI opponents."""
+
+from abc import ABC, abstractmethod
+from typing import Callable, Dict, Optional
+
+from server.engine.jobs import TurnBudget
+
+class AIPlayer(ABC):
+    """Plays one player's turn of a game.
+
+    An AI acts on the game through its regular actions (moves, attacks,
+    production) while the player is current; end_turn() then passes the
+    turn on. What play_turn() returns is journaled with the end_turn so
+    that replaying the journal gives the same turn.
+    """
+
+    name = ''
+
+    @abstractmethod
+    def play_turn(self, game, player: str, budget: Optional[TurnBudget] = None,
+                  max_steps: Optional[int] = None) -> Dict:
+        """Play a turn.
+
+        Args:
+            game: GameController whose current player is player
+            player: Player to play for
+            budget: Time limit and cancellation for the turn
+            max_steps: Play at most this many units
+
+        Returns:
+            Replay record: 'ai_steps', the number of units played, and for
+            AIs whose choices do not follow from the game's RNG alone,
+            'ai_actions', the commands they applied in order.
+        """
+
+class RulesAI(AIPlayer):
+    """The built-in greedy rule set (see GameController._ai_turn())."""
+
+    name = 'rules'
+
+    def play_turn(self, game, player: str, budget: Optional[TurnBudget] = None,
+                  max_steps: Optional[int] = None) -> Dict:
+        return {'ai_steps': game._ai_turn(player, max_steps, budget)}
+
+def _mcts_ai() -> AIPlayer:
+    from server.engine.mcts import MCTSAI
+    return MCTSAI()
+
+# AI factories by name
+AI_PLAYERS: Dict[str, Callable[[], AIPlayer]] = {
+    'rules': RulesAI,
+    'mcts': _mcts_ai
+}
+
+_instances: Dict[str, AIPlayer] = {}
+
+def get_ai(name: str) -> AIPlayer:
+    """Get the shared instance of an AI by name."""
+    ai = _instances.get(name)
+    if ai is None:
+        if name not in AI_PLAYERS:
+            raise ValueError(f'Unknown AI: {name}')
+        ai = _instances.setdefault(name, AI_PLAYERS[name]())
+    return ai
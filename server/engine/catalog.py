@@ -0,0 +1,236 @@
+"""Save catalog and cache of parsed saves."""
+
+import io
+import json
+import os
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple, Union
+
+from server.engine.savefile import (BINARY_SAVE_EXTENSION, is_binary_save,
+                                    read_binary_stream)
+from server.config import Config
+
+SAVE_EXTENSIONS = ('.json', BINARY_SAVE_EXTENSION)
+
+# A parsed save: the JSON document, or the raw bytes of a binary save
+# (which parse into fresh objects cheaply, unlike a shared object graph)
+ParsedSave = Union[Dict, bytes]
+
+def read_save(filepath: str) -> ParsedSave:
+    """Read a save file from disk in its parsed (cacheable) form."""
+    if is_binary_save(filepath):
+        with open(filepath, 'rb') as f:
+            return f.read()
+    with open(filepath, 'r') as f:
+        return json.load(f)
+
+def summarize_save(parsed: ParsedSave) -> Dict:
+    """Get the catalog fields of a parsed save."""
+    if isinstance(parsed, bytes):
+        hex_map, units, cities, data = read_binary_stream(io.BytesIO(parsed))
+        width, height = hex_map.width, hex_map.height
+        unit_count, city_count = len(units), len(cities)
+    else:
+        data = parsed
+        width, height = data['map']['width'], data['map']['height']
+        unit_count, city_count = len(data['units']), len(data['cities'])
+
+    return {
+        'turn': data['turn'],
+        'players': sorted(data['resources']),
+        'current_player': data['current_player'],
+        'width': width,
+        'height': height,
+        'units': unit_count,
+        'cities': city_count,
+        'game_over': data['game_over'],
+        'winner': data.get('winner')
+    }
+
+class SaveCatalog:
+    """Index of the saves in the save directory.
+
+    Summaries are kept in ``catalog.json`` so the load screen can list and
+    filter saves without opening them. Saves written through save_game()
+    are recorded as they are written; refresh() picks up files added,
+    changed or deleted behind the catalog's back by comparing each file's
+    size and modification time, and only opens those.
+    """
+
+    def __init__(self, save_dir: str = Config.SAVE_DIR,
+                 filename: str = Config.SAVE_CATALOG_FILE):
+        self.save_dir = save_dir
+        self.path = os.path.join(save_dir, filename)
+        self._entries: Optional[Dict[str, Dict]] = None
+        self._lock = threading.Lock()
+
+    def _load(self) -> Dict[str, Dict]:
+        """Read the catalog file on first use."""
+        if self._entries is None:
+            self._entries = {}
+            if os.path.exists(self.path):
+                try:
+                    with open(self.path, 'r') as f:
+                        self._entries = json.load(f)
+                except ValueError:
+                    pass  # rebuilt by the next refresh()
+        return self._entries
+
+    def _write(self):
+        """Write the catalog file atomically."""
+        temp_path = self.path + '.tmp'
+        with open(temp_path, 'w') as f:
+            json.dump(self._entries, f, separators=(',', ':'))
+        os.replace(temp_path, self.path)
+
+    def _entry(self, filename: str, summary: Dict) -> Dict:
+        """Build a catalog entry from a save summary and the file's stats."""
+        stat = os.stat(os.path.join(self.save_dir, filename))
+        return {
+            'filename': filename,
+            'format': 'binary' if filename.endswith(BINARY_SAVE_EXTENSION) else 'json',
+            **summary,
+            'size': stat.st_size,
+            'mtime_ns': stat.st_mtime_ns,
+            'saved_at': datetime.fromtimestamp(stat.st_mtime).isoformat(timespec='seconds')
+        }
+
+    def record(self, filepath: str, summary: Dict):
+        """Add or update the entry of a save that was just written."""
+        filename = os.path.relpath(filepath, self.save_dir)
+        with self._lock:
+            self._load()[filename] = self._entry(filename, summary)
+            self._write()
+
+    def refresh(self):
+        """Bring the catalog in line with the files in the save directory."""
+        with self._lock:
+            entries = self._load()
+            changed = False
+            seen = set()
+
+            for filename in os.listdir(self.save_dir):
+                path = os.path.join(self.save_dir, filename)
+                if (filename == os.path.basename(self.path) or
+                        not filename.endswith(SAVE_EXTENSIONS) or not os.path.isfile(path)):
+                    continue
+                seen.add(filename)
+
+                stat = os.stat(path)
+                entry = entries.get(filename)
+                if entry and entry['size'] == stat.st_size and entry['mtime_ns'] == stat.st_mtime_ns:
+                    continue
+
+                try:
+                    entries[filename] = self._entry(filename, summarize_save(read_save(path)))
+                except (OSError, ValueError, KeyError):
+                    entries.pop(filename, None)  # not a readable save
+                changed = True
+
+            for filename in [name for name in entries if name not in seen]:
+                del entries[filename]
+                changed = True
+
+            if changed:
+                self._write()
+
+    def list(self, player: Optional[str] = None, winner: Optional[str] = None,
+             game_over: Optional[bool] = None, min_turn: Optional[int] = None,
+             max_turn: Optional[int] = None, width: Optional[int] = None,
+             height: Optional[int] = None, limit: Optional[int] = None) -> List[Dict]:
+        """List saves, newest first, optionally filtered.
+
+        Args:
+            player: Only saves this player takes part in
+            winner: Only saves won by this player
+            game_over: Only finished (True) or unfinished (False) games
+            min_turn: Only saves at or after this turn
+            max_turn: Only saves at or before this turn
+            width: Only saves with this map width
+            height: Only saves with this map height
+            limit: Return at most this many saves
+        """
+        self.refresh()
+
+        with self._lock:
+            entries = list(self._entries.values())
+
+        results = [entry for entry in entries
+                   if (player is None or player in entry['players'])
+                   and (winner is None or entry['winner'] == winner)
+                   and (game_over is None or entry['game_over'] == game_over)
+                   and (min_turn is None or entry['turn'] >= min_turn)
+                   and (max_turn is None or entry['turn'] <= max_turn)
+                   and (width is None or entry['width'] == width)
+                   and (height is None or entry['height'] == height)]
+        results.sort(key=lambda entry: (entry['mtime_ns'], entry['filename']), reverse=True)
+        return results[:limit] if limit is not None else results
+
+class SaveCache:
+    """Size-bounded LRU cache of parsed save files.
+
+    Entries are keyed by path and checked against the file's size and
+    modification time on every hit, so a rewritten save is never served
+    stale; save_game() also invalidates its file directly. The budget is
+    in bytes of save file, which bounds memory proportionally (a parsed
+    JSON document is several times larger than its file).
+    """
+
+    def __init__(self, max_bytes: int = Config.SAVE_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self.total_bytes = 0
+        # path -> (size, mtime_ns, parsed)
+        self._entries: 'OrderedDict[str, Tuple[int, int, ParsedSave]]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, filepath: str) -> ParsedSave:
+        """Get a parsed save, reading it from disk on a miss."""
+        filepath = os.path.abspath(filepath)
+        try:
+            stat = os.stat(filepath)
+        except OSError:
+            self.invalidate(filepath)
+            raise
+
+        with self._lock:
+            entry = self._entries.get(filepath)
+            if entry is not None and entry[:2] == (stat.st_size, stat.st_mtime_ns):
+                self._entries.move_to_end(filepath)
+                return entry[2]
+
+        parsed = read_save(filepath)
+
+        with self._lock:
+            self._pop(filepath)
+            if stat.st_size <= self.max_bytes:
+                self._entries[filepath] = (stat.st_size, stat.st_mtime_ns, parsed)
+                self.total_bytes += stat.st_size
+                while self.total_bytes > self.max_bytes:
+                    self.total_bytes -= self._entries.popitem(last=False)[1][0]
+
+        return parsed
+
+    def invalidate(self, filepath: str):
+        """Drop a save from the cache (after it was rewritten or deleted)."""
+        with self._lock:
+            self._pop(os.path.abspath(filepath))
+
+    def _pop(self, filepath: str):
+        entry = self._entries.pop(filepath, None)
+        if entry is not None:
+            self.total_bytes -= entry[0]
+
+    def clear(self):
+        """Drop every cached save."""
+        with self._lock:
+            self._entries.clear()
+            self.total_bytes = 0
+
+# Shared by every game in the process
+save_catalog = SaveCatalog()
+save_cache = SaveCache()
@@ -1,37 +1,53 @@
 """Combat resolution system."""
 
 import random
-from typing import Dict, Optional
+from dataclasses import dataclass, asdict
+from functools import lru_cache
+from typing import Dict, Optional, Tuple
 from server.models.unit import Unit, UNIT_STATS
+from server.config import Config
 
-def resolve_combat(attacker: Unit, defender: Unit, terrain_modifier: int = 0) -> Dict:
+DICE_FACES = range(1, 7)
+
+def combat_strengths(attacker_type: str, attacker_health: int, defender_type: str,
+                     defender_health: int, terrain_modifier: int = 0) -> Tuple[float, float]:
+    """Get attack and defense strength before the dice, scaled by health."""
+    attacker_stats = UNIT_STATS[attacker_type]
+    defender_stats = UNIT_STATS[defender_type]
+
+    attack_power = attacker_stats['attack'] * (attacker_health / attacker_stats['max_health'])
+    defense_power = (defender_stats['defense'] + terrain_modifier) * (defender_health / defender_stats['max_health'])
+    return attack_power, defense_power
+
+def combat_damage(attack_power: float, defense_power: float) -> Tuple[int, int]:
+    """Get (damage to defender, damage to attacker) for strengths including the dice."""
+    damage_to_defender = max(0, int(attack_power - defense_power / 2))
+    damage_to_attacker = max(0, int(defense_power / 2 - attack_power / 3))
+    return damage_to_defender, damage_to_attacker
+
+def resolve_combat(attacker: Unit, defender: Unit, terrain_modifier: int = 0,
+                   rng: Optional[random.Random] = None) -> Dict:
     """Resolve combat between two units.
 
     Args:
         attacker: Attacking unit
         defender: Defending unit
         terrain_modifier: Defense bonus from terrain
+        rng: Random source for the dice (defaults to the random module)
 
     Returns:
         Dictionary with combat results
     """
-    attacker_stats = attacker.get_stats()
-    defender_stats = defender.get_stats()
-
-    # Calculate effective strengths
-    attack_power = attacker_stats['attack'] * (attacker.health / attacker_stats['max_health'])
-    defense_power = (defender_stats['defense'] + terrain_modifier) * (defender.health / defender_stats['max_health'])
+    attack_power, defense_power = combat_strengths(
+        attacker.type, attacker.health, defender.type, defender.health, terrain_modifier)
 
     # Add random factor (dice roll)
-    attack_roll = random.randint(1, 6)
-    defense_roll = random.randint(1, 6)
-
-    attack_power += attack_roll
-    defense_power += defense_roll
+    rng = rng or random
+    attack_roll = rng.randint(1, 6)
+    defense_roll = rng.randint(1, 6)
 
-    # Calculate damage
-    damage_to_defender = max(0, int(attack_power - defense_power / 2))
-    damage_to_attacker = max(0, int(defense_power / 2 - attack_power / 3))
+    damage_to_defender, damage_to_attacker = combat_damage(
+        attack_power + attack_roll, defense_power + defense_roll)
 
     # Apply damage
     defender.health = max(0, defender.health - damage_to_defender)
@@ -54,9 +70,88 @@ def resolve_combat(attacker: Unit, defender: Unit, terrain_modifier: int = 0) ->
 
     return result
 
-def can_attack(attacker: Unit, defender: Unit, distance: int) -> tuple[bool, str]:
+@dataclass(frozen=True)
+class CombatOdds:
+    """Exact outcome distribution of one attack over all 36 dice rolls.
+
+    Expected damage is health actually lost, i.e. capped at the unit's
+    remaining health.
+    """
+    expected_damage_to_defender: float
+    expected_damage_to_attacker: float
+    kill_probability: float  # defender destroyed
+    survival_probability: float  # attacker survives
+
+    def to_dict(self) -> dict:
+        """Convert to dictionary."""
+        return asdict(self)
+
+@lru_cache(maxsize=Config.COMBAT_ODDS_CACHE_SIZE)
+def combat_odds(attacker_type: str, attacker_health: int, defender_type: str,
+                defender_health: int, terrain_modifier: int = 0) -> CombatOdds:
+    """Compute the exact odds of an attack (cached per matchup).
+
+    Args:
+        attacker_type: Type of the attacking unit
+        attacker_health: Current health of the attacker
+        defender_type: Type of the defending unit
+        defender_health: Current health of the defender
+        terrain_modifier: Defense bonus from terrain
+    """
+    attack_power, defense_power = combat_strengths(
+        attacker_type, attacker_health, defender_type, defender_health, terrain_modifier)
+
+    damage_dealt = damage_taken = kills = survivals = 0
+    for attack_roll in DICE_FACES:
+        for defense_roll in DICE_FACES:
+            damage_to_defender, damage_to_attacker = combat_damage(
+                attack_power + attack_roll, defense_power + defense_roll)
+
+            damage_dealt += min(damage_to_defender, defender_health)
+            damage_taken += min(damage_to_attacker, attacker_health)
+            kills += damage_to_defender >= defender_health
+            survivals += damage_to_attacker < attacker_health
+
+    outcomes = len(DICE_FACES) ** 2
+    return CombatOdds(
+        expected_damage_to_defender=damage_dealt / outcomes,
+        expected_damage_to_attacker=damage_taken / outcomes,
+        kill_probability=kills / outcomes,
+        survival_probability=survivals / outcomes
+    )
+
+def unit_combat_odds(attacker: Unit, defender: Unit, terrain_modifier: int = 0) -> CombatOdds:
+    """Compute the exact odds of an attack between two units."""
+    return combat_odds(attacker.type, attacker.health, defender.type,
+                       defender.health, terrain_modifier)
+
+def attack_value(attacker: Unit, defender: Unit, terrain_modifier: int = 0) -> float:
+    """Score an attack as expected production cost destroyed minus lost.
+
+    Lost health counts as the matching fraction of a unit's cost and a
+    destroyed unit counts its full cost on top, so positive scores are
+    attacks worth making.
+    """
+    odds = unit_combat_odds(attacker, defender, terrain_modifier)
+    attacker_stats = attacker.get_stats()
+    defender_stats = defender.get_stats()
+
+    gained = defender_stats['cost'] * (odds.kill_probability +
+                                       odds.expected_damage_to_defender / defender_stats['max_health'])
+    lost = attacker_stats['cost'] * (1 - odds.survival_probability +
+                                     odds.expected_damage_to_attacker / attacker_stats['max_health'])
+    return gained - lost
+
+def can_attack(attacker: Unit, defender: Unit, distance: int, line_of_sight=None) -> tuple[bool, str]:
     """Check if attacker can attack defender.
 
+    Args:
+        attacker: Attacking unit
+        defender: Defending unit
+        distance: Hex distance between them
+        line_of_sight: LineOfSight of their map; ranged attacks (beyond
+            adjacent hexes) need a clear line. None skips the check.
+
     Returns:
         (can_attack, reason) tuple
     """
@@ -78,4 +173,8 @@ def can_attack(attacker: Unit, defender: Unit, distance: int) -> tuple[bool, str
     if distance > attack_range:
         return False, f"Target out of range (range: {attack_range}, distance: {distance})"
 
+    if distance > 1 and line_of_sight is not None and \
+            not line_of_sight.clear(attacker.position, defender.position):
+        return False, "No line of sight"
+
     return True, "OK"
@@ -0,0 +1,162 @@
+"""Typed game events for server-push clients."""
+
+import threading
+from collections import deque
+from typing import Dict, List, Optional, Tuple
+
+from server.config import Config
+
+# Event types
+UNIT_MOVED = 'unit_moved'
+COMBAT = 'combat'
+CITY_CAPTURED = 'city_captured'
+PRODUCTION_COMPLETED = 'production_completed'
+TURN_CHANGED = 'turn_changed'
+GAME_OVER = 'game_over'
+UNDO = 'undo'
+REDO = 'redo'
+
+# An event's position in the stream: (state version, number within version)
+EventPosition = Tuple[int, int]
+
+class GameEvent:
+    """One event, identified by the state version it was published with.
+
+    ``audience`` is the set of players allowed to see it under fog of war,
+    or None when everyone is.
+    """
+
+    __slots__ = ('version', 'number', 'type', 'data', 'audience')
+
+    def __init__(self, version: int, number: int, event_type: str, data: Dict,
+                 audience: Optional[frozenset] = None):
+        self.version = version
+        self.number = number
+        self.type = event_type
+        self.data = data
+        self.audience = audience
+
+    def visible_to(self, player: Optional[str]) -> bool:
+        """Check whether a player (None: an observer seeing everything) may see the event."""
+        return player is None or self.audience is None or player in self.audience
+
+    @property
+    def position(self) -> EventPosition:
+        return (self.version, self.number)
+
+    @property
+    def id(self) -> str:
+        """Event id as sent to clients (and returned in Last-Event-ID)."""
+        return f'{self.version}.{self.number}'
+
+    def to_dict(self) -> dict:
+        """Convert to dictionary."""
+        return {'id': self.id, 'type': self.type, 'version': self.version, **self.data}
+
+def parse_event_id(event_id: Optional[str]) -> Optional[EventPosition]:
+    """Parse an event id into its position, or None if missing or malformed."""
+    try:
+        version, number = event_id.split('.')
+        return (int(version), int(number))
+    except (AttributeError, ValueError):
+        return None
+
+class EventStream:
+    """Ring buffer of a game's recent events with blocking waits.
+
+    Events are staged while a command runs and only become visible when
+    the resulting state is published (flush()), so a client reacting to an
+    event always finds the matching state. Event ids are derived from state
+    versions, which survive save and load, so a client reconnecting after
+    its game was evicted and reloaded resumes where it left off; a client
+    that fell out of the buffer is told to reset instead.
+    """
+
+    def __init__(self, version: int = 0, length: int = Config.EVENT_BUFFER_LENGTH):
+        self._events: deque = deque(maxlen=length)
+        self._staged: deque = deque(maxlen=length)
+        self._staged_overflow = False
+        # Position of the last event dropped from the buffer (or not kept at all)
+        self._floor: EventPosition = (version, -1)
+        self._condition = threading.Condition()
+        self.closed = False
+
+    def stage(self, event_type: str, audience: Optional[frozenset] = None, **data):
+        """Queue an event for the next flush() (see GameEvent for audience)."""
+        if len(self._staged) == self._staged.maxlen:
+            self._staged_overflow = True
+        self._staged.append((event_type, audience, data))
+
+    def discard(self):
+        """Drop the staged events (the changes they describe were rolled back)."""
+        self._staged.clear()
+        self._staged_overflow = False
+
+    def flush(self, version: int):
+        """Publish staged events under the given state version and wake waiters."""
+        if not self._staged:
+            return
+
+        with self._condition:
+            if self._staged_overflow:
+                # Events of this version were lost before publication
+                self._floor = max(self._floor, (version, -1))
+                self._staged_overflow = False
+            first = 0
+            if self._events and self._events[-1].version == version:
+                first = self._events[-1].number + 1
+            for number, (event_type, audience, data) in enumerate(self._staged, first):
+                if len(self._events) == self._events.maxlen:
+                    self._floor = self._events[0].position
+                self._events.append(GameEvent(version, number, event_type, data, audience))
+            self._staged.clear()
+            self._condition.notify_all()
+
+    def last_position(self) -> EventPosition:
+        """Get the position of the newest published event."""
+        with self._condition:
+            return self._events[-1].position if self._events else self._floor
+
+    def since(self, position: EventPosition) -> Tuple[List[GameEvent], bool]:
+        """Get the events after position.
+
+        Returns:
+            (events, complete) tuple; complete is False when events after
+            position were already dropped, so the client must reload state.
+        """
+        with self._condition:
+            return ([event for event in self._events if event.position > position],
+                    position >= self._floor)
+
+    def wait(self, position: EventPosition, timeout: float) -> Tuple[List[GameEvent], bool]:
+        """Like since(), but block up to timeout seconds for new events."""
+        with self._condition:
+            if not self.closed and (not self._events or self._events[-1].position <= position):
+                self._condition.wait(timeout)
+        return self.since(position)
+
+    def close(self):
+        """Wake and end every waiting stream (the game left memory)."""
+        with self._condition:
+            self.closed = True
+            self._condition.notify_all()
+
+class NullEventStream:
+    """Event stream that drops everything, for games nobody subscribes to
+    (copies made by clone() for AI search)."""
+
+    closed = True
+
+    def stage(self, event_type: str, audience: Optional[frozenset] = None, **data):
+        pass
+
+    def discard(self):
+        pass
+
+    def flush(self, version: int):
+        pass
+
+    def close(self):
+        pass
+
+NULL_EVENTS = NullEventStream()
@@ -1,49 +1,280 @@
 """Main game controller."""
 
+import io
 import random
 import json
 import os
+import threading
+import time
+from array import array
+from collections import deque
 from typing import Dict, List, Optional, Tuple
 from datetime import datetime
 
-from server.engine.map import HexMap, TerrainType
+from server.engine.map import HexMap, TerrainType, WATER, PASSABLE_BY_UNIT, PASSABLE_ANYWHERE
 from server.models.unit import Unit, UNIT_STATS
 from server.models.city import City
-from server.engine.combat import resolve_combat, can_attack
-from server.utils.hex_utils import hex_distance, hex_neighbors
+from server.engine.combat import resolve_combat, can_attack, unit_combat_odds, attack_value
+from server.engine.snapshot import StateSnapshot
+from server.engine import events
+from server.engine.events import EventStream, NULL_EVENTS
+from server.engine.jobs import TurnBudget, STEP_LIMIT
+from server.engine.ai import get_ai
+from server.engine.undo import UndoEntry
+from server.engine.visibility import CITY_SIGHT, Visibility
+from server.engine.los import LineOfSight
+from server.engine.spatial import SpatialIndex
+from server.engine.pathfinding import ReachableSet, find_reachable, distance_field
+from server.engine.savefile import BINARY_SAVE_EXTENSION, read_binary_stream, write_binary_save
+from server.engine.catalog import read_save, save_cache, save_catalog
+from server.utils.hex_utils import hex_distance
+from server.utils.metrics import REGISTRY
 from server.config import Config
 
+# Commands apply_commands() accepts
+BATCH_OPS = ('move', 'attack', 'produce')
+
+# Engine metrics, recorded by live games only (not by the headless copies
+# searches and simulations play on)
+TURNS_ENDED = REGISTRY.counter('game_turns_total', 'Player turns ended')
+END_TURN_PHASE_SECONDS = REGISTRY.histogram(
+    'game_end_turn_phase_seconds', 'Time spent in each phase of end_turn()', ('phase',))
+COMBATS = REGISTRY.counter('game_combats_total', 'Combats resolved')
+AI_TURNS = REGISTRY.counter('game_ai_turns_total', 'AI turns played', ('opponent',))
+AI_UNITS_PLAYED = REGISTRY.counter('game_ai_units_played_total', 'Units played by the AI', ('opponent',))
+
 class GameController:
     """Main game state and logic controller."""
 
-    def __init__(self, width: int = 30, height: int = 20):
+    def __init__(self, width: int = 30, height: int = 20, seed: Optional[int] = None,
+                 ai_player: Optional[str] = 'player2', ai_opponent: str = Config.AI_OPPONENT,
+                 fog: bool = Config.FOG_OF_WAR):
+        """Start a new game.
+
+        Args:
+            width: Map width in hexes
+            height: Map height in hexes
+            seed: Seed for map generation, combat and AI choices
+            ai_player: Player run by the built-in AI when their turn starts,
+                or None when every player's turn is driven from outside
+            ai_opponent: Name of the AI playing ai_player (see server.engine.ai)
+            fog: Show each player only what their units and cities see
+        """
+        get_ai(ai_opponent)  # fail early on an unknown AI
+        self.rng = random.Random(seed)
+        self.ai_player = ai_player
+        self.ai_opponent = ai_opponent
+        self.fog = fog
         self.turn = 1
         self.current_player = 'player1'
-        self.map = HexMap(width, height)
+        self.map = HexMap(width, height, self.rng)
+        self.los = LineOfSight(self.map)
         self.units: Dict[str, Unit] = {}
         self.cities: Dict[str, City] = {}
+        # Units and cities this game may change in place (None: all of them)
+        self._owned_units: Optional[set] = None
+        self._owned_cities: Optional[set] = None
         self.resources = {'player1': 200, 'player2': 200}
         self.game_over = False
         self.winner: Optional[str] = None
 
         self._unit_counter = 0
         self._city_counter = 0
+        self._init_change_tracking()
+        self._init_undo()
+        self._build_spatial_indexes()
+        # unit_id -> ((position, movement, occupancy version), ReachableSet)
+        self._reachable_cache: Dict[str, tuple] = {}
+        # Command log the game appends to, if it was saved as a journal
+        self.journal = None
 
         # Initialize game
         self._place_starting_cities()
         self._place_starting_units()
+        self._changes.clear()
+        self._init_visibility()
+        self._init_concurrency()
+
+    def _init_change_tracking(self, version: int = 0):
+        """Reset the state version, the change journal and the chunk versions."""
+        self.version = version
+        self._changes: set = set()
+        self._journal: deque = deque(maxlen=Config.STATE_JOURNAL_LENGTH)
+        # Version at which each map chunk last changed
+        self.chunk_versions = array('i', [version]) * (self.map.chunks_x * self.map.chunks_y)
+
+    def _init_undo(self):
+        """Start with empty undo and redo histories (they are not saved)."""
+        self._undo_entries: deque = deque(maxlen=Config.UNDO_DEPTH)
+        # Journaled forms of the undone commands, most recently undone last
+        self._redo_commands: List[Dict] = []
+        # Entry recording the command being applied, if any
+        self._undo_entry: Optional[UndoEntry] = None
+
+    def _init_visibility(self):
+        """Work out what every player sees, if the game has fog of war.
+
+        From then on _commit_changes() keeps it up to date from the units
+        and cities each change touched.
+        """
+        self.visibility: Optional[Visibility] = None
+        if self.fog:
+            self.visibility = Visibility(self.map, self.resources)
+            for unit in self.units.values():
+                self.visibility.place(unit.id, unit.owner, unit.position, unit.get_stats().get('sight', 1))
+            for city in self.cities.values():
+                self.visibility.place(city.id, city.owner, city.position, CITY_SIGHT)
+            self.visibility.take_changes()
+            self.visibility.update_seen(self.units, self.units)
+
+    def default_viewer(self) -> Optional[str]:
+        """Get the player whose view clients get unless they ask for another.
+
+        That is the human player against the AI, or whoever is to move when
+        every player is human; None (everything is shown) without fog.
+        """
+        if not self.fog:
+            return None
+        if self.ai_player is None:
+            return self.current_player
+        return next((player for player in self.resources if player != self.ai_player), None)
+
+    def visible_unit(self, unit_id: str, player: Optional[str], own: bool = False) -> Optional[Unit]:
+        """Get a unit as far as a player may know of it.
+
+        Args:
+            unit_id: Unit to look up
+            player: Viewer; None sees every unit (games without fog)
+            own: Only the player's own units count
+
+        Returns:
+            The unit, or None when it does not exist, is not the player's
+            own (with own) or is an enemy unit out of the player's sight.
+        """
+        unit = self.units.get(unit_id)
+        if unit is None or player is None or unit.owner == player:
+            return unit
+        if own or self.visibility is None or not self.visibility.sees(player, unit.position):
+            return None
+        return unit
+
+    def _audience(self, players: Tuple[str, ...], *positions: Tuple[int, int]) -> Optional[frozenset]:
+        """Get who may see an event: the given players plus anyone seeing one
+        of the positions (None, everyone, without fog)."""
+        if self.visibility is None:
+            return None
+        return frozenset(players).union(self.visibility.seen_by(*positions))
+
+    def _init_concurrency(self):
+        """Create the writer lock and event stream and publish the initial snapshot.
+
+        Writers (moves, attacks, production, end of turn) hold ``lock`` and
+        call publish_snapshot() when done; readers use ``snapshot`` only.
+        Events staged by a write reach ``events`` subscribers on publication.
+        """
+        self.lock = threading.RLock()
+        self.snapshot: Optional[StateSnapshot] = None
+        self.events = EventStream(self.version)
+        self.record_metrics = True
+        self.publish_snapshot()
+
+    def _build_spatial_indexes(self):
+        """Index unit positions for within-radius queries (attack targets)."""
+        self.unit_index = SpatialIndex()
+
+        for unit in self.units.values():
+            self.unit_index.insert(unit.id, unit.position, unit.owner, unit.get_stats().get('domain'))
+
+    def _mark_changed(self, kind: str, key):
+        """Record that an entity ('unit', 'city', 'hex' or 'scalar') changed."""
+        self._changes.add((kind, key))
+
+    def _commit_changes(self) -> int:
+        """Close the pending change set under a new state version.
+
+        With fog of war, the sight of the units and cities that changed is
+        updated first; the hexes whose visibility flipped are recorded as
+        ('sight', (player, position)) changes and the units that came into
+        or went out of a player's sight as ('view', (player, unit_id)).
+        """
+        if self._changes:
+            if self.visibility is not None:
+                self._update_visibility()
+            self.version += 1
+            self._journal.append((self.version, frozenset(self._changes)))
+            for kind, key in self._changes:
+                if kind == 'hex':
+                    self.chunk_versions[self.map.chunk_of(key)] = self.version
+                elif kind == 'sight':
+                    self.chunk_versions[self.map.chunk_of(key[1])] = self.version
+            self._changes = set()
+        return self.version
+
+    def _update_visibility(self):
+        """Move the sight of the units and cities in the pending change set."""
+        visibility = self.visibility
+        unit_ids = set()
+        for kind, key in self._changes:
+            if kind == 'unit':
+                unit_ids.add(key)
+                unit = self.units.get(key)
+                if unit is None:
+                    visibility.remove(key)
+                else:
+                    visibility.place(key, unit.owner, unit.position, unit.get_stats().get('sight', 1))
+            elif kind == 'city':
+                city = self.cities.get(key)
+                if city is None:
+                    visibility.remove(key)
+                else:
+                    visibility.place(key, city.owner, city.position, CITY_SIGHT)
+
+        flipped = visibility.take_changes()
+        for player, position in flipped:
+            self._changes.add(('sight', (player, position)))
+            unit_id = self.map.unit_at(position)
+            if unit_id:
+                unit_ids.add(unit_id)
+        self._changes.update(('view', flip) for flip in visibility.update_seen(unit_ids, self.units))
+
+    def _writable_unit(self, unit_id: str) -> Optional[Unit]:
+        """Get a unit for changing it, copying it first if shared with a clone.
+
+        Every change to a unit goes through here (or _create_unit() or
+        _remove_unit()), which is where the undo entry of the command being
+        applied saves the unit's prior state.
+        """
+        unit = self.units.get(unit_id)
+        if self._undo_entry is not None and unit is not None:
+            self._undo_entry.save_unit(unit_id, unit)
+        owned = self._owned_units
+        if unit is not None and owned is not None and unit_id not in owned:
+            unit = self.units[unit_id] = unit.copy()
+            owned.add(unit_id)
+        return unit
+
+    def _writable_city(self, city_id: str) -> Optional[City]:
+        """Get a city for changing it, copying it first if shared with a clone."""
+        city = self.cities.get(city_id)
+        if self._undo_entry is not None and city is not None:
+            self._undo_entry.save_city(city_id, city)
+        owned = self._owned_cities
+        if city is not None and owned is not None and city_id not in owned:
+            city = self.cities[city_id] = city.copy()
+            owned.add(city_id)
+        return city
 
     def _place_starting_cities(self):
         """Place starting cities for both players."""
-        land_hexes = [pos for pos, hex_tile in self.map.hexes.items()
-                     if hex_tile.terrain == TerrainType.LAND]
+        land_indexes = self.map.indexes_with_terrain(TerrainType.LAND)
 
-        if len(land_hexes) < 4:
+        if len(land_indexes) < 4:
             # Fallback if not enough land
-            land_hexes = list(self.map.hexes.keys())[:4]
+            land_indexes = list(range(min(4, self.map.size)))
 
-        # Find positions far apart
-        random.shuffle(land_hexes)
+        # Pick distinct random hexes (without shuffling every land hex)
+        picked = self.rng.sample(land_indexes, min(4, len(land_indexes)))
+        land_hexes = [self.map.position_of(index) for index in picked]
 
         # Player 1 starting cities (2 cities)
         for i in range(2):
@@ -63,16 +294,15 @@ class GameController:
         for city in self.cities.values():
             if city.owner:
                 # Place 2 infantry near each city
-                neighbors = hex_neighbors(city.position)
+                neighbors = self.map.kernel.adjacent(self.map.index_of(city.position))
                 placed = 0
 
-                for neighbor_pos in neighbors:
+                for neighbor in neighbors:
                     if placed >= 2:
                         break
 
-                    hex_tile = self.map.get_hex(neighbor_pos)
-                    if hex_tile and hex_tile.terrain != TerrainType.WATER and not hex_tile.unit_id:
-                        self._create_unit('infantry', city.owner, neighbor_pos)
+                    if self.map.terrain[neighbor] != WATER and not self.map.unit_grid[neighbor]:
+                        self._create_unit('infantry', city.owner, self.map.position_of(neighbor))
                         placed += 1
 
     def _create_unit(self, unit_type: str, owner: str, position: Tuple[int, int]) -> Unit:
@@ -90,15 +320,30 @@ class GameController:
             movement_remaining=stats['movement']
         )
 
+        if self._undo_entry is not None:
+            self._undo_entry.save_unit(unit_id, None)
         self.units[unit_id] = unit
+        if self._owned_units is not None:
+            self._owned_units.add(unit_id)
+        self.unit_index.insert(unit_id, position, owner, stats.get('domain'))
+        self._mark_changed('unit', unit_id)
 
         # Place on map
-        hex_tile = self.map.get_hex(position)
-        if hex_tile:
-            hex_tile.unit_id = unit_id
+        if self.map.set_unit(position, unit_id):
+            self._mark_changed('hex', position)
 
         return unit
 
+    def _remove_unit(self, unit: Unit):
+        """Take a destroyed unit off the map."""
+        if self._undo_entry is not None:
+            self._undo_entry.save_unit_order(self.units)
+        if self.map.set_unit(unit.position, None):
+            self._mark_changed('hex', unit.position)
+        del self.units[unit.id]
+        self.unit_index.remove(unit.id)
+        self._reachable_cache.pop(unit.id, None)
+
     def _create_city(self, position: Tuple[int, int], owner: Optional[str], name: str):
         """Create a new city."""
         self._city_counter += 1
@@ -114,12 +359,225 @@ class GameController:
             production_progress=0
         )
 
+        if self._undo_entry is not None:
+            self._undo_entry.save_city(city_id, None)
         self.cities[city_id] = city
+        if self._owned_cities is not None:
+            self._owned_cities.add(city_id)
+        self._mark_changed('city', city_id)
 
         # Place on map
-        hex_tile = self.map.get_hex(position)
-        if hex_tile:
-            hex_tile.city_id = city_id
+        if self.map.set_city(position, city_id):
+            self._mark_changed('hex', position)
+
+    def apply_command(self, command: Dict, budget: Optional[TurnBudget] = None) -> Dict:
+        """Apply a player command and append it to the journal if it succeeds.
+
+        Commands are dictionaries with an ``op`` of 'move' (unit_id, target),
+        'attack' (attacker_id, defender_id), 'produce' (city_id, unit_type)
+        or 'end_turn' (optionally ai_steps or ai_actions). An end_turn is
+        journaled with the AI's replay record (the number of units it got
+        to play, and the commands it chose if those do not follow from the
+        RNG), so that replaying it gives the same result even if a time
+        budget cut the AI turn short.
+
+        An 'undo' takes back the last command (an end_turn together with
+        the AI turn it ran) and a 'redo' applies the last undone command
+        again; any other command clears the redo history.
+        """
+        op = command.get('op')
+        if op == 'undo':
+            result = self.undo()
+        elif op == 'redo':
+            result = self.redo()
+        else:
+            result, command = self._run_command(command, budget)
+            if result['success']:
+                self._redo_commands.clear()
+
+        if result['success'] and self.journal is not None:
+            self.journal.record(self, command)
+
+        return result
+
+    def apply_commands(self, commands: List[Dict], atomic: bool = True) -> Dict:
+        """Apply a batch of 'move', 'attack' and 'produce' commands in order.
+
+        The batch stops at the first command that fails. If atomic, the
+        commands before it are rolled back too (through their undo
+        entries, with their events dropped), so the batch applies entirely
+        or not at all; otherwise they stand. Applied commands are journaled
+        and can be undone one by one, like separately applied ones.
+
+        Returns:
+            Dictionary with 'success' (every command applied), 'applied'
+            (number of commands that took effect) and 'results', the result
+            of each command attempted.
+        """
+        undo_entries = list(self._undo_entries)
+        results = []
+        applied = []
+        entries = []
+
+        for command in commands:
+            try:
+                if command.get('op') not in BATCH_OPS:
+                    result = {'success': False, 'message': f"Command not allowed in a batch: {command.get('op')}"}
+                else:
+                    result, command = self._run_command(command)
+            except (AttributeError, KeyError, IndexError, TypeError):
+                result = {'success': False, 'message': 'Malformed command'}
+
+            results.append(result)
+            if not result['success']:
+                break
+            applied.append(command)
+            entries.append(self._undo_entries[-1])
+
+        if atomic and len(applied) < len(commands):
+            for entry in reversed(entries):
+                self._restore_undo_entry(entry)
+            self._undo_entries = deque(undo_entries, maxlen=Config.UNDO_DEPTH)
+            self.events.discard()
+            self._commit_changes()
+            applied = []
+
+        if applied:
+            self._redo_commands.clear()
+            if self.journal is not None:
+                for command in applied:
+                    self.journal.record(self, command)
+
+        return {'success': len(applied) == len(commands), 'applied': len(applied), 'results': results}
+
+    def _run_command(self, command: Dict, budget: Optional[TurnBudget] = None) -> Tuple[Dict, Dict]:
+        """Apply a command other than undo and redo, recording its undo entry.
+
+        Returns:
+            (result, command as journaled) tuple.
+        """
+        entry = self._undo_entry = UndoEntry(self, command)
+        try:
+            if command.get('op') == 'end_turn':
+                record = self.end_turn(command.get('ai_steps'), budget, command.get('ai_actions'))
+                result = {'success': True, 'message': 'Turn ended',
+                          'ai_steps': record['ai_steps'] if record else None}
+                if record:
+                    command = {**command, **record}
+            else:
+                result = self._apply_action(command)
+        finally:
+            self._undo_entry = None
+
+        if result['success']:
+            entry.command = command
+            self._undo_entries.append(entry)
+        return result, command
+
+    def undo(self) -> Dict:
+        """Take back the last command (see apply_command())."""
+        if not self._undo_entries:
+            return {'success': False, 'message': 'Nothing to undo'}
+
+        entry = self._undo_entries.pop()
+        self._restore_undo_entry(entry)
+        self._redo_commands.append(entry.command)
+        self.events.stage(events.UNDO, op=entry.command.get('op'))
+        self._commit_changes()
+
+        return {'success': True, 'message': f"Undid {entry.command.get('op')}", 'op': entry.command.get('op')}
+
+    def redo(self) -> Dict:
+        """Apply the last undone command again.
+
+        The undo restored the RNG along with everything else, and an
+        end_turn is redone from its AI replay record, so the redone command
+        has exactly the outcome it had before.
+        """
+        if not self._redo_commands:
+            return {'success': False, 'message': 'Nothing to redo'}
+
+        command = self._redo_commands.pop()
+        # The command was counted when first played
+        record_metrics = self.record_metrics
+        self.record_metrics = False
+        try:
+            result, _ = self._run_command(command)
+        finally:
+            self.record_metrics = record_metrics
+        if not result['success']:
+            self._redo_commands.append(command)
+            return result
+
+        self.events.stage(events.REDO, op=command.get('op'))
+        return {**result, 'op': command.get('op')}
+
+    def undo_status(self) -> Dict:
+        """Get how many commands can be undone and redone."""
+        return {'undo': len(self._undo_entries), 'redo': len(self._redo_commands)}
+
+    def _restore_undo_entry(self, entry: UndoEntry):
+        """Put back the units, cities, scalars and RNG an undo entry saved."""
+        units = self.units
+
+        # Lift the touched units off the map, then put back the ones that
+        # existed before (untouched units never share a hex with them)
+        for unit_id in entry.units:
+            unit = units.get(unit_id)
+            if unit is not None:
+                if self.map.set_unit(unit.position, None):
+                    self._mark_changed('hex', unit.position)
+                self.unit_index.remove(unit_id)
+                self._reachable_cache.pop(unit_id, None)
+
+        for unit_id, before in entry.units.items():
+            self._mark_changed('unit', unit_id)
+            if before is None:
+                units.pop(unit_id, None)
+                continue
+
+            units[unit_id] = before
+            if self._owned_units is not None:
+                self._owned_units.add(unit_id)
+            self.unit_index.insert(unit_id, before.position, before.owner, before.get_stats().get('domain'))
+            if self.map.set_unit(before.position, unit_id):
+                self._mark_changed('hex', before.position)
+
+        if entry.unit_order is not None:
+            self.units = {unit_id: units[unit_id] for unit_id in entry.unit_order if unit_id in units}
+
+        for city_id, before in entry.cities.items():
+            self._mark_changed('city', city_id)
+            if before is None:
+                city = self.cities.pop(city_id, None)
+                if city is not None:
+                    if self.map.set_city(city.position, None):
+                        self._mark_changed('hex', city.position)
+                continue
+
+            self.cities[city_id] = before
+            if self._owned_cities is not None:
+                self._owned_cities.add(city_id)
+
+        (self.turn, self.current_player, self.resources, self.game_over,
+         self.winner, self._unit_counter, self._city_counter) = entry.scalars
+        for name in ('turn', 'current_player', 'resources', 'game_over', 'winner'):
+            self._mark_changed('scalar', name)
+        version, internal, gauss = entry.rng_state
+        self.rng.setstate((version, tuple(internal), gauss))
+
+    def _apply_action(self, command: Dict) -> Dict:
+        """Apply a 'move', 'attack' or 'produce' command (see apply_command())."""
+        op = command.get('op')
+
+        if op == 'move':
+            target = command['target']
+            return self.move_unit(command['unit_id'], (target[0], target[1]))
+        if op == 'attack':
+            return self.attack(command['attacker_id'], command['defender_id'])
+        if op == 'produce':
+            return self.start_production(command['city_id'], command['unit_type'])
+        return {'success': False, 'message': f'Unknown command: {op}'}
 
     def move_unit(self, unit_id: str, target: Tuple[int, int]) -> Dict:
         """Move a unit to target position."""
@@ -135,8 +593,7 @@ class GameController:
             return {'success': False, 'message': 'No movement remaining'}
 
         # Check distance
-        distance = hex_distance(unit.position, target)
-        if distance > unit.movement_remaining:
+        if hex_distance(unit.position, target) > unit.movement_remaining:
             return {'success': False, 'message': 'Target too far'}
 
         # Check if target is passable
@@ -144,31 +601,66 @@ class GameController:
             return {'success': False, 'message': 'Cannot move there'}
 
         # Check if target is occupied
-        target_hex = self.map.get_hex(target)
-        if target_hex and target_hex.unit_id and target_hex.unit_id != unit_id:
+        occupant = self.map.unit_at(target)
+        if occupant and occupant != unit_id:
             return {'success': False, 'message': 'Hex occupied'}
 
+        # Check that a path exists around terrain and enemy units
+        distance = self.reachable(unit_id).cost_to(target)
+        if distance is None:
+            return {'success': False, 'message': 'No path to target'}
+
         # Remove from old position
-        old_hex = self.map.get_hex(unit.position)
-        if old_hex:
-            old_hex.unit_id = None
+        unit = self._writable_unit(unit_id)
+        if self.map.set_unit(unit.position, None):
+            self._mark_changed('hex', unit.position)
 
         # Move unit
+        origin = unit.position
         unit.position = target
         unit.movement_remaining -= distance
+        self.unit_index.move(unit_id, target)
+        self._mark_changed('unit', unit_id)
 
         # Place at new position
-        if target_hex:
-            target_hex.unit_id = unit_id
+        if self.map.set_unit(target, unit_id):
+            self._mark_changed('hex', target)
+
+        result = {'success': True, 'message': 'Unit moved'}
+        self.events.stage(events.UNIT_MOVED, self._audience((unit.owner,), origin, target),
+                          unit_id=unit_id, owner=unit.owner, origin=list(origin), target=list(target))
 
         # Check for city capture
-        if target_hex and target_hex.city_id:
-            city = self.cities.get(target_hex.city_id)
+        city_id = self.map.city_at(target)
+        if city_id:
+            city = self.cities.get(city_id)
             if city and city.owner != unit.owner and UNIT_STATS[unit.type].get('can_capture'):
+                city = self._writable_city(city_id)
+                previous_owner = city.owner
                 city.owner = unit.owner
-                return {'success': True, 'message': f'Captured {city.name}!', 'captured_city': city.id}
+                self._mark_changed('city', city.id)
+                self.events.stage(events.CITY_CAPTURED, city_id=city.id, owner=city.owner,
+                                  previous_owner=previous_owner, unit_id=unit_id)
+                result = {'success': True, 'message': f'Captured {city.name}!', 'captured_city': city.id}
+
+        self._commit_changes()
+        return result
+
+    def reachable(self, unit_id: str) -> Optional[ReachableSet]:
+        """Get the hexes a unit can move to, cached until occupancy changes."""
+        unit = self.units.get(unit_id)
+        if not unit:
+            return None
+
+        key = (unit.position, unit.movement_remaining, self.map.occupancy_version)
+        cached = self._reachable_cache.get(unit_id)
+        if cached and cached[0] == key:
+            return cached[1]
 
-        return {'success': True, 'message': 'Unit moved'}
+        reachable = find_reachable(self.map, unit.type, unit.owner, unit.position,
+                                   unit.movement_remaining, self.units)
+        self._reachable_cache[unit_id] = (key, reachable)
+        return reachable
 
     def attack(self, attacker_id: str, defender_id: str) -> Dict:
         """Attack another unit."""
@@ -182,7 +674,7 @@ class GameController:
             return {'success': False, 'message': 'Not your unit'}
 
         distance = hex_distance(attacker.position, defender.position)
-        can, reason = can_attack(attacker, defender, distance)
+        can, reason = can_attack(attacker, defender, distance, self.los)
 
         if not can:
             return {'success': False, 'message': reason}
@@ -191,21 +683,24 @@ class GameController:
         terrain_mod = self.map.get_defense_modifier(defender.position)
 
         # Resolve combat
-        result = resolve_combat(attacker, defender, terrain_mod)
+        attacker = self._writable_unit(attacker_id)
+        defender = self._writable_unit(defender_id)
+        result = resolve_combat(attacker, defender, terrain_mod, self.rng)
+        if self.record_metrics:
+            COMBATS.inc()
+        self.events.stage(events.COMBAT, **{key: value for key, value in result.items()
+                                            if key != 'success'})
+        self._mark_changed('unit', attacker_id)
+        self._mark_changed('unit', defender_id)
 
         # Remove destroyed units
         if defender.health <= 0:
-            defender_hex = self.map.get_hex(defender.position)
-            if defender_hex:
-                defender_hex.unit_id = None
-            del self.units[defender_id]
+            self._remove_unit(defender)
 
         if attacker.health <= 0:
-            attacker_hex = self.map.get_hex(attacker.position)
-            if attacker_hex:
-                attacker_hex.unit_id = None
-            del self.units[attacker_id]
+            self._remove_unit(attacker)
 
+        self._commit_changes()
         return result
 
     def start_production(self, city_id: str, unit_type: str) -> Dict:
@@ -221,95 +716,286 @@ class GameController:
         if unit_type not in UNIT_STATS:
             return {'success': False, 'message': 'Invalid unit type'}
 
-        city.start_production(unit_type)
+        self._writable_city(city_id).start_production(unit_type)
+        self._mark_changed('city', city_id)
+        self._commit_changes()
 
         return {'success': True, 'message': f'Started producing {unit_type}'}
 
-    def end_turn(self):
-        """End current player's turn."""
+    def attack_targets(self, unit_id: str) -> List[str]:
+        """Get the ids of enemy units the given unit can attack right now
+        (in range and, for ranged attacks, in line of sight)."""
+        unit = self.units.get(unit_id)
+        if not unit:
+            return []
+
+        attack_range = unit.get_stats().get('range', 1)
+        targets = []
+        for distance, target_id in self.unit_index.within(unit.position, attack_range,
+                                                          exclude_owner=unit.owner):
+            can, _ = can_attack(unit, self.units[target_id], distance, self.los)
+            if can:
+                targets.append(target_id)
+
+        return targets
+
+    def attack_preview(self, attacker_id: str, defender_id: str) -> Dict:
+        """Get the exact odds of an attack without making it."""
+        attacker = self.units.get(attacker_id)
+        defender = self.units.get(defender_id)
+
+        if not attacker or not defender:
+            return {'success': False, 'message': 'Unit not found'}
+
+        can, reason = can_attack(attacker, defender,
+                                 hex_distance(attacker.position, defender.position), self.los)
+        terrain_mod = self.map.get_defense_modifier(defender.position)
+
+        return {
+            'success': True,
+            'can_attack': can,
+            'message': reason,
+            'terrain_modifier': terrain_mod,
+            'odds': unit_combat_odds(attacker, defender, terrain_mod).to_dict()
+        }
+
+    def end_turn(self, ai_steps: Optional[int] = None, budget: Optional[TurnBudget] = None,
+                 ai_actions: Optional[List[Dict]] = None) -> Optional[Dict]:
+        """End current player's turn.
+
+        If the next player is the AI player, the AI plays its turn before
+        this returns.
+
+        Args:
+            ai_steps: Let the AI play at most this many units (for replay)
+            budget: Time limit and cancellation for the AI turn
+            ai_actions: Apply these AI commands instead of running the AI
+                (for replay)
+
+        Returns:
+            The AI's replay record (see AIPlayer.play_turn()), or None if
+            it did not move.
+        """
+        record = None
+        self._finish_turn()
+
+        if self.current_player == self.ai_player and not self.game_over:
+            started = time.perf_counter()
+            if ai_actions is not None:
+                for action in ai_actions:
+                    self._apply_action(action)
+                record = {'ai_steps': ai_steps, 'ai_actions': ai_actions}
+            else:
+                record = get_ai(self.ai_opponent).play_turn(self, self.ai_player, budget, ai_steps)
+            self._time_phase('ai', started)
+            if self.record_metrics:
+                AI_TURNS.labels(self.ai_opponent).inc()
+                AI_UNITS_PLAYED.labels(self.ai_opponent).inc(record.get('ai_steps') or 0)
+            self._finish_turn()
+
+        self._commit_changes()
+        return record
+
+    def _finish_turn(self):
+        """Run end-of-turn upkeep for the current player and pass the turn on."""
+        started = time.perf_counter()
+
         # Process production for current player's cities
         for city in self.cities.values():
             if city.owner == self.current_player:
+                city = self._writable_city(city.id)
                 completed_unit = city.advance_production()
+                self._mark_changed('city', city.id)
 
                 if completed_unit:
                     # Find empty neighbor to place unit
-                    neighbors = hex_neighbors(city.position)
-                    for neighbor in neighbors:
-                        hex_tile = self.map.get_hex(neighbor)
-                        if hex_tile and not hex_tile.unit_id and self.map.is_passable(neighbor, completed_unit):
-                            self._create_unit(completed_unit, city.owner, neighbor)
+                    unit = None
+                    passable = PASSABLE_BY_UNIT.get(completed_unit, PASSABLE_ANYWHERE)
+                    for neighbor in self.map.kernel.adjacent(self.map.index_of(city.position)):
+                        if passable[self.map.terrain[neighbor]] and not self.map.unit_grid[neighbor]:
+                            unit = self._create_unit(completed_unit, city.owner, self.map.position_of(neighbor))
                             break
 
+                    self.events.stage(events.PRODUCTION_COMPLETED, self._audience((city.owner,), city.position),
+                                      city_id=city.id, owner=city.owner, unit_type=completed_unit,
+                                      unit_id=unit.id if unit else None)
+
+        started = self._time_phase('production', started)
+
         # Generate resources
         player_cities = sum(1 for c in self.cities.values() if c.owner == self.current_player)
         self.resources[self.current_player] += player_cities * 10
+        self._mark_changed('scalar', 'resources')
+        started = self._time_phase('resources', started)
 
-        # Switch player
+        # Switch player; a new turn starts when player1 is up again
         if self.current_player == 'player1':
             self.current_player = 'player2'
-            # Simple AI turn
-            self._ai_turn()
-            self.current_player = 'player1'
-            self.turn += 1
         else:
             self.current_player = 'player1'
             self.turn += 1
+            self._mark_changed('scalar', 'turn')
+        self._mark_changed('scalar', 'current_player')
+        self.events.stage(events.TURN_CHANGED, turn=self.turn, current_player=self.current_player)
 
         # Reset units
-        for unit in self.units.values():
-            if unit.owner == self.current_player:
-                unit.reset_turn()
+        self._reset_units(self.current_player)
+        started = self._time_phase('reset', started)
 
         # Check victory
         self._check_victory()
+        self._time_phase('victory', started)
+        if self.record_metrics:
+            TURNS_ENDED.inc()
+
+    def _time_phase(self, phase: str, started: float) -> float:
+        """Record how long an end_turn() phase took (in live games).
+
+        Returns:
+            The time the phase ended, where the next one starts.
+        """
+        now = time.perf_counter()
+        if self.record_metrics:
+            END_TURN_PHASE_SECONDS.labels(phase).observe(now - started)
+        return now
+
+    def _reset_units(self, player: str):
+        """Restore movement and attacks of a player's units for their turn."""
+        for unit in self.units.values():
+            if unit.owner == player:
+                self._writable_unit(unit.id).reset_turn()
+                self._mark_changed('unit', unit.id)
+
+    def _ai_turn(self, player: str = 'player2', max_steps: Optional[int] = None,
+                 budget: Optional[TurnBudget] = None) -> int:
+        """Simple AI turn logic for the given player.
+
+        Units are played one at a time (a step each); the turn ends early
+        after max_steps steps or when the budget runs out.
 
-    def _ai_turn(self):
-        """Simple AI turn logic."""
+        Returns:
+            Number of steps played.
+        """
         # AI produces units
         for city in self.cities.values():
-            if city.owner == 'player2' and not city.current_production:
+            if city.owner == player and not city.current_production:
                 unit_types = ['infantry', 'tank', 'fighter']
-                city.start_production(random.choice(unit_types))
-
-        # AI moves and attacks
-        ai_units = [u for u in self.units.values() if u.owner == 'player2']
-
-        for unit in ai_units:
-            # Try to find enemy units to attack
-            enemy_units = [u for u in self.units.values() if u.owner == 'player1']
-
-            if enemy_units:
-                # Find closest enemy
-                closest = min(enemy_units, key=lambda e: hex_distance(unit.position, e.position))
-                distance = hex_distance(unit.position, closest.position)
-
-                # Try to attack if in range
-                if distance <= unit.get_stats().get('range', 1) and unit.can_attack():
-                    self.current_player = 'player2'
-                    self.attack(unit.id, closest.id)
-                    self.current_player = 'player1'
-                # Otherwise move closer
-                elif unit.can_move():
-                    # Simple movement towards enemy
-                    neighbors = hex_neighbors(unit.position)
-                    valid_moves = []
-
-                    for neighbor in neighbors:
-                        hex_tile = self.map.get_hex(neighbor)
-                        if hex_tile and not hex_tile.unit_id and self.map.is_passable(neighbor, unit.type):
-                            new_dist = hex_distance(neighbor, closest.position)
-                            if new_dist < distance:
-                                valid_moves.append(neighbor)
-
-                    if valid_moves:
-                        target = random.choice(valid_moves)
-                        self.current_player = 'player2'
-                        self.move_unit(unit.id, target)
-                        self.current_player = 'player1'
+                self._writable_city(city.id).start_production(self.rng.choice(unit_types))
+                self._mark_changed('city', city.id)
+
+        # AI moves and attacks, guided by distance fields shared by all units
+        fields: Dict[Tuple[str, bool], array] = {}
+        ai_units = [u.id for u in self.units.values() if u.owner == player]
+        steps = 0
+        if budget is not None:
+            budget.start(len(ai_units))
+
+        for unit_id in ai_units:
+            if max_steps is not None and steps >= max_steps:
+                if budget is not None:
+                    budget.stopped = STEP_LIMIT
+                break
+            if budget is not None and budget.exhausted():
+                break
+
+            steps += 1
+            if budget is not None:
+                budget.advance(steps)
+            unit = self.units.get(unit_id)
+            if unit is not None:
+                self._ai_play_unit(unit, fields)
+
+        return steps
+
+    def _ai_play_unit(self, unit: Unit, fields: Dict[Tuple[str, bool], array]):
+        """Play one AI unit: attack if worthwhile, else advance and then attack."""
+        if not self._ai_attack(unit) and unit.can_move():
+            field = self._ai_field(fields, unit)
+            target = self._descend_field(field, unit)
+
+            if target != unit.position:
+                self.move_unit(unit.id, target)
+                self._ai_attack(self.units[unit.id])
+
+    def _ai_attack(self, unit: Unit) -> bool:
+        """Make the best-scoring attack in range, if any is worth making.
+
+        Returns:
+            True if the unit attacked.
+        """
+        target_id = self._ai_attack_target(unit)
+        if target_id is None:
+            return False
+
+        self.attack(unit.id, target_id)
+        return True
+
+    def _ai_attack_target(self, unit: Unit) -> Optional[str]:
+        """Pick the best-scoring attack in range, if any is worth making.
+
+        Targets are scored from the exact combat odds (see attack_value()),
+        closest first so ties go to the nearer target.
+        """
+        if not unit.can_attack():
+            return None
+
+        best_target, best_value = None, 0.0
+        for target_id in self.attack_targets(unit.id):
+            target = self.units[target_id]
+            value = attack_value(unit, target, self.map.get_defense_modifier(target.position))
+            if value > best_value:
+                best_target, best_value = target_id, value
+
+        return best_target
+
+    def _ai_field(self, fields: Dict[Tuple[str, bool], array], unit: Unit) -> array:
+        """Get (computing on first use this turn) the distance field guiding a unit.
+
+        Fields are seeded from enemy units, plus enemy and neutral cities for
+        units that can capture them, and swept once per movement domain.
+        """
+        stats = unit.get_stats()
+        key = (stats['domain'], bool(stats.get('can_capture')))
+
+        if key not in fields:
+            sources = [self.map.index_of(e.position) for e in self.units.values()
+                       if e.owner != unit.owner]
+            if key[1]:
+                sources += [self.map.index_of(c.position) for c in self.cities.values()
+                            if c.owner != unit.owner]
+            fields[key] = distance_field(self.map, sources, key[0])
+
+        return fields[key]
+
+    def _descend_field(self, field: array, unit: Unit) -> Tuple[int, int]:
+        """Follow a distance field downhill for as far as the unit can move."""
+        hex_map = self.map
+        passable = PASSABLE_BY_UNIT.get(unit.type, PASSABLE_ANYWHERE)
+        index = hex_map.index_of(unit.position)
+        current = field[index]
+
+        for _ in range(unit.movement_remaining):
+            if current <= 0:
+                break
+
+            candidates = []
+            for neighbor in hex_map.kernel.adjacent(index):
+                if hex_map.unit_grid[neighbor] or not passable[hex_map.terrain[neighbor]]:
+                    continue
+                if 0 <= field[neighbor] < current:
+                    candidates.append((field[neighbor], neighbor))
+
+            if not candidates:
+                break
+
+            current = min(value for value, _ in candidates)
+            index = self.rng.choice([neighbor for value, neighbor in candidates if value == current])
+
+        return hex_map.position_of(index)
 
     def _check_victory(self):
         """Check if game is over."""
+        already_over = self.game_over
         player1_cities = sum(1 for c in self.cities.values() if c.owner == 'player1')
         player2_cities = sum(1 for c in self.cities.values() if c.owner == 'player2')
 
@@ -319,10 +1005,26 @@ class GameController:
         elif player2_cities == 0:
             self.game_over = True
             self.winner = 'player1'
+        else:
+            return
+
+        self._mark_changed('scalar', 'game_over')
+        self._mark_changed('scalar', 'winner')
+        if not already_over:
+            self.events.stage(events.GAME_OVER, winner=self.winner)
+
+    def get_state(self, player: Optional[str] = None) -> Dict:
+        """Get current game state.
+
+        Args:
+            player: Only include what this player sees (with fog of war;
+                see StateSnapshot.get_state())
+        """
+        if player is not None and self.fog:
+            return self.publish_snapshot().get_state(player)
 
-    def get_state(self) -> Dict:
-        """Get current game state."""
         return {
+            'version': self.version,
             'turn': self.turn,
             'current_player': self.current_player,
             'map': self.map.to_dict(),
@@ -330,41 +1032,247 @@ class GameController:
             'cities': [city.to_dict() for city in self.cities.values()],
             'resources': self.resources,
             'game_over': self.game_over,
-            'winner': self.winner
+            'winner': self.winner,
+            'fog': self.fog
         }
 
-    def save_game(self, filename: str) -> str:
-        """Save game to file."""
+    def get_delta(self, since_version: int, player: Optional[str] = None) -> Dict:
+        """Get the changes committed after ``since_version``.
+
+        Falls back to the full state (``full`` set to True) when the change
+        journal no longer reaches back to ``since_version``. With a player,
+        only the changes that player sees are included.
+        """
+        return self.publish_snapshot().get_delta(since_version, player)
+
+    def publish_snapshot(self) -> StateSnapshot:
+        """Publish the committed state for lock-free readers.
+
+        Must be called with ``lock`` held, after a write has finished.
+        """
+        self.snapshot = StateSnapshot.capture(self, self.snapshot)
+        self.events.flush(self.version)
+        return self.snapshot
+
+    def clone(self, seed: Optional[int] = None) -> 'GameController':
+        """Fork the game, for look-ahead search and what-if analysis.
+
+        Forking is copy-on-write: the two games share their units, cities,
+        occupancy grids and spatial index buckets, and whichever changes
+        one of them first copies just that unit, city, grid or bucket (see
+        _writable_unit(), HexMap and SpatialIndex); terrain and unit stats
+        are never copied. Only the small per-game state (entity tables,
+        resources, RNG) is copied up front, so a fork takes microseconds.
+
+        The fork is headless: it has no journal, its events are dropped,
+        it never publishes snapshots and it does not track visibility (AI
+        search sees the whole board), so it can be played on freely.
+
+        Args:
+            seed: Seed the fork's RNG with this instead of continuing this
+                game's RNG stream (cheaper, and what independent rollouts
+                want anyway)
+        """
+        game = GameController.__new__(GameController)
+        game.turn = self.turn
+        game.current_player = self.current_player
+        game.map = self.map.clone()
+        game.los = self.los.clone(game.map)
+        game.units = dict(self.units)
+        game.cities = dict(self.cities)
+        self._owned_units, game._owned_units = set(), set()
+        self._owned_cities, game._owned_cities = set(), set()
+        game.resources = dict(self.resources)
+        game.game_over = self.game_over
+        game.winner = self.winner
+        game.ai_player = self.ai_player
+        game.ai_opponent = self.ai_opponent
+        game.fog = self.fog
+
+        if seed is None:
+            game.rng = random.Random(0)
+            game.rng.setstate(self.rng.getstate())
+        else:
+            game.rng = random.Random(seed)
+
+        game._unit_counter = self._unit_counter
+        game._city_counter = self._city_counter
+        game._init_headless(self.version)
+        game.chunk_versions = array('i', self.chunk_versions)
+        game.unit_index = self.unit_index.clone()
+        return game
+
+    def _init_headless(self, version: int):
+        """Set up change tracking and stand-ins for the lock, events, snapshot
+        and journal of a game copy that nobody reads from (and that records
+        no metrics)."""
+        self.version = version
+        self._changes = set()
+        self._journal = deque(maxlen=Config.STATE_JOURNAL_LENGTH)
+        self._reachable_cache = {}
+        self.lock = threading.RLock()
+        self.snapshot = None
+        self.events = NULL_EVENTS
+        self.record_metrics = False
+        self.journal = None
+        self.visibility = None
+        self._init_undo()
+
+    def __getstate__(self) -> Dict:
+        """Pickle only the game itself (for sending copies to worker processes)."""
+        state = self.__dict__.copy()
+        for name in ('_changes', '_journal', '_reachable_cache', 'lock', 'snapshot', 'events', 'journal',
+                     '_undo_entries', '_redo_commands', '_undo_entry', 'visibility'):
+            state.pop(name, None)
+        return state
+
+    def __setstate__(self, state: Dict):
+        """Unpickle as a headless copy (see clone())."""
+        self.__dict__.update(state)
+        self._init_headless(self.version)
+
+    def get_save_data(self) -> Dict:
+        """Get the state plus the engine internals needed for exact replay."""
+        version, internal, gauss = self.rng.getstate()
+        return {
+            **self.get_state(),
+            'ai_player': self.ai_player,
+            'ai_opponent': self.ai_opponent,
+            'unit_counter': self._unit_counter,
+            'city_counter': self._city_counter,
+            'rng_state': [version, list(internal), gauss]
+        }
+
+    def save_game(self, filename: str, timestamp: bool = True,
+                  save_format: str = Config.SAVE_FORMAT, catalog: bool = True,
+                  journal: bool = False) -> str:
+        """Save game to file.
+
+        Args:
+            filename: Save name, relative to the save directory
+            timestamp: Append the current time so earlier saves are kept
+            save_format: 'json', or 'binary' for the compact binary format
+            catalog: Record the save in the save catalog
+            journal: Record the attached journal and its position, so that
+                loading reattaches it (session saves only)
+        """
         save_dir = Config.SAVE_DIR
-        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-        filepath = os.path.join(save_dir, f'{filename}_{timestamp}.json')
+        if timestamp:
+            filename = f"{filename}_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+
+        if save_format == 'binary':
+            filepath = write_binary_save(self, os.path.join(save_dir, f'{filename}{BINARY_SAVE_EXTENSION}'),
+                                         journal=journal)
+        elif save_format == 'json':
+            filepath = os.path.join(save_dir, f'{filename}.json')
+
+            data = self.get_save_data()
+            if journal and self.journal is not None:
+                data['journal'] = self.journal.name
+                data['journal_seq'] = self.journal.seq
+
+            with open(filepath, 'w') as f:
+                json.dump(data, f, indent=2)
+        else:
+            raise ValueError(f'Unknown save format: {save_format}')
 
-        with open(filepath, 'w') as f:
-            json.dump(self.get_state(), f, indent=2)
+        save_cache.invalidate(filepath)
+        if catalog:
+            save_catalog.record(filepath, self.get_summary())
 
         return filepath
 
+    def get_summary(self) -> Dict:
+        """Get the save catalog fields of this game."""
+        return {
+            'turn': self.turn,
+            'players': sorted(self.resources),
+            'current_player': self.current_player,
+            'width': self.map.width,
+            'height': self.map.height,
+            'units': len(self.units),
+            'cities': len(self.cities),
+            'game_over': self.game_over,
+            'winner': self.winner
+        }
+
     @staticmethod
-    def load_game(filename: str) -> 'GameController':
-        """Load game from file."""
-        save_dir = Config.SAVE_DIR
-        filepath = os.path.join(save_dir, filename)
+    def load_game(filename: str, cached: bool = True) -> 'GameController':
+        """Load game from file.
+
+        Args:
+            filename: Save file name, relative to the save directory
+            cached: Reuse the parsed file from the save cache when unchanged
+        """
+        filepath = os.path.join(Config.SAVE_DIR, filename)
+        parsed = save_cache.get(filepath) if cached else read_save(filepath)
 
-        with open(filepath, 'r') as f:
-            data = json.load(f)
+        if isinstance(parsed, bytes):
+            return GameController.from_parts(*read_binary_stream(io.BytesIO(parsed)))
+        return GameController.from_dict(parsed)
 
-        # Reconstruct game controller
+    @staticmethod
+    def from_dict(data: Dict) -> 'GameController':
+        """Reconstruct a game from get_state() or get_save_data() output."""
+        return GameController.from_parts(
+            HexMap.from_dict(data['map']),
+            [Unit.from_dict(u) for u in data['units']],
+            [City.from_dict(c) for c in data['cities']],
+            data
+        )
+
+    @staticmethod
+    def from_parts(hex_map: HexMap, units: List[Unit], cities: List[City], data: Dict) -> 'GameController':
+        """Reconstruct a game from a loaded map, units and cities.
+
+        Args:
+            hex_map: Map with terrain and occupancy filled in
+            units: Units in their original order
+            cities: Cities in their original order
+            data: Remaining fields, as in get_save_data() output
+        """
         game = GameController.__new__(GameController)
         game.turn = data['turn']
         game.current_player = data['current_player']
-        game.map = HexMap.from_dict(data['map'])
-        game.units = {u['id']: Unit.from_dict(u) for u in data['units']}
-        game.cities = {c['id']: City.from_dict(c) for c in data['cities']}
-        game.resources = data['resources']
+        game.map = hex_map
+        game.los = LineOfSight(hex_map)
+        game.units = {unit.id: unit for unit in units}
+        game.cities = {city.id: city for city in cities}
+        game._owned_units = None
+        game._owned_cities = None
+        game.resources = dict(data['resources'])
         game.game_over = data['game_over']
         game.winner = data.get('winner')
-
-        game._unit_counter = len(game.units)
-        game._city_counter = len(game.cities)
+        game.ai_player = data.get('ai_player', 'player2')
+        game.ai_opponent = data.get('ai_opponent') or Config.AI_OPPONENT
+        game.fog = bool(data.get('fog', False))
+
+        game.rng = random.Random()
+        if 'rng_state' in data:
+            version, internal, gauss = data['rng_state']
+            game.rng.setstate((version, tuple(internal), gauss))
+
+        game._unit_counter = data.get('unit_counter', _max_id_number(game.units))
+        game._city_counter = data.get('city_counter', _max_id_number(game.cities))
+        game._init_change_tracking(data.get('version', 0))
+        game._init_undo()
+        game._build_spatial_indexes()
+        game._reachable_cache = {}
+        game._init_visibility()
+        game._init_concurrency()
+
+        game.journal = None
+        if data.get('journal'):
+            from server.engine.journal import GameJournal
+            journal = GameJournal(data['journal'])
+            # A save older than the journal tail would append from stale state
+            if journal.exists() and journal.seq == data.get('journal_seq'):
+                journal.attach(game)
 
         return game
+
+def _max_id_number(entities: Dict[str, object]) -> int:
+    """Get the highest numeric suffix among ids like 'unit_12'."""
+    numbers = [int(entity_id.rsplit('_', 1)[-1]) for entity_id in entities
+               if entity_id.rsplit('_', 1)[-1].isdigit()]
+    return max(numbers, default=0)
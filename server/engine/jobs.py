@@ -0,0 +1,160 @@
+"""Background AI turns."""
+
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Optional
+
+from server.config import Config
+
+# Job states
+QUEUED = 'queued'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+
+# Why an AI turn stopped
+COMPLETED = 'completed'
+TIME_BUDGET = 'time_budget'
+CANCELLED = 'cancelled'
+STEP_LIMIT = 'step_limit'
+
+class TurnBudget:
+    """Time limit, cancellation and progress reporting for one AI turn.
+
+    The AI checks exhausted() before each unit it plays and reports with
+    advance(); a turn cut short simply leaves the remaining units idle.
+    """
+
+    def __init__(self, seconds: Optional[float] = None):
+        self.seconds = seconds
+        self.deadline: Optional[float] = None
+        self.cancelled = threading.Event()
+        self.steps = 0
+        self.total = 0
+        self.stopped: Optional[str] = None
+
+    def start(self, total: int):
+        """Start the clock for a turn of total steps."""
+        self.total = total
+        if self.seconds is not None:
+            self.deadline = time.monotonic() + self.seconds
+
+    def exhausted(self) -> bool:
+        """Check (and record why) the turn must stop now."""
+        if self.cancelled.is_set():
+            self.stopped = CANCELLED
+        elif self.deadline is not None and time.monotonic() >= self.deadline:
+            self.stopped = TIME_BUDGET
+        return self.stopped is not None
+
+    def advance(self, steps: int):
+        """Record that steps units have been played."""
+        self.steps = steps
+
+class AIJob:
+    """Handle of an AI turn running in the background."""
+
+    def __init__(self, game_id: str, budget: TurnBudget):
+        self.id = uuid.uuid4().hex
+        self.game_id = game_id
+        self.budget = budget
+        self.status = QUEUED
+        self.result: Optional[Dict] = None
+        self.error: Optional[str] = None
+        self.created = time.time()
+        self.started: Optional[float] = None
+        self.finished: Optional[float] = None
+        self.done = threading.Event()
+
+    def cancel(self):
+        """Ask the AI to stop after the unit it is playing."""
+        self.budget.cancelled.set()
+
+    def to_dict(self) -> dict:
+        """Convert to dictionary."""
+        return {
+            'job_id': self.id,
+            'status': self.status,
+            'progress': {'steps': self.budget.steps, 'total': self.budget.total},
+            'cancel_requested': self.budget.cancelled.is_set(),
+            'stopped': self.budget.stopped,
+            'elapsed': (self.finished or time.time()) - (self.started or self.created),
+            'error': self.error
+        }
+
+class AIJobRunner:
+    """Runs AI turns on a thread pool, off the request threads.
+
+    A thread pool rather than processes: the AI mutates the live game, so
+    it has to run in the process holding it. Finished jobs are kept (up to
+    ``retention``) so their results can still be fetched.
+    """
+
+    def __init__(self, workers: int = Config.AI_WORKERS, retention: int = Config.AI_JOB_RETENTION):
+        self.retention = retention
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='ai-turn')
+        self._jobs: 'OrderedDict[str, AIJob]' = OrderedDict()
+        self._active: Dict[str, AIJob] = {}  # game id -> running or queued job
+        self._lock = threading.Lock()
+
+    def submit(self, game_id: str, work: Callable[[TurnBudget], Dict],
+               budget: TurnBudget) -> Optional[AIJob]:
+        """Queue an AI turn for a game.
+
+        Args:
+            game_id: Game the turn belongs to
+            work: Plays the turn within the budget and returns its result
+            budget: Time limit and cancellation for the turn
+
+        Returns:
+            The job, or None if the game already has one in progress.
+        """
+        job = AIJob(game_id, budget)
+
+        with self._lock:
+            if game_id in self._active:
+                return None
+            self._active[game_id] = job
+            self._jobs[job.id] = job
+            while len(self._jobs) > self.retention:
+                oldest_id = next(iter(self._jobs))
+                if self._jobs[oldest_id].done.is_set():
+                    del self._jobs[oldest_id]
+                else:
+                    break
+
+        self._pool.submit(self._run, job, work)
+        return job
+
+    def _run(self, job: AIJob, work: Callable[[TurnBudget], Dict]):
+        job.status = RUNNING
+        job.started = time.time()
+        try:
+            job.result = work(job.budget)
+            job.status = DONE
+        except Exception as e:
+            job.error = str(e)
+            job.status = FAILED
+        finally:
+            job.finished = time.time()
+            with self._lock:
+                self._active.pop(job.game_id, None)
+            job.done.set()
+
+    def get(self, job_id: str) -> Optional[AIJob]:
+        """Get a job by id."""
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def active(self, game_id: str) -> Optional[AIJob]:
+        """Get the job in progress for a game, if any."""
+        with self._lock:
+            return self._active.get(game_id)
+
+    def active_count(self) -> int:
+        """Count the jobs queued or running."""
+        with self._lock:
+            return len(self._active)
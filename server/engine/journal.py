@@ -0,0 +1,200 @@
+"""Append-only command journals with periodic snapshots."""
+
+import json
+import os
+import re
+import shutil
+import threading
+import weakref
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from server.engine.game import GameController
+from server.config import Config
+
+JOURNAL_NAME_PATTERN = re.compile(r'^[A-Za-z0-9_-]+$')
+SNAPSHOT_PATTERN = re.compile(r'^snapshot_(\d+)_t(\d+)\.json$')
+LOG_FILENAME = 'commands.jsonl'
+
+# Journal name -> the one game appending to it in this process
+_writers: 'weakref.WeakValueDictionary[str, GameController]' = weakref.WeakValueDictionary()
+_writers_lock = threading.Lock()
+
+class GameJournal:
+    """Command log of one saved game.
+
+    Every successful player command is appended to ``commands.jsonl`` with
+    a sequence number. Every ``snapshot_interval`` commands the full game
+    (including its RNG state) is written as ``snapshot_<seq>_t<turn>.json``,
+    so loading means taking the latest snapshot and replaying the commands
+    after it. Since all randomness comes from the game's seeded RNG the
+    replay reproduces the original game exactly, AI turns included.
+
+    A journal has at most one writer per process: the game attach()
+    succeeded for. Any other game loaded from it comes back detached.
+    """
+
+    def __init__(self, name: str, snapshot_interval: int = Config.JOURNAL_SNAPSHOT_INTERVAL):
+        if not JOURNAL_NAME_PATTERN.match(name or ''):
+            raise ValueError(f'Invalid journal name: {name}')
+
+        self.name = name
+        self.directory = os.path.join(Config.JOURNAL_DIR, name)
+        self.snapshot_interval = max(1, snapshot_interval)
+        self.seq = 0
+
+        log_path = self.log_path
+        if os.path.exists(log_path):
+            for entry in self.commands():
+                self.seq = entry['seq']
+
+    @property
+    def log_path(self) -> str:
+        return os.path.join(self.directory, LOG_FILENAME)
+
+    @staticmethod
+    def create(name: str, game: GameController) -> 'GameJournal':
+        """Start a new journal for a game, replacing any journal of that name."""
+        journal = GameJournal(name)
+        if os.path.isdir(journal.directory):
+            shutil.rmtree(journal.directory)
+        journal.seq = 0
+        os.makedirs(journal.directory)
+
+        open(journal.log_path, 'w').close()
+        journal.write_snapshot(game)
+
+        if game.journal is not None:
+            game.journal.detach(game)
+
+        # The old log is gone, so its writer must not append to the new one
+        with _writers_lock:
+            previous = _writers.get(name)
+            _writers[name] = game
+        if previous is not None and previous is not game:
+            previous.journal = None
+        game.journal = journal
+        return journal
+
+    def attach(self, game: GameController) -> bool:
+        """Make a game the writer of the journal, unless another game is.
+
+        Returns:
+            True if the game now appends to the journal.
+        """
+        with _writers_lock:
+            writer = _writers.get(self.name)
+            if writer is not None and writer is not game:
+                return False
+            _writers[self.name] = game
+        game.journal = self
+        return True
+
+    def detach(self, game: GameController):
+        """Stop a game appending to the journal, freeing it for another writer."""
+        with _writers_lock:
+            if _writers.get(self.name) is game:
+                del _writers[self.name]
+        if game.journal is self:
+            game.journal = None
+
+    def exists(self) -> bool:
+        """Check whether the journal has been created on disk."""
+        return os.path.exists(self.log_path)
+
+    def record(self, game: GameController, command: Dict):
+        """Append a successfully applied command (and a snapshot when due).
+
+        Undo history lives in memory only, so undo and redo commands cannot
+        be replayed; each is followed by a snapshot, which load() always
+        starts from instead.
+        """
+        self.seq += 1
+        entry = {'seq': self.seq, 'turn': game.turn, 'command': command}
+
+        with open(self.log_path, 'a') as f:
+            f.write(json.dumps(entry, separators=(',', ':')) + '\n')
+
+        if self.seq % self.snapshot_interval == 0 or command.get('op') in ('undo', 'redo'):
+            self.write_snapshot(game)
+
+    def write_snapshot(self, game: GameController) -> str:
+        """Write a full snapshot of the game at the current sequence number."""
+        filepath = os.path.join(self.directory, f'snapshot_{self.seq:08d}_t{game.turn}.json')
+        temp_path = filepath + '.tmp'
+
+        with open(temp_path, 'w') as f:
+            json.dump(game.get_save_data(), f, separators=(',', ':'))
+        os.replace(temp_path, filepath)
+
+        return filepath
+
+    def snapshots(self) -> List[Tuple[int, int, str]]:
+        """List snapshots as (seq, turn, filename), oldest first."""
+        results = []
+        for filename in os.listdir(self.directory):
+            match = SNAPSHOT_PATTERN.match(filename)
+            if match:
+                results.append((int(match.group(1)), int(match.group(2)), filename))
+        results.sort()
+        return results
+
+    def commands(self, after_seq: int = 0) -> Iterator[Dict]:
+        """Iterate over logged commands with a sequence number above after_seq."""
+        with open(self.log_path, 'r') as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                entry = json.loads(line)
+                if entry['seq'] > after_seq:
+                    yield entry
+
+    def load(self, turn: Optional[int] = None, seq: Optional[int] = None) -> GameController:
+        """Rebuild the game from the latest usable snapshot plus the log tail.
+
+        Args:
+            turn: Stop at the start of this turn instead of the end of the log
+            seq: Stop after this command instead of the end of the log
+
+        Returns:
+            The rebuilt game. Only a game loaded to the end of the log is
+            attached to the journal, and only while no other game writes to
+            it; earlier positions are detached so that playing on from them
+            cannot rewrite history.
+        """
+        if not self.exists():
+            raise FileNotFoundError(f'No journal named {self.name}')
+
+        candidates = [(s, t, f) for s, t, f in self.snapshots()
+                      if (turn is None or t <= turn) and (seq is None or s <= seq)]
+        if not candidates:
+            raise ValueError('No snapshot at or before the requested position')
+        snapshot_seq, _, filename = candidates[-1]
+
+        with open(os.path.join(self.directory, filename), 'r') as f:
+            game = GameController.from_dict(json.load(f))
+
+        # Replayed commands were counted when first played
+        game.record_metrics = False
+        last_seq = snapshot_seq
+        for entry in self.commands(snapshot_seq):
+            if seq is not None and entry['seq'] > seq:
+                break
+            if turn is not None and game.turn >= turn:
+                break
+            game.apply_command(entry['command'])
+            last_seq = entry['seq']
+        game.record_metrics = True
+
+        game._commit_changes()
+        game.publish_snapshot()
+
+        if last_seq == self.seq:
+            self.attach(game)
+        return game
+
+def list_journals() -> List[str]:
+    """List the names of all journals on disk."""
+    if not os.path.isdir(Config.JOURNAL_DIR):
+        return []
+    return sorted(name for name in os.listdir(Config.JOURNAL_DIR)
+                  if os.path.exists(os.path.join(Config.JOURNAL_DIR, name, LOG_FILENAME)))
@@ -0,0 +1,80 @@
+"""Line of sight for ranged attacks."""
+
+from typing import Dict, Optional, Tuple
+
+from server.engine.map import HexMap, MOUNTAIN
+from server.utils.hex_utils import hex_line_steps
+
+# bytes.translate() table: 1 for terrain codes that block line of sight
+BLOCKING = bytes(1 if code == MOUNTAIN else 0 for code in range(256))
+
+class LineOfSight:
+    """Cached line-of-sight checks over a map's terrain.
+
+    A line is clear unless a hex strictly between its ends blocks (where
+    the line runs along an edge, only if the hexes on both sides do). Lines
+    come from the precomputed tables of hex_line_steps() and results are
+    cached per pair of hexes. The cache is dropped only when the blocking
+    terrain changes: terrain edits (through Hex.terrain, which bumps
+    HexMap.terrain_version) that leave the blocking hexes as they were keep
+    it.
+    """
+
+    def __init__(self, hex_map: HexMap):
+        self.map = hex_map
+        self._terrain: Optional[bytearray] = None
+        self._terrain_version = -1
+        self._blocking = b''
+        # min(index) * size + max(index) -> clear
+        self._cache: Dict[int, bool] = {}
+
+    def clone(self, hex_map: HexMap) -> 'LineOfSight':
+        """Get the line of sight of a clone of the map, sharing the cache
+        until either map's blocking terrain changes."""
+        los = LineOfSight.__new__(LineOfSight)
+        los.__dict__.update(self.__dict__)
+        los.map = hex_map
+        return los
+
+    def _refresh(self):
+        """Re-read the blocking hexes after a terrain change."""
+        hex_map = self.map
+        blocking = hex_map.terrain.translate(BLOCKING)
+        if blocking != self._blocking:
+            self._blocking = blocking
+            self._cache = {}
+        self._terrain = hex_map.terrain
+        self._terrain_version = hex_map.terrain_version
+
+    def clear(self, origin: Tuple[int, int], target: Tuple[int, int]) -> bool:
+        """Check whether nothing blocks the line between two hexes."""
+        hex_map = self.map
+        if hex_map.terrain is not self._terrain or hex_map.terrain_version != self._terrain_version:
+            self._refresh()
+
+        a = hex_map.index_of(origin)
+        b = hex_map.index_of(target)
+        if a < 0 or b < 0:
+            return False
+
+        key = a * hex_map.size + b if a < b else b * hex_map.size + a
+        clear = self._cache.get(key)
+        if clear is None:
+            clear = self._cache[key] = self._trace(origin, target)
+        return clear
+
+    def _trace(self, origin: Tuple[int, int], target: Tuple[int, int]) -> bool:
+        """Walk the precomputed line between two hexes."""
+        index_of = self.map.index_of
+        blocking = self._blocking
+        q, r = origin
+
+        for step in hex_line_steps((target[0] - q, target[1] - r)):
+            for dq, dr in step:
+                index = index_of((q + dq, r + dr))
+                if index < 0 or not blocking[index]:
+                    break
+            else:
+                return False
+
+        return True
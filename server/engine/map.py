@@ -1,8 +1,17 @@
 """Map and terrain system."""
 
 import random
-from typing import Dict, Tuple, List, Optional
-from server.utils.hex_utils import hex_neighbors
+from array import array
+from collections.abc import Mapping
+from typing import Dict, Iterator, Tuple, List, Optional
+from server.models.unit import UNIT_STATS, DOMAIN_LAND, DOMAIN_SEA, DOMAIN_AIR
+from server.utils.hex_utils import OFF_MAP, hex_kernel
+from server.config import Config
+
+try:
+    from server.engine.terrain import generate_noise_terrain
+except ImportError:  # NumPy not installed
+    generate_noise_terrain = None
 
 class TerrainType:
     """Terrain type constants."""
@@ -11,159 +20,435 @@ class TerrainType:
     FOREST = 'forest'
     MOUNTAIN = 'mountain'
 
+# Terrain codes stored in the packed terrain grid
+TERRAIN_NAMES = (TerrainType.WATER, TerrainType.LAND, TerrainType.FOREST, TerrainType.MOUNTAIN)
+TERRAIN_CODES = {name: code for code, name in enumerate(TERRAIN_NAMES)}
+WATER = TERRAIN_CODES[TerrainType.WATER]
+LAND = TERRAIN_CODES[TerrainType.LAND]
+FOREST = TERRAIN_CODES[TerrainType.FOREST]
+MOUNTAIN = TERRAIN_CODES[TerrainType.MOUNTAIN]
+
+# Lookup tables indexed by terrain code
+DEFENSE_MODIFIERS = (0, 0, 1, 2)
+DOMAIN_PASSABLE = {
+    DOMAIN_LAND: (False, True, True, True),
+    DOMAIN_SEA: (True, False, False, False),
+    DOMAIN_AIR: (True, True, True, True)
+}
+PASSABLE_BY_UNIT = {unit_type: DOMAIN_PASSABLE[stats['domain']]
+                    for unit_type, stats in UNIT_STATS.items()}
+PASSABLE_ANYWHERE = DOMAIN_PASSABLE[DOMAIN_AIR]
+
+# Occupancy grid value for an empty hex
+EMPTY = 0
+
 class Hex:
-    """Represents a single hex tile."""
+    """View of a single hex tile, backed by its map's grids."""
+
+    __slots__ = ('_map', 'index')
+
+    def __init__(self, hex_map: 'HexMap', index: int):
+        self._map = hex_map
+        self.index = index
 
-    def __init__(self, q: int, r: int, terrain: str = TerrainType.LAND):
-        self.q = q
-        self.r = r
-        self.terrain = terrain
-        self.unit_id: Optional[str] = None
-        self.city_id: Optional[str] = None
+    @property
+    def q(self) -> int:
+        return self._map.position_of(self.index)[0]
+
+    @property
+    def r(self) -> int:
+        return self.index // self._map.width
 
     @property
     def position(self) -> Tuple[int, int]:
         """Get position as tuple."""
-        return (self.q, self.r)
+        return self._map.position_of(self.index)
+
+    @property
+    def terrain(self) -> str:
+        return TERRAIN_NAMES[self._map.terrain[self.index]]
+
+    @terrain.setter
+    def terrain(self, terrain: str):
+        hex_map = self._map
+        if hex_map._shared_terrain:
+            hex_map.terrain = bytearray(hex_map.terrain)
+            hex_map._shared_terrain = False
+        hex_map.terrain[self.index] = TERRAIN_CODES[terrain]
+        hex_map.terrain_version += 1
+
+    @property
+    def unit_id(self) -> Optional[str]:
+        return self._map._ids[self._map.unit_grid[self.index]]
+
+    @unit_id.setter
+    def unit_id(self, unit_id: Optional[str]):
+        self._map.set_unit(self.position, unit_id)
+
+    @property
+    def city_id(self) -> Optional[str]:
+        return self._map._ids[self._map.city_grid[self.index]]
+
+    @city_id.setter
+    def city_id(self, city_id: Optional[str]):
+        self._map.set_city(self.position, city_id)
 
     def to_dict(self) -> dict:
         """Convert to dictionary."""
+        q, r = self.position
         return {
-            'q': self.q,
-            'r': self.r,
+            'q': q,
+            'r': r,
             'terrain': self.terrain,
             'unit_id': self.unit_id,
             'city_id': self.city_id
         }
 
-class HexMap:
-    """Hexagonal grid map."""
+class HexGridView(Mapping):
+    """Read-only position -> Hex mapping over a HexMap, in row-major order."""
 
-    def __init__(self, width: int, height: int):
-        self.width = width
-        self.height = height
-        self.hexes: Dict[Tuple[int, int], Hex] = {}
-        self._generate_map()
+    def __init__(self, hex_map: 'HexMap'):
+        self._map = hex_map
 
-    def _generate_map(self):
-        """Generate the map with terrain."""
-        # Create hexes in offset coordinates and convert to axial
-        for row in range(self.height):
-            for col in range(self.width):
-                # Convert offset to axial coordinates
-                q = col - (row - (row & 1)) // 2
-                r = row
-                self.hexes[(q, r)] = Hex(q, r)
+    def __getitem__(self, position: Tuple[int, int]) -> Hex:
+        index = self._map.index_of(position)
+        if index < 0:
+            raise KeyError(position)
+        return Hex(self._map, index)
+
+    def __contains__(self, position) -> bool:
+        return self._map.index_of(position) >= 0
 
-        # Generate terrain
-        self._generate_terrain()
+    def __iter__(self) -> Iterator[Tuple[int, int]]:
+        position_of = self._map.position_of
+        return (position_of(index) for index in range(self._map.size))
 
-    def _generate_terrain(self):
-        """Generate terrain using simple noise."""
-        positions = list(self.hexes.keys())
+    def __len__(self) -> int:
+        return self._map.size
+
+class HexMap:
+    """Hexagonal grid map.
+
+    The map is a ``width`` x ``height`` rectangle in offset coordinates
+    (odd rows shifted right), addressed by axial (q, r) positions. Terrain
+    is stored as one byte per hex and occupancy as integer handles into a
+    shared id table, all indexed by ``row * width + col``.
+
+    clone() shares the grids and the id table between the maps until one
+    of them writes to a grid, when the writer takes its own copy of it.
+    Terrain never changes in play, so in practice only the unit grid is
+    ever copied. Code outside the map must therefore only read the grids
+    and change them through set_unit(), set_city() and Hex.
+    """
+
+    def __init__(self, width: int, height: int, rng: Optional[random.Random] = None,
+                 generator: str = Config.TERRAIN_GENERATOR):
+        """Create a map with generated terrain.
+
+        Args:
+            width: Map width in hexes
+            height: Map height in hexes
+            rng: Random source for generation
+            generator: 'noise' for the vectorized noise generator, or 'legacy'
+                for the random-walk generator (also used without NumPy)
+        """
+        self.width = width
+        self.height = height
+        self._init_grids()
+        self._generate_map(rng or random.Random(), generator)
+
+    def _init_grids(self):
+        """Allocate empty terrain and occupancy grids."""
+        self.size = self.width * self.height
+        self.terrain = bytearray([LAND]) * self.size
+        # Bumped on every terrain edit after generation, for terrain-keyed caches
+        self.terrain_version = 0
+        self.unit_grid = array('i', bytes(4 * self.size))
+        self.city_grid = array('i', bytes(4 * self.size))
+        # Bumped on every unit placement change, for occupancy-keyed caches
+        self.occupancy_version = 0
+        # Occupant ids by handle; handle 0 (EMPTY) means no occupant
+        self._ids: List[Optional[str]] = [None]
+        self._handles: Dict[str, int] = {}
+        # Whether the terrain, unit grid, city grid and id table are shared
+        # with a clone
+        self._shared_terrain = self._shared_units = self._shared_cities = self._shared_ids = False
+        self.hexes = HexGridView(self)
+        # Neighbor and disk index tables, shared by maps of the same shape
+        self.kernel = hex_kernel(self.width, self.height)
+        # Square chunks of offset coordinates, for tiled map streaming
+        self.chunk_size = Config.MAP_CHUNK_SIZE
+        self.chunks_x = -(-self.width // self.chunk_size)
+        self.chunks_y = -(-self.height // self.chunk_size)
+
+    def _handle(self, identifier: Optional[str]) -> int:
+        """Get the occupancy handle for a unit or city id."""
+        if identifier is None:
+            return EMPTY
+
+        handle = self._handles.get(identifier)
+        if handle is None:
+            if self._shared_ids:
+                self._ids = list(self._ids)
+                self._handles = dict(self._handles)
+                self._shared_ids = False
+            handle = len(self._ids)
+            self._ids.append(identifier)
+            self._handles[identifier] = handle
+        return handle
+
+    def _generate_map(self, rng: random.Random, generator: str = Config.TERRAIN_GENERATOR):
+        """Generate the map with terrain."""
+        if generator == 'noise' and generate_noise_terrain is not None:
+            generate_noise_terrain(self.terrain, self.width, self.height, rng.getrandbits(64),
+                                   (WATER, LAND, FOREST, MOUNTAIN))
+        elif generator in ('noise', 'legacy'):
+            self._generate_terrain(rng)
+        else:
+            raise ValueError(f'Unknown terrain generator: {generator}')
+
+    def _generate_terrain(self, rng: random.Random):
+        """Generate terrain by random-walk water spreading (legacy generator)."""
+        terrain = self.terrain
+        neighbors = self.kernel.neighbors
 
         # Generate water (coastline)
-        num_water = int(len(positions) * 0.2)
-        water_seeds = random.sample(positions, min(5, len(positions)))
+        num_water = int(self.size * 0.2)
+        water_seeds = rng.sample(range(self.size), min(5, self.size))
 
         for seed in water_seeds:
-            self.hexes[seed].terrain = TerrainType.WATER
+            terrain[seed] = WATER
 
             # Spread water
-            spread_positions = [seed]
+            spread_indexes = [seed]
             for _ in range(num_water // len(water_seeds)):
-                if not spread_positions:
+                if not spread_indexes:
                     break
 
-                pos = random.choice(spread_positions)
-                neighbors = [n for n in hex_neighbors(pos) if n in self.hexes]
+                index = rng.choice(spread_indexes)
+                slots = neighbors[index * 6:index * 6 + 6]
+                count = 6 - slots.count(OFF_MAP)
 
-                if neighbors:
-                    next_pos = random.choice(neighbors)
-                    if self.hexes[next_pos].terrain != TerrainType.WATER:
-                        self.hexes[next_pos].terrain = TerrainType.WATER
-                        spread_positions.append(next_pos)
+                if count:
+                    # The draw rng.choice() makes over the on-map neighbors;
+                    # only border hexes have off-map slots to skip
+                    pick = rng.randrange(count)
+                    next_index = slots[pick] if count == 6 else list(self.kernel.adjacent(index))[pick]
+                    if terrain[next_index] != WATER:
+                        terrain[next_index] = WATER
+                        spread_indexes.append(next_index)
 
         # Generate forests
-        land_positions = [pos for pos, h in self.hexes.items()
-                         if h.terrain == TerrainType.LAND]
-        num_forests = int(len(land_positions) * 0.15)
+        land_indexes = [i for i, code in enumerate(terrain) if code == LAND]
+        num_forests = int(len(land_indexes) * 0.15)
 
-        for pos in random.sample(land_positions, min(num_forests, len(land_positions))):
-            self.hexes[pos].terrain = TerrainType.FOREST
+        for index in rng.sample(land_indexes, min(num_forests, len(land_indexes))):
+            terrain[index] = FOREST
 
         # Generate mountains
-        remaining_land = [pos for pos, h in self.hexes.items()
-                         if h.terrain == TerrainType.LAND]
+        remaining_land = [i for i, code in enumerate(terrain) if code == LAND]
         num_mountains = int(len(remaining_land) * 0.1)
 
-        for pos in random.sample(remaining_land, min(num_mountains, len(remaining_land))):
-            self.hexes[pos].terrain = TerrainType.MOUNTAIN
+        for index in rng.sample(remaining_land, min(num_mountains, len(remaining_land))):
+            terrain[index] = MOUNTAIN
+
+    def index_of(self, position: Tuple[int, int]) -> int:
+        """Get the grid index of an axial position, or -1 if off the map."""
+        q, r = position
+        if r < 0 or r >= self.height:
+            return -1
+        col = q + ((r - (r & 1)) >> 1)
+        if col < 0 or col >= self.width:
+            return -1
+        return r * self.width + col
+
+    def position_of(self, index: int) -> Tuple[int, int]:
+        """Get the axial position of a grid index."""
+        r, col = divmod(index, self.width)
+        return (col - ((r - (r & 1)) >> 1), r)
+
+    def positions_with_terrain(self, terrain: str) -> List[Tuple[int, int]]:
+        """Get all positions with the given terrain, in row-major order."""
+        code = TERRAIN_CODES[terrain]
+        position_of = self.position_of
+        return [position_of(i) for i, value in enumerate(self.terrain) if value == code]
+
+    def indexes_with_terrain(self, terrain: str) -> List[int]:
+        """Get the grid indexes of all hexes with the given terrain, in order."""
+        code = TERRAIN_CODES[terrain]
+        return [i for i, value in enumerate(self.terrain) if value == code]
 
     def get_hex(self, position: Tuple[int, int]) -> Optional[Hex]:
         """Get hex at position."""
-        return self.hexes.get(position)
+        index = self.index_of(position)
+        return Hex(self, index) if index >= 0 else None
 
     def is_valid_position(self, position: Tuple[int, int]) -> bool:
         """Check if position is on the map."""
-        return position in self.hexes
+        return self.index_of(position) >= 0
+
+    def terrain_at(self, position: Tuple[int, int]) -> Optional[str]:
+        """Get the terrain name at position."""
+        index = self.index_of(position)
+        return TERRAIN_NAMES[self.terrain[index]] if index >= 0 else None
+
+    def unit_at(self, position: Tuple[int, int]) -> Optional[str]:
+        """Get the id of the unit at position."""
+        index = self.index_of(position)
+        return self._ids[self.unit_grid[index]] if index >= 0 else None
+
+    def city_at(self, position: Tuple[int, int]) -> Optional[str]:
+        """Get the id of the city at position."""
+        index = self.index_of(position)
+        return self._ids[self.city_grid[index]] if index >= 0 else None
+
+    def set_unit(self, position: Tuple[int, int], unit_id: Optional[str]) -> bool:
+        """Place (or with None, clear) the unit at position."""
+        index = self.index_of(position)
+        if index < 0:
+            return False
+        if self._shared_units:
+            self.unit_grid = array('i', self.unit_grid)
+            self._shared_units = False
+        self.unit_grid[index] = self._handle(unit_id)
+        self.occupancy_version += 1
+        return True
+
+    def set_city(self, position: Tuple[int, int], city_id: Optional[str]) -> bool:
+        """Place (or with None, clear) the city at position."""
+        index = self.index_of(position)
+        if index < 0:
+            return False
+        if self._shared_cities:
+            self.city_grid = array('i', self.city_grid)
+            self._shared_cities = False
+        self.city_grid[index] = self._handle(city_id)
+        return True
 
     def is_passable(self, position: Tuple[int, int], unit_type: str) -> bool:
         """Check if unit can move to position."""
-        hex_tile = self.get_hex(position)
-        if not hex_tile:
+        index = self.index_of(position)
+        if index < 0:
             return False
-
-        # Air units can go anywhere
-        if unit_type in ['fighter', 'bomber']:
-            return True
-
-        # Naval units need water
-        if unit_type in ['transport', 'destroyer']:
-            return hex_tile.terrain == TerrainType.WATER
-
-        # Ground units can't enter water
-        if unit_type in ['infantry', 'tank']:
-            return hex_tile.terrain != TerrainType.WATER
-
-        return True
+        return PASSABLE_BY_UNIT.get(unit_type, PASSABLE_ANYWHERE)[self.terrain[index]]
 
     def get_defense_modifier(self, position: Tuple[int, int]) -> int:
         """Get terrain defense bonus."""
-        hex_tile = self.get_hex(position)
-        if not hex_tile:
+        index = self.index_of(position)
+        if index < 0:
             return 0
+        return DEFENSE_MODIFIERS[self.terrain[index]]
+
+    def chunk_of(self, position: Tuple[int, int]) -> int:
+        """Get the chunk number (cy * chunks_x + cx) of a position, or -1."""
+        index = self.index_of(position)
+        if index < 0:
+            return -1
+        row, col = divmod(index, self.width)
+        return (row // self.chunk_size) * self.chunks_x + col // self.chunk_size
+
+    def chunk_to_dict(self, cx: int, cy: int) -> Optional[dict]:
+        """Convert one chunk to a compact dictionary, or None if off the map.
+
+        Terrain is a string with one terrain code digit per hex, row by row
+        from (col0, row0); occupied hexes are listed as [q, r, id].
+        """
+        if not (0 <= cx < self.chunks_x and 0 <= cy < self.chunks_y):
+            return None
+
+        ids = self._ids
+        col0 = cx * self.chunk_size
+        row0 = cy * self.chunk_size
+        cols = min(self.chunk_size, self.width - col0)
+        rows = min(self.chunk_size, self.height - row0)
+        terrain = []
+        units = []
+        cities = []
+
+        for row in range(row0, row0 + rows):
+            start = row * self.width + col0
+            terrain.append(''.join(map(str, self.terrain[start:start + cols])))
+            shift = (row - (row & 1)) >> 1
+            for col in range(col0, col0 + cols):
+                index = row * self.width + col
+                if self.unit_grid[index]:
+                    units.append([col - shift, row, ids[self.unit_grid[index]]])
+                if self.city_grid[index]:
+                    cities.append([col - shift, row, ids[self.city_grid[index]]])
 
-        modifiers = {
-            TerrainType.FOREST: 1,
-            TerrainType.MOUNTAIN: 2,
-            TerrainType.LAND: 0,
-            TerrainType.WATER: 0
+        return {
+            'cx': cx,
+            'cy': cy,
+            'col0': col0,
+            'row0': row0,
+            'width': cols,
+            'height': rows,
+            'terrain': ''.join(terrain),
+            'units': units,
+            'cities': cities
         }
 
-        return modifiers.get(hex_tile.terrain, 0)
+    def clone(self) -> 'HexMap':
+        """Copy the map in constant time (see the class docstring)."""
+        hex_map = HexMap.__new__(HexMap)
+        hex_map.__dict__.update(self.__dict__)
+        hex_map.hexes = HexGridView(hex_map)
+        for shared in (self, hex_map):
+            shared._shared_terrain = shared._shared_units = True
+            shared._shared_cities = shared._shared_ids = True
+        return hex_map
 
     def to_dict(self) -> dict:
         """Convert to dictionary."""
+        ids = self._ids
+        width = self.width
+        hexes = []
+
+        for index, code in enumerate(self.terrain):
+            r, col = divmod(index, width)
+            hexes.append({
+                'q': col - ((r - (r & 1)) >> 1),
+                'r': r,
+                'terrain': TERRAIN_NAMES[code],
+                'unit_id': ids[self.unit_grid[index]],
+                'city_id': ids[self.city_grid[index]]
+            })
+
         return {
             'width': self.width,
             'height': self.height,
-            'hexes': [hex.to_dict() for hex in self.hexes.values()]
+            'hexes': hexes
         }
 
+    @staticmethod
+    def from_terrain(width: int, height: int, terrain: bytes) -> 'HexMap':
+        """Create an unoccupied HexMap from a packed terrain grid."""
+        if len(terrain) != width * height:
+            raise ValueError('Terrain grid does not match the map size')
+        if terrain and max(terrain) >= len(TERRAIN_NAMES):
+            raise ValueError('Unknown terrain code in terrain grid')
+
+        hex_map = HexMap.__new__(HexMap)
+        hex_map.width = width
+        hex_map.height = height
+        hex_map._init_grids()
+        hex_map.terrain[:] = terrain
+        return hex_map
+
     @staticmethod
     def from_dict(data: dict) -> 'HexMap':
         """Create HexMap from dictionary."""
         hex_map = HexMap.__new__(HexMap)
         hex_map.width = data['width']
         hex_map.height = data['height']
-        hex_map.hexes = {}
+        hex_map._init_grids()
 
         for hex_data in data['hexes']:
-            q, r = hex_data['q'], hex_data['r']
-            hex_tile = Hex(q, r, hex_data['terrain'])
-            hex_tile.unit_id = hex_data.get('unit_id')
-            hex_tile.city_id = hex_data.get('city_id')
-            hex_map.hexes[(q, r)] = hex_tile
+            index = hex_map.index_of((hex_data['q'], hex_data['r']))
+            if index < 0:
+                continue
+            hex_map.terrain[index] = TERRAIN_CODES[hex_data['terrain']]
+            hex_map.unit_grid[index] = hex_map._handle(hex_data.get('unit_id'))
+            hex_map.city_grid[index] = hex_map._handle(hex_data.get('city_id'))
 
         return hex_map
@@ -0,0 +1,377 @@
+"""Monte Carlo tree search AI opponent.
+
+The AI plays its units one at a time. For each unit it searches a tree
+whose levels are the decisions of the units still to play this turn (hold,
+one of the most promising moves, or an attack), playing every simulation
+out with the rules AI for a few more turns and scoring the material and
+cities left. Simulations run on clone()s of the game, never through Flask
+or JSON, and can be spread over worker processes (root parallelization:
+each worker grows its own tree and the root statistics are summed).
+"""
+
+import math
+import multiprocessing
+import pickle
+import random
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+from server.engine.ai import AIPlayer
+from server.engine.jobs import TurnBudget, STEP_LIMIT
+from server.engine.pathfinding import UNREACHED
+from server.models.unit import UNIT_STATS, Unit
+from server.config import Config
+
+# A unit's decision: ('hold',), ('move', q, r) or ('attack', target_id)
+Action = Tuple
+HOLD = ('hold',)
+
+# Exploration constant of the UCB1 selection rule
+EXPLORATION = 1.4
+
+# Worth of a city in unit cost points, and the material lead (in the same
+# points) scored tanh(1), about 0.88, by evaluate()
+CITY_VALUE = 150
+VALUE_SCALE = 400
+
+# Unit types the AI produces (as the rules AI)
+PRODUCTION_TYPES = ('infantry', 'tank', 'fighter')
+
+# AI turns whose game a worker process keeps between decisions
+WORKER_TURNS_KEPT = 4
+
+def evaluate(game, player: str) -> float:
+    """Score a position for player between 0 (lost) and 1 (won)."""
+    if game.game_over:
+        return 1.0 if game.winner == player else 0.0
+
+    score = 0.0
+    for unit in game.units.values():
+        stats = UNIT_STATS[unit.type]
+        worth = stats['cost'] * unit.health / stats['max_health']
+        score += worth if unit.owner == player else -worth
+    for city in game.cities.values():
+        if city.owner == player:
+            score += CITY_VALUE
+        elif city.owner is not None:
+            score -= CITY_VALUE
+
+    return 0.5 + 0.5 * math.tanh(score / VALUE_SCALE)
+
+def unit_actions(game, unit: Unit, fields: Dict,
+                 move_candidates: int = Config.MCTS_MOVE_CANDIDATES) -> List[Action]:
+    """List the decisions searched for a unit, most promising first.
+
+    Moves are ranked by the rules AI's distance fields (see
+    GameController._ai_field()), so the closest approaches to enemy units
+    and capturable cities come first; only the best move_candidates are
+    kept. Enemies do not move during the AI's turn, so the fields can be
+    shared by every decision of the turn.
+    """
+    actions = []
+
+    if unit.can_attack():
+        actions += [('attack', target_id) for target_id in game.attack_targets(unit.id)]
+
+    if unit.can_move():
+        field = game._ai_field(fields, unit)
+        ranked = sorted((field[index] if field[index] != UNREACHED else game.map.size, index)
+                        for index in game.reachable(unit.id).destinations)
+        position_of = game.map.position_of
+        actions += [('move', *position_of(index)) for _, index in ranked[:move_candidates]]
+
+    actions.append(HOLD)
+    return actions
+
+def apply_action(game, unit: Unit, action: Action) -> List[Dict]:
+    """Apply a unit's decision (a move is followed by the best attack, if any).
+
+    Returns:
+        The commands that succeeded, as apply_command() takes them.
+    """
+    commands = []
+    if action[0] == 'attack':
+        commands.append({'op': 'attack', 'attacker_id': unit.id, 'defender_id': action[1]})
+    elif action[0] == 'move':
+        commands.append({'op': 'move', 'unit_id': unit.id, 'target': [action[1], action[2]]})
+
+    applied = [command for command in commands if game._apply_action(command)['success']]
+
+    if action[0] == 'move' and applied:
+        target_id = game._ai_attack_target(game.units[unit.id])
+        if target_id is not None:
+            command = {'op': 'attack', 'attacker_id': unit.id, 'defender_id': target_id}
+            if game._apply_action(command)['success']:
+                applied.append(command)
+
+    return applied
+
+def rollout(game, unit_ids: List[str], fields: Dict, turns: int = Config.MCTS_ROLLOUT_TURNS):
+    """Play the rest of the turn and then turns more full turns with the rules AI."""
+    for unit_id in unit_ids:
+        unit = game.units.get(unit_id)
+        if unit is not None:
+            game._ai_play_unit(unit, fields)
+    game._finish_turn()
+
+    for _ in range(2 * turns - 1):
+        if game.game_over:
+            break
+        game._ai_turn(game.current_player)
+        game._finish_turn()
+
+class _Node:
+    """Search tree node: statistics of the decisions taken to reach it."""
+
+    __slots__ = ('children', 'untried', 'visits', 'total')
+
+    def __init__(self):
+        self.children: Dict[Action, '_Node'] = {}
+        self.untried: Optional[List[Action]] = None  # reversed, popped from the end
+        self.visits = 0
+        self.total = 0.0
+
+    def select(self) -> Tuple[Action, '_Node']:
+        """Pick the child with the best UCB1 score."""
+        log_visits = math.log(self.visits)
+        return max(self.children.items(),
+                   key=lambda item: (item[1].total / item[1].visits +
+                                     EXPLORATION * math.sqrt(log_visits / item[1].visits)))
+
+def search(game, player: str, unit_ids: List[str], deadline: float, seed: int,
+           rollout_turns: int = Config.MCTS_ROLLOUT_TURNS,
+           move_candidates: int = Config.MCTS_MOVE_CANDIDATES) -> Dict[Action, Tuple[int, float]]:
+    """Search the decisions of the first of unit_ids until deadline.
+
+    The tree is open loop: a node stands for a sequence of decisions, not a
+    state, since combat is random. A decision that no longer applies in a
+    simulation (its unit or target died) is played as a hold.
+
+    Args:
+        game: Game with player to move, left untouched
+        player: Player searched for
+        unit_ids: Units still to play this turn, in playing order
+        deadline: time.time() at which to stop (after at least one simulation)
+        seed: Seed for the rollouts
+        rollout_turns: Full turns played out after the searched decisions
+        move_candidates: Moves considered per unit
+
+    Returns:
+        Visit count and total value of each root decision tried.
+    """
+    rng = random.Random(seed)
+    root = _Node()
+    fields: Dict = {}
+
+    while True:
+        sim = game.clone(rng.getrandbits(64))
+        node = root
+        path = [root]
+        depth = 0
+
+        # Selection and expansion, one unit per level
+        while depth < len(unit_ids):
+            unit = sim.units.get(unit_ids[depth])
+            if node.untried is None:
+                actions = unit_actions(sim, unit, fields, move_candidates) if unit is not None else [HOLD]
+                node.untried = actions[::-1]
+
+            if node.untried:
+                action = node.untried.pop()
+                child = node.children[action] = _Node()
+            else:
+                action, child = node.select()
+
+            if unit is not None:
+                apply_action(sim, unit, action)
+            node = child
+            path.append(node)
+            depth += 1
+            if node.visits == 0:
+                break
+
+        rollout(sim, unit_ids[depth:], fields, rollout_turns)
+        value = evaluate(sim, player)
+        for node in path:
+            node.visits += 1
+            node.total += value
+
+        if time.time() >= deadline:
+            break
+
+    return {action: (child.visits, child.total) for action, child in root.children.items()}
+
+# In a worker process: turn token -> [game as of the start of the AI's
+# turn, number of the turn's commands replayed on it]
+_turn_games: 'OrderedDict[str, list]' = OrderedDict()
+
+def _search_turn(token: str, payload: Optional[bytes], commands: List[Dict],
+                 *args) -> Optional[Dict[Action, Tuple[int, float]]]:
+    """Worker process entry point: search() on the game of an AI turn.
+
+    The game is unpickled once per turn and worker, then kept up to date
+    by replaying the commands the AI has applied since (combat draws from
+    the game's RNG, so the replay has the same outcome).
+
+    Returns:
+        search()'s result, or None if this worker does not hold the turn's
+        game and the task came without the pickled game.
+    """
+    entry = _turn_games.get(token)
+    if entry is None:
+        if payload is None:
+            return None
+        entry = _turn_games[token] = [pickle.loads(payload), 0]
+        while len(_turn_games) > WORKER_TURNS_KEPT:
+            _turn_games.popitem(last=False)
+    _turn_games.move_to_end(token)
+
+    game, replayed = entry
+    for command in commands[replayed:]:
+        game._apply_action(command)
+    entry[1] = len(commands)
+    return search(game, *args)
+
+class _SharedTurn:
+    """An AI turn's game as the worker processes hold it: pickled once,
+    on the first search, plus the commands applied to it since."""
+
+    def __init__(self):
+        self.token = uuid.uuid4().hex
+        self.payload: Optional[bytes] = None
+        self.commands: List[Dict] = []
+
+    def record(self, commands: List[Dict]):
+        """Note commands applied to the game (once it has been pickled)."""
+        if self.payload is not None:
+            self.commands += commands
+
+class MCTSAI(AIPlayer):
+    """Monte Carlo tree search opponent (see the module docstring).
+
+    Production is picked at random, like the rules AI, but from the AI's
+    own RNG; since the search is bounded by the clock, its choices are not
+    reproducible from the game's RNG and are returned as 'ai_actions'.
+    """
+
+    name = 'mcts'
+
+    def __init__(self, seconds: float = Config.MCTS_TURN_SECONDS, workers: int = Config.MCTS_WORKERS,
+                 rollout_turns: int = Config.MCTS_ROLLOUT_TURNS,
+                 move_candidates: int = Config.MCTS_MOVE_CANDIDATES):
+        """Create the AI.
+
+        Args:
+            seconds: Thinking time per turn (capped by the turn's budget)
+            workers: Rollout processes; 0 searches in the calling thread
+            rollout_turns: Full turns played out by each simulation
+            move_candidates: Moves considered per unit
+        """
+        self.seconds = seconds
+        self.workers = workers
+        self.rollout_turns = rollout_turns
+        self.move_candidates = move_candidates
+        self._rng = random.Random()
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._pool_lock = threading.Lock()
+
+    def _executor(self) -> ProcessPoolExecutor:
+        """Get the worker pool, starting it on first use.
+
+        Workers are spawned rather than forked, since the server process
+        runs request and AI threads that may hold locks.
+        """
+        with self._pool_lock:
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(max_workers=self.workers,
+                                                 mp_context=multiprocessing.get_context('spawn'))
+            return self._pool
+
+    def play_turn(self, game, player: str, budget: Optional[TurnBudget] = None,
+                  max_steps: Optional[int] = None) -> Dict:
+        actions = []
+        for city in game.cities.values():
+            if city.owner == player and not city.current_production:
+                command = {'op': 'produce', 'city_id': city.id,
+                           'unit_type': self._rng.choice(PRODUCTION_TYPES)}
+                if game._apply_action(command)['success']:
+                    actions.append(command)
+
+        unit_ids = [unit.id for unit in game.units.values() if unit.owner == player]
+        deadline = time.time() + self.seconds
+        if budget is not None:
+            budget.start(len(unit_ids))
+            if budget.deadline is not None:
+                deadline = min(deadline, time.time() + budget.deadline - time.monotonic())
+
+        fields: Dict = {}
+        shared = _SharedTurn()
+        steps = 0
+        for i, unit_id in enumerate(unit_ids):
+            if max_steps is not None and steps >= max_steps:
+                if budget is not None:
+                    budget.stopped = STEP_LIMIT
+                break
+            if budget is not None and budget.exhausted():
+                break
+
+            steps += 1
+            if budget is not None:
+                budget.advance(steps)
+            unit = game.units.get(unit_id)
+            if unit is None:
+                continue
+
+            # Split the time left evenly over the units left
+            remaining = [other for other in unit_ids[i:] if other in game.units]
+            share = (deadline - time.time()) / len(remaining)
+            action = self._choose(game, player, remaining, fields, time.time() + max(share, 0.0), shared)
+            applied = apply_action(game, unit, action)
+            shared.record(applied)
+            actions += applied
+
+        return {'ai_steps': steps, 'ai_actions': actions}
+
+    def _choose(self, game, player: str, unit_ids: List[str], fields: Dict,
+                deadline: float, shared: _SharedTurn) -> Action:
+        """Search the first unit's decision and pick the most visited one.
+
+        Workers get the pickled game only with the first search of the
+        turn, or when they turn out not to hold it; otherwise just the
+        commands applied since.
+        """
+        candidates = unit_actions(game, game.units[unit_ids[0]], fields, self.move_candidates)
+        if len(candidates) == 1:
+            return candidates[0]
+
+        args = (player, unit_ids, deadline)
+        settings = (self.rollout_turns, self.move_candidates)
+        if self.workers > 0:
+            payload = None
+            if shared.payload is None:
+                payload = shared.payload = pickle.dumps(game, pickle.HIGHEST_PROTOCOL)
+            pool = self._executor()
+
+            def submit(payload: Optional[bytes]):
+                return pool.submit(_search_turn, shared.token, payload, shared.commands,
+                                   *args, self._rng.getrandbits(64), *settings)
+
+            results = [future.result() for future in [submit(payload) for _ in range(self.workers)]]
+            missed = results.count(None)
+            if missed:
+                results = [result for result in results if result is not None]
+                results += [future.result() for future in [submit(shared.payload) for _ in range(missed)]]
+        else:
+            results = [search(game, *args, self._rng.getrandbits(64), *settings)]
+
+        visits: Dict[Action, int] = {}
+        for result in results:
+            for action, (count, _) in result.items():
+                visits[action] = visits.get(action, 0) + count
+
+        # Ties go to the earlier (more promising) candidate
+        return max(candidates, key=lambda action: visits.get(action, 0))
@@ -0,0 +1,152 @@
+"""Movement and path finding over the hex map."""
+
+from array import array
+from typing import Dict, List, Optional, Tuple
+from server.engine.map import HexMap, DOMAIN_PASSABLE, PASSABLE_BY_UNIT, PASSABLE_ANYWHERE
+from server.models.unit import Unit
+from server.utils.hex_utils import OFF_MAP
+
+class ReachableSet:
+    """Hexes a unit can end its move on, with costs and paths.
+
+    All lookups are by map grid index internally; the public helpers take
+    and return axial positions.
+    """
+
+    def __init__(self, hex_map: HexMap, start: int, costs: Dict[int, int],
+                 parents: Dict[int, int], destinations: List[int]):
+        self.map = hex_map
+        self.start = start
+        self.costs = costs
+        self.parents = parents
+        self.destinations = destinations
+        self._destination_set = set(destinations)
+
+    def __contains__(self, position: Tuple[int, int]) -> bool:
+        return self.map.index_of(position) in self._destination_set
+
+    def cost_to(self, position: Tuple[int, int]) -> Optional[int]:
+        """Get the movement cost to end on position, or None if unreachable."""
+        index = self.map.index_of(position)
+        if index not in self._destination_set:
+            return None
+        return self.costs[index]
+
+    def path_to(self, position: Tuple[int, int]) -> List[Tuple[int, int]]:
+        """Get the hexes stepped through to reach position (start excluded)."""
+        index = self.map.index_of(position)
+        if index not in self._destination_set:
+            return []
+
+        path = []
+        while index != self.start:
+            path.append(self.map.position_of(index))
+            index = self.parents[index]
+        path.reverse()
+        return path
+
+    def to_list(self) -> List[dict]:
+        """Convert destinations to dictionaries for the API."""
+        position_of = self.map.position_of
+        results = []
+        for index in self.destinations:
+            q, r = position_of(index)
+            results.append({
+                'q': q,
+                'r': r,
+                'cost': self.costs[index],
+                'from': list(position_of(self.parents[index]))
+            })
+        return results
+
+def find_reachable(hex_map: HexMap, unit_type: str, owner: str, start: Tuple[int, int],
+                   movement: int, units: Dict[str, Unit]) -> ReachableSet:
+    """Compute every hex a unit can move to this turn.
+
+    Every step costs one movement point, so this is Dijkstra's algorithm
+    run as a breadth-first search. Units may only enter terrain their type
+    can pass, may move through hexes held by friendly units but not stop
+    there, and cannot enter hexes held by enemy units.
+
+    Args:
+        hex_map: Map to search
+        unit_type: Type of the moving unit
+        owner: Owner of the moving unit
+        start: Current position of the unit
+        movement: Movement points available
+        units: All units by id, to tell friend from foe
+    """
+    passable = PASSABLE_BY_UNIT.get(unit_type, PASSABLE_ANYWHERE)
+    terrain = hex_map.terrain
+    unit_grid = hex_map.unit_grid
+    ids = hex_map._ids
+    neighbors = hex_map.kernel.neighbors
+
+    start_index = hex_map.index_of(start)
+    costs = {start_index: 0}
+    parents: Dict[int, int] = {}
+    destinations: List[int] = []
+    frontier = [start_index]
+
+    for cost in range(1, movement + 1):
+        next_frontier = []
+        for index in frontier:
+            for neighbor in neighbors[index * 6:index * 6 + 6]:
+                if neighbor == OFF_MAP or neighbor in costs or not passable[terrain[neighbor]]:
+                    continue
+
+                occupant = ids[unit_grid[neighbor]]
+                if occupant is not None and units[occupant].owner != owner:
+                    continue
+
+                costs[neighbor] = cost
+                parents[neighbor] = index
+                next_frontier.append(neighbor)
+                if occupant is None:
+                    destinations.append(neighbor)
+        frontier = next_frontier
+
+    return ReachableSet(hex_map, start_index, costs, parents, destinations)
+
+# Distance field value for hexes no source can reach
+UNREACHED = -1
+
+def distance_field(hex_map: HexMap, sources: List[int], domain: str) -> array:
+    """Compute the step distance from every hex to the nearest source.
+
+    A multi-source breadth-first sweep over the terrain passable for a
+    movement domain. Sources themselves may be impassable (an enemy ship
+    seen by land units), so units can still be guided next to them. Units
+    are ignored: the field is shared by every unit for a whole turn.
+
+    Args:
+        hex_map: Map to sweep
+        sources: Grid indexes to measure distance to
+        domain: Movement domain ('land', 'sea' or 'air')
+
+    Returns:
+        Array of distances by grid index, UNREACHED where no path exists.
+    """
+    passable = DOMAIN_PASSABLE[domain]
+    terrain = hex_map.terrain
+    neighbors = hex_map.kernel.neighbors
+
+    field = array('i', [UNREACHED]) * hex_map.size
+    frontier = []
+    for index in sources:
+        if index >= 0 and field[index] == UNREACHED:
+            field[index] = 0
+            frontier.append(index)
+
+    distance = 0
+    while frontier:
+        distance += 1
+        next_frontier = []
+        for index in frontier:
+            for neighbor in neighbors[index * 6:index * 6 + 6]:
+                if neighbor != OFF_MAP and field[neighbor] == UNREACHED and passable[terrain[neighbor]]:
+                    field[neighbor] = distance
+                    next_frontier.append(neighbor)
+        frontier = next_frontier
+
+    return field
@@ -0,0 +1,217 @@
+"""Registry of active game sessions."""
+
+import os
+import re
+import threading
+import uuid
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+from server.engine.game import GameController
+from server.engine.savefile import BINARY_SAVE_EXTENSION
+from server.config import Config
+
+GAME_ID_PATTERN = re.compile(r'^[0-9a-f]{32}$')
+
+class GameRegistry:
+    """Holds active games in memory, evicting idle ones to disk.
+
+    At most ``capacity`` games stay in memory. When the budget is exceeded
+    the least recently used game is written to the session save directory
+    and dropped; the next request for it loads it back transparently.
+
+    Games in use are pinned (see get() and release()) and never evicted, so
+    a change made through a game object always reaches the registry's copy.
+    Evicted games are written and read back outside the registry lock;
+    until the write is done get() hands out the same object again instead
+    of reading the file.
+    """
+
+    def __init__(self, capacity: int = Config.MAX_ACTIVE_GAMES,
+                 session_dir: str = Config.SESSION_SAVE_SUBDIR,
+                 save_format: str = Config.SESSION_SAVE_FORMAT):
+        self.capacity = max(1, capacity)
+        self.session_dir = session_dir
+        self.save_format = save_format
+        self._games: 'OrderedDict[str, GameController]' = OrderedDict()
+        # game id -> number of holders that must not see the game evicted
+        self._pins: Dict[str, int] = {}
+        # Games being written to disk, by id
+        self._evicting: Dict[str, GameController] = {}
+        # Evicted games being read back from disk, by id
+        self._loading: Dict[str, threading.Event] = {}
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.join(Config.SAVE_DIR, session_dir), exist_ok=True)
+
+    def __len__(self) -> int:
+        return len(self._games)
+
+    def games(self) -> List[GameController]:
+        """Get the games in memory (evicted games are not loaded back)."""
+        with self._lock:
+            return list(self._games.values())
+
+    def create(self, width: int, height: int, ai_opponent: str = Config.AI_OPPONENT,
+               fog: bool = Config.FOG_OF_WAR) -> Tuple[str, GameController]:
+        """Start a new game and register it."""
+        game = GameController(width, height, ai_opponent=ai_opponent, fog=fog)
+        return self.add(game), game
+
+    def add(self, game: GameController) -> str:
+        """Register an existing game under a fresh id."""
+        game_id = uuid.uuid4().hex
+
+        with self._lock:
+            self._games[game_id] = game
+            evicted = self._take_overflow()
+        self._persist_all(evicted)
+
+        return game_id
+
+    def get(self, game_id: str, pin: bool = False) -> Optional[GameController]:
+        """Get a game by id, loading it from disk if it was evicted.
+
+        The file is read outside the registry lock, so other games stay
+        available meanwhile; concurrent requests for the same game wait for
+        the one load instead of reading the file again.
+
+        Args:
+            game_id: Id of the game
+            pin: Keep the game in memory until release() is called for it
+        """
+        if not is_valid_game_id(game_id):
+            return None
+
+        while True:
+            with self._lock:
+                game = self._games.get(game_id)
+                if game is None:
+                    # Still being written out: take the same object back
+                    game = self._evicting.get(game_id)
+                if game is not None:
+                    evicted = self._insert(game_id, game, pin)
+                    break
+
+                loading = self._loading.get(game_id)
+                if loading is None:
+                    loading = self._loading[game_id] = threading.Event()
+                    break
+            # Another request is loading the game: use its copy
+            loading.wait()
+
+        if game is None:
+            try:
+                if os.path.exists(os.path.join(Config.SAVE_DIR, self._session_file(game_id))):
+                    game = GameController.load_game(self._session_file(game_id), cached=False)
+            finally:
+                with self._lock:
+                    del self._loading[game_id]
+                    if game is not None:
+                        game = self._games.setdefault(game_id, game)
+                        evicted = self._insert(game_id, game, pin)
+                loading.set()
+            if game is None:
+                return None
+
+        self._persist_all(evicted)
+        return game
+
+    def _insert(self, game_id: str, game: GameController, pin: bool) -> List[Tuple[str, GameController]]:
+        """Make a game the most recently used one, pinning it if asked
+        (caller holds the lock and then calls _persist_all())."""
+        self._games[game_id] = game
+        self._games.move_to_end(game_id)
+        if pin:
+            self._pins[game_id] = self._pins.get(game_id, 0) + 1
+        return self._take_overflow()
+
+    def pin(self, game_id: str) -> bool:
+        """Keep a game that is in memory from being evicted (see release()).
+
+        Returns:
+            False if the game is not in memory.
+        """
+        with self._lock:
+            if game_id not in self._games:
+                return False
+            self._pins[game_id] = self._pins.get(game_id, 0) + 1
+        return True
+
+    def release(self, game_id: str):
+        """Drop a pin taken by get() or pin(), evicting if over capacity."""
+        with self._lock:
+            pins = self._pins.get(game_id, 0) - 1
+            if pins > 0:
+                self._pins[game_id] = pins
+            else:
+                self._pins.pop(game_id, None)
+            evicted = self._take_overflow()
+        self._persist_all(evicted)
+
+    def evict(self, game_id: str) -> bool:
+        """Write a game to disk and drop it from memory (not if it is pinned)."""
+        with self._lock:
+            if self._pins.get(game_id) or game_id in self._evicting:
+                return False
+            game = self._games.pop(game_id, None)
+            if game is None:
+                return False
+            self._evicting[game_id] = game
+        self._persist(game_id, game)
+        return True
+
+    def _take_overflow(self) -> List[Tuple[str, GameController]]:
+        """Pick the least recently used unpinned games to evict until within
+        capacity (caller holds the lock and then calls _persist_all())."""
+        evicted = []
+        if len(self._games) <= self.capacity:
+            return evicted
+
+        # The most recently used game is the one the caller is about to use
+        for game_id in list(self._games)[:-1]:
+            if len(self._games) <= self.capacity:
+                break
+            if self._pins.get(game_id) or game_id in self._evicting:
+                continue
+            game = self._games.pop(game_id)
+            self._evicting[game_id] = game
+            evicted.append((game_id, game))
+        return evicted
+
+    def _persist_all(self, evicted: List[Tuple[str, GameController]]):
+        """Write out the games _take_overflow() picked."""
+        for game_id, game in evicted:
+            self._persist(game_id, game)
+
+    def _persist(self, game_id: str, game: GameController):
+        """Save an evicted session game under its id, waiting for any running
+        write, then forget it unless get() took it back meanwhile."""
+        try:
+            with game.lock:
+                game.save_game(os.path.join(self.session_dir, game_id), timestamp=False,
+                               save_format=self.save_format, catalog=False, journal=True)
+        except Exception:
+            # Keep the game rather than lose it
+            with self._lock:
+                self._games.setdefault(game_id, game)
+            raise
+        finally:
+            with self._lock:
+                self._evicting.pop(game_id, None)
+                kept = game_id in self._games
+                # Free the journal for the copy the next get() loads
+                if not kept and game.journal is not None:
+                    game.journal.detach(game)
+
+        if not kept:
+            game.events.close()
+
+    def _session_file(self, game_id: str) -> str:
+        """Get the save file name of an evicted game."""
+        extension = BINARY_SAVE_EXTENSION if self.save_format == 'binary' else '.json'
+        return os.path.join(self.session_dir, f'{game_id}{extension}')
+
+def is_valid_game_id(game_id: Optional[str]) -> bool:
+    """Check that a game id is well formed (and safe to use in a path)."""
+    return bool(game_id) and GAME_ID_PATTERN.match(game_id) is not None
@@ -0,0 +1,292 @@
+"""Compact binary save format.
+
+A save file is a small uncompressed header followed by a body that is
+optionally zlib-compressed. The body holds the game scalars, a string
+table (ids, names, unit types and players are stored as indexes into it),
+the raw terrain grid and fixed-width unit and city records:
+
+    header     magic 'SCQS', format version, flags
+    game       map size, turn, counters, player string indexes, counts
+    strings    NUL-separated UTF-8
+    resources  (player, amount) records
+    terrain    one byte per hex, in map grid order
+    units      fixed-width records
+    cities     fixed-width records
+    rng        Mersenne Twister state (when FLAG_RNG is set)
+    ai         AI opponent string index (when FLAG_AI_OPPONENT is set)
+
+FLAG_FOG marks games with fog of war; it has no section of its own.
+
+Map occupancy is not stored; it is rebuilt from unit and city positions.
+The loader reads section by section from the (decompressed) stream and
+unpacks records straight from the buffers, so no intermediate dicts are
+built. Convert existing JSON saves with:
+
+    python -m server.engine.savefile saves/mygame.json
+"""
+
+import os
+import struct
+import sys
+import zlib
+from typing import BinaryIO, Dict, List, Optional, Tuple
+
+from server.engine.map import HexMap
+from server.models.unit import Unit
+from server.models.city import City
+from server.config import Config
+
+MAGIC = b'SCQS'
+FORMAT_VERSION = 1
+BINARY_SAVE_EXTENSION = '.scqs'
+
+FLAG_COMPRESSED = 1
+FLAG_RNG = 2
+FLAG_AI_OPPONENT = 4
+FLAG_FOG = 8
+FLAG_JOURNAL = 16
+
+# String index standing for None
+NO_STRING = 0xFFFFFFFF
+
+HEADER = struct.Struct('<4sHH')
+# width, height, turn, version, unit counter, city counter, current player,
+# winner, ai player, journal, game over, string count, string bytes,
+# resource count, unit count, city count
+GAME = struct.Struct('<HHIIIIIIIIBIIHII')
+RESOURCE = struct.Struct('<Ii')
+# id, type, owner, q, r, health, movement remaining, has attacked
+UNIT = struct.Struct('<IIIhhhhB')
+# id, name, owner, q, r, production capacity, current production, progress
+CITY = struct.Struct('<IIIhhhIi')
+RNG_STATE_LENGTH = 625
+RNG = struct.Struct(f'<I{RNG_STATE_LENGTH}IBd')
+# AI opponent name (string index)
+AI_OPPONENT = struct.Struct('<I')
+# Sequence number of the last journaled command
+JOURNAL_SEQ = struct.Struct('<I')
+
+READ_CHUNK_SIZE = 64 * 1024
+
+class _StringTable:
+    """Interns strings into indexes while writing."""
+
+    def __init__(self):
+        self.strings: List[str] = []
+        self._indexes: Dict[str, int] = {}
+
+    def __call__(self, value: Optional[str]) -> int:
+        if value is None:
+            return NO_STRING
+        index = self._indexes.get(value)
+        if index is None:
+            index = len(self.strings)
+            self.strings.append(value)
+            self._indexes[value] = index
+        return index
+
+class _Reader:
+    """Reads exact byte counts from a save body, decompressing as it goes."""
+
+    def __init__(self, f, compressed: bool):
+        self._file = f
+        self._decompressor = zlib.decompressobj() if compressed else None
+        self._buffer = bytearray()
+
+    def read(self, size: int) -> bytes:
+        if self._decompressor is None:
+            data = self._file.read(size)
+        else:
+            while len(self._buffer) < size:
+                chunk = self._file.read(READ_CHUNK_SIZE)
+                if not chunk:
+                    self._buffer += self._decompressor.flush()
+                    break
+                self._buffer += self._decompressor.decompress(chunk)
+            data = bytes(self._buffer[:size])
+            del self._buffer[:size]
+
+        if len(data) < size:
+            raise ValueError('Truncated save file')
+        return data
+
+def is_binary_save(filepath: str) -> bool:
+    """Check whether a file starts with the binary save magic."""
+    with open(filepath, 'rb') as f:
+        return f.read(len(MAGIC)) == MAGIC
+
+def write_binary_save(game, filepath: str, compress: bool = Config.SAVE_COMPRESSION,
+                      journal: bool = False) -> str:
+    """Write a game in the binary save format.
+
+    Args:
+        game: GameController to save
+        filepath: Destination path (written atomically)
+        compress: zlib-compress the body
+        journal: Record the attached journal and its position (session saves)
+    """
+    string = _StringTable()
+    hex_map = game.map
+
+    units = b''.join(UNIT.pack(
+        string(unit.id), string(unit.type), string(unit.owner),
+        unit.position[0], unit.position[1], unit.health,
+        unit.movement_remaining, unit.has_attacked
+    ) for unit in game.units.values())
+
+    cities = b''.join(CITY.pack(
+        string(city.id), string(city.name), string(city.owner),
+        city.position[0], city.position[1], city.production_capacity,
+        string(city.current_production), city.production_progress
+    ) for city in game.cities.values())
+
+    resources = b''.join(RESOURCE.pack(string(player), amount)
+                         for player, amount in game.resources.items())
+
+    journal_name = game.journal.name if journal and game.journal is not None else None
+    fields = (hex_map.width, hex_map.height, game.turn, game.version,
+              game._unit_counter, game._city_counter, string(game.current_player),
+              string(game.winner), string(game.ai_player), string(journal_name),
+              game.game_over)
+    ai_opponent = string(game.ai_opponent)
+
+    # Every string is interned by now
+    strings = '\x00'.join(string.strings).encode('utf-8')
+    body = [
+        GAME.pack(*fields, len(string.strings), len(strings), len(game.resources),
+                  len(game.units), len(game.cities)),
+        strings,
+        resources,
+        bytes(hex_map.terrain),
+        units,
+        cities
+    ]
+
+    flags = FLAG_RNG | FLAG_AI_OPPONENT
+    if game.fog:
+        flags |= FLAG_FOG
+    version, internal, gauss = game.rng.getstate()
+    body.append(RNG.pack(version, *internal, gauss is not None, gauss or 0.0))
+    body.append(AI_OPPONENT.pack(ai_opponent))
+    if journal_name is not None:
+        flags |= FLAG_JOURNAL
+        body.append(JOURNAL_SEQ.pack(game.journal.seq))
+
+    if compress:
+        flags |= FLAG_COMPRESSED
+        compressor = zlib.compressobj()
+        body = [compressor.compress(part) for part in body] + [compressor.flush()]
+
+    temp_path = filepath + '.tmp'
+    with open(temp_path, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, FORMAT_VERSION, flags))
+        for part in body:
+            f.write(part)
+    os.replace(temp_path, filepath)
+
+    return filepath
+
+def read_binary_save(filepath: str) -> Tuple[HexMap, List[Unit], List[City], Dict]:
+    """Read a binary save file.
+
+    Returns:
+        The map (with occupancy), units, cities and the remaining fields in
+        get_save_data() form, ready for GameController.from_parts().
+    """
+    with open(filepath, 'rb') as f:
+        return read_binary_stream(f)
+
+def read_binary_stream(f: BinaryIO) -> Tuple[HexMap, List[Unit], List[City], Dict]:
+    """Read a binary save from an open binary stream (see read_binary_save())."""
+    magic, version, flags = HEADER.unpack(f.read(HEADER.size))
+    if magic != MAGIC:
+        raise ValueError('Not a binary save file')
+    if version > FORMAT_VERSION:
+        raise ValueError(f'Unsupported save format version: {version}')
+
+    reader = _Reader(f, bool(flags & FLAG_COMPRESSED))
+
+    (width, height, turn, state_version, unit_counter, city_counter,
+     current_player, winner, ai_player, journal, game_over,
+     string_count, string_bytes, resource_count, unit_count,
+     city_count) = GAME.unpack(reader.read(GAME.size))
+
+    strings = reader.read(string_bytes).decode('utf-8').split('\x00') if string_count else []
+
+    def string(index: int) -> Optional[str]:
+        return None if index == NO_STRING else strings[index]
+
+    resources = {string(player): amount for player, amount
+                 in RESOURCE.iter_unpack(reader.read(resource_count * RESOURCE.size))}
+
+    hex_map = HexMap.from_terrain(width, height, reader.read(width * height))
+
+    units = []
+    for (unit_id, unit_type, owner, q, r, health, movement,
+         has_attacked) in UNIT.iter_unpack(reader.read(unit_count * UNIT.size)):
+        unit = Unit(string(unit_id), string(unit_type), string(owner), (q, r),
+                    health, movement, bool(has_attacked))
+        hex_map.set_unit(unit.position, unit.id)
+        units.append(unit)
+
+    cities = []
+    for (city_id, name, owner, q, r, capacity, production,
+         progress) in CITY.iter_unpack(reader.read(city_count * CITY.size)):
+        city = City(string(city_id), string(name), (q, r), string(owner),
+                    capacity, string(production), progress)
+        hex_map.set_city(city.position, city.id)
+        cities.append(city)
+
+    data = {
+        'turn': turn,
+        'current_player': string(current_player),
+        'resources': resources,
+        'game_over': bool(game_over),
+        'winner': string(winner),
+        'ai_player': string(ai_player),
+        'unit_counter': unit_counter,
+        'city_counter': city_counter,
+        'version': state_version,
+        'journal': string(journal)
+    }
+
+    if flags & FLAG_RNG:
+        rng = RNG.unpack(reader.read(RNG.size))
+        has_gauss, gauss = rng[-2:]
+        data['rng_state'] = [rng[0], list(rng[1:1 + RNG_STATE_LENGTH]),
+                             gauss if has_gauss else None]
+
+    if flags & FLAG_AI_OPPONENT:
+        data['ai_opponent'] = string(AI_OPPONENT.unpack(reader.read(AI_OPPONENT.size))[0])
+
+    if flags & FLAG_JOURNAL:
+        data['journal_seq'] = JOURNAL_SEQ.unpack(reader.read(JOURNAL_SEQ.size))[0]
+
+    data['fog'] = bool(flags & FLAG_FOG)
+    return hex_map, units, cities, data
+
+def convert_json_save(filepath: str, compress: bool = Config.SAVE_COMPRESSION) -> str:
+    """Convert a JSON save to a binary save next to it.
+
+    Returns:
+        Path of the binary save.
+    """
+    from server.engine.game import GameController
+
+    game = GameController.load_game(os.path.abspath(filepath))
+    target = os.path.splitext(filepath)[0] + BINARY_SAVE_EXTENSION
+    return write_binary_save(game, target, compress)
+
+def main(argv: Optional[List[str]] = None):
+    """Command line entry point: convert the given JSON saves."""
+    paths = sys.argv[1:] if argv is None else argv
+    if not paths:
+        print('usage: python -m server.engine.savefile SAVE.json [SAVE.json ...]')
+        return
+
+    for path in paths:
+        target = convert_json_save(path)
+        print(f'{path} ({os.path.getsize(path)} bytes) -> {target} ({os.path.getsize(target)} bytes)')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,185 @@
+"""Headless AI-vs-AI batch simulation.
+
+Plays complete games without Flask, fanned out over a process pool, for
+balance testing of UNIT_STATS. Run from the project root:
+
+    python -m server.engine.simulation --games 1000 --seed 1
+"""
+
+import argparse
+import json
+import os
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional
+
+from server.engine.game import GameController
+from server.engine.mcts import MCTSAI
+from server.config import Config
+
+PLAYERS = ('player1', 'player2')
+
+def rules_policy(game: GameController, player: str):
+    """Play a turn with the built-in rule-based AI."""
+    game._ai_turn(player)
+
+# Games already run in parallel, so each searches in its own process
+_mcts = MCTSAI(workers=0)
+
+def mcts_policy(game: GameController, player: str):
+    """Play a turn with the Monte Carlo tree search AI."""
+    _mcts.play_turn(game, player)
+
+def passive_policy(game: GameController, player: str):
+    """Do nothing; a baseline opponent."""
+
+# Turn policies by name; a policy plays all of one player's moves for a turn
+POLICIES: Dict[str, Callable[[GameController, str], None]] = {
+    'rules': rules_policy,
+    'mcts': mcts_policy,
+    'passive': passive_policy
+}
+
+@dataclass
+class GameResult:
+    """Outcome of one simulated game."""
+    seed: int
+    winner: Optional[str]  # None if max_turns ran out
+    turns: int  # last turn played
+    player_turns: int  # turns taken by either player
+    setup_seconds: float
+    play_seconds: float
+
+def play_game(seed: int, width: int = Config.DEFAULT_MAP_WIDTH,
+              height: int = Config.DEFAULT_MAP_HEIGHT, max_turns: int = 200,
+              policies: tuple = ('rules', 'rules')) -> GameResult:
+    """Play one complete game.
+
+    Args:
+        seed: Seed for map generation, combat and AI choices
+        width: Map width
+        height: Map height
+        max_turns: Stop (as a draw) after this many full turns
+        policies: Policy names for player1 and player2
+    """
+    started = time.perf_counter()
+    game = GameController(width, height, seed=seed, ai_player=None, fog=False)
+    setup_seconds = time.perf_counter() - started
+
+    players = dict(zip(PLAYERS, (POLICIES[name] for name in policies)))
+    player_turns = 0
+    # end_turn() already advances the turn counter, so note the turn played
+    last_turn = 0
+
+    started = time.perf_counter()
+    while not game.game_over and game.turn <= max_turns:
+        last_turn = game.turn
+        players[game.current_player](game, game.current_player)
+        game.end_turn()
+        player_turns += 1
+    play_seconds = time.perf_counter() - started
+
+    return GameResult(
+        seed=seed,
+        winner=game.winner,
+        turns=last_turn,
+        player_turns=player_turns,
+        setup_seconds=setup_seconds,
+        play_seconds=play_seconds
+    )
+
+def _play_game_args(args: tuple) -> GameResult:
+    """Unpack arguments for play_game (process pool helper)."""
+    return play_game(*args)
+
+def run_batch(games: int, seed: int = 0, workers: Optional[int] = None,
+              width: int = Config.DEFAULT_MAP_WIDTH, height: int = Config.DEFAULT_MAP_HEIGHT,
+              max_turns: int = 200, policies: tuple = ('rules', 'rules')) -> Dict:
+    """Play a batch of games and summarize them.
+
+    Game i uses seed ``seed + i``, so a batch is reproducible regardless
+    of how it is split across workers.
+
+    Args:
+        games: Number of games
+        seed: Seed of the first game
+        workers: Worker processes (defaults to the CPU count; 1 runs inline)
+        width: Map width
+        height: Map height
+        max_turns: Turn limit per game
+        policies: Policy names for player1 and player2
+    """
+    for name in policies:
+        if name not in POLICIES:
+            raise ValueError(f'Unknown policy: {name}')
+
+    workers = workers or os.cpu_count() or 1
+    jobs = [(seed + i, width, height, max_turns, tuple(policies)) for i in range(games)]
+
+    started = time.perf_counter()
+    if workers == 1:
+        results = [_play_game_args(job) for job in jobs]
+    else:
+        chunksize = max(1, games // (workers * 4))
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(_play_game_args, jobs, chunksize=chunksize))
+    wall_seconds = time.perf_counter() - started
+
+    return summarize(results, wall_seconds, workers)
+
+def summarize(results: List[GameResult], wall_seconds: float, workers: int = 1) -> Dict:
+    """Aggregate game results into throughput and winner statistics."""
+    games = len(results)
+    turns = sum(r.turns for r in results)
+    player_turns = sum(r.player_turns for r in results)
+    play_seconds = sum(r.play_seconds for r in results)
+    winners = Counter(r.winner or 'draw' for r in results)
+
+    return {
+        'games': games,
+        'workers': workers,
+        'wall_seconds': wall_seconds,
+        'games_per_second': games / wall_seconds if wall_seconds else 0.0,
+        'turns_per_second': turns / wall_seconds if wall_seconds else 0.0,
+        'mean_turn_latency_ms': 1000 * play_seconds / player_turns if player_turns else 0.0,
+        'mean_setup_ms': 1000 * sum(r.setup_seconds for r in results) / games if games else 0.0,
+        'mean_game_turns': turns / games if games else 0.0,
+        'winners': {name: winners.get(name, 0) for name in PLAYERS + ('draw',)},
+        'win_rates': {name: winners.get(name, 0) / games if games else 0.0
+                      for name in PLAYERS + ('draw',)}
+    }
+
+def main(argv: Optional[List[str]] = None):
+    """Command line entry point."""
+    parser = argparse.ArgumentParser(description='Run headless AI-vs-AI games.')
+    parser.add_argument('--games', type=int, default=100, help='number of games')
+    parser.add_argument('--seed', type=int, default=0, help='seed of the first game')
+    parser.add_argument('--workers', type=int, default=None, help='worker processes (default: CPU count)')
+    parser.add_argument('--width', type=int, default=Config.DEFAULT_MAP_WIDTH)
+    parser.add_argument('--height', type=int, default=Config.DEFAULT_MAP_HEIGHT)
+    parser.add_argument('--max-turns', type=int, default=200, help='turn limit before a draw')
+    parser.add_argument('--player1', default='rules', choices=sorted(POLICIES))
+    parser.add_argument('--player2', default='rules', choices=sorted(POLICIES))
+    parser.add_argument('--json', action='store_true', help='print the report as JSON')
+    args = parser.parse_args(argv)
+
+    report = run_batch(args.games, args.seed, args.workers, args.width, args.height,
+                       args.max_turns, (args.player1, args.player2))
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+
+    print(f"{report['games']} games on {report['workers']} workers in {report['wall_seconds']:.2f}s")
+    print(f"  games/sec:          {report['games_per_second']:.1f}")
+    print(f"  turns/sec:          {report['turns_per_second']:.1f}")
+    print(f"  mean turn latency:  {report['mean_turn_latency_ms']:.3f} ms")
+    print(f"  mean setup:         {report['mean_setup_ms']:.3f} ms")
+    print(f"  mean game length:   {report['mean_game_turns']:.1f} turns")
+    for name in PLAYERS + ('draw',):
+        print(f"  {name:<8}            {report['winners'][name]} ({100 * report['win_rates'][name]:.1f}%)")
+
+if __name__ == '__main__':
+    main()
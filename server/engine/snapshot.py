@@ -0,0 +1,418 @@
+"""Immutable published snapshots of game state."""
+
+from array import array
+from typing import Dict, List, Optional, Tuple
+
+# City fields only the owner sees under fog of war
+PRIVATE_CITY_FIELDS = ('current_production', 'production_progress')
+
+class StateSnapshot:
+    """Serialized game state as of one committed version.
+
+    Snapshots are never modified once published, so readers can use them
+    without holding the game's writer lock. A new snapshot reuses the
+    serialized units, cities and hexes of the previous one and only
+    re-serializes what the change journal says was touched.
+
+    Under fog of war the snapshot also holds a copy of every player's
+    visibility mask (shared with the previous snapshot while unchanged),
+    and the state and deltas can be asked for as one player sees them:
+    enemy units only where the player sees, every hex flagged ``visible``,
+    enemy cities without their production and only the player's own
+    resources.
+    """
+
+    def __init__(self, version: int, scalars: Dict, hex_map, units: Dict[str, dict],
+                 cities: Dict[str, dict], journal: tuple, chunk_versions: array,
+                 masks: Optional[Dict[str, Tuple[int, bytes]]] = None,
+                 base_hexes: Optional[Tuple[Dict, set]] = None):
+        self.version = version
+        self.scalars = scalars
+        # Copy-on-write clone of the game's map as of this version; hexes
+        # are serialized from it only when asked for
+        self.map = hex_map
+        self.width = hex_map.width
+        self.height = hex_map.height
+        self.units = units
+        self.cities = cities
+        self.journal = journal
+        # Version at which each map chunk last changed
+        self.chunk_versions = chunk_versions
+        # player -> (mask revision, one byte per hex), with fog of war
+        self.masks = masks
+        self.index_of = hex_map.index_of
+        # (serialized hexes of an earlier snapshot, positions changed since)
+        self._base_hexes = base_hexes
+        self._hexes: Optional[Dict[Tuple[int, int], dict]] = None
+        self._state: Optional[Dict] = None
+        self._state_without_hexes: Optional[Dict] = None
+        self._views: Dict[Tuple[str, bool], Dict] = {}
+
+    @staticmethod
+    def capture(game, previous: Optional['StateSnapshot'] = None) -> 'StateSnapshot':
+        """Serialize the committed state of a game.
+
+        Hexes are not serialized here: the snapshot keeps a copy-on-write
+        clone of the map and builds the hex list on first use (see
+        hexes()), reusing the previous snapshot's if that one was built.
+
+        Args:
+            game: GameController to capture (caller holds its writer lock)
+            previous: Last snapshot of the same game, reused where unchanged
+        """
+        if previous is not None and previous.version == game.version:
+            return previous
+
+        journal = tuple(game._journal)
+        changed = None
+        if previous is not None:
+            changed = changes_since(journal, previous.version, game.version)
+
+        base_hexes = None
+        if changed is None:
+            units = {unit_id: unit.to_dict() for unit_id, unit in game.units.items()}
+            cities = {city_id: city.to_dict() for city_id, city in game.cities.items()}
+        else:
+            units = dict(previous.units)
+            cities = dict(previous.cities)
+            changed_hexes = set()
+            added_units = False
+
+            for kind, key in changed:
+                if kind == 'unit':
+                    unit = game.units.get(key)
+                    if unit:
+                        added_units = added_units or key not in units
+                        units[key] = unit.to_dict()
+                    else:
+                        units.pop(key, None)
+                elif kind == 'city':
+                    city = game.cities.get(key)
+                    if city:
+                        cities[key] = city.to_dict()
+                elif kind == 'hex':
+                    changed_hexes.add(key)
+
+            # Changes come unordered: keep new units in the game's order
+            if added_units:
+                units = {unit_id: units[unit_id] for unit_id in game.units}
+
+            # Only a hex list the previous snapshot already built is reused,
+            # so snapshots never keep older ones alive through each other
+            if previous._hexes is not None:
+                base_hexes = (previous._hexes, changed_hexes)
+            elif previous._base_hexes is not None:
+                base, base_changed = previous._base_hexes
+                base_hexes = (base, base_changed | changed_hexes)
+
+        scalars = {
+            'turn': game.turn,
+            'current_player': game.current_player,
+            'resources': dict(game.resources),
+            'game_over': game.game_over,
+            'winner': game.winner,
+            'fog': game.fog
+        }
+
+        masks = None
+        if game.visibility is not None:
+            masks = {}
+            previous_masks = previous.masks if previous is not None and previous.masks else {}
+            for player, revision in game.visibility.revisions.items():
+                kept = previous_masks.get(player)
+                if kept is not None and kept[0] == revision:
+                    masks[player] = kept
+                else:
+                    masks[player] = (revision, bytes(game.visibility.masks[player]))
+
+        return StateSnapshot(game.version, scalars, game.map.clone(), units, cities, journal,
+                             array('i', game.chunk_versions), masks, base_hexes)
+
+    def hexes(self) -> Dict[Tuple[int, int], dict]:
+        """Get the serialized hexes by position, building them on first use."""
+        if self._hexes is None:
+            if self._base_hexes is not None:
+                base, changed = self._base_hexes
+                hexes = dict(base)
+                for position in changed:
+                    hex_data = self._hex(position)
+                    if hex_data is not None:
+                        hexes[position] = hex_data
+            else:
+                hexes = {(hex_data['q'], hex_data['r']): hex_data
+                         for hex_data in self.map.to_dict()['hexes']}
+            self._hexes = hexes
+            self._base_hexes = None
+        return self._hexes
+
+    def _hex(self, position) -> Optional[dict]:
+        """Get one serialized hex (from the built hex list if there is one)."""
+        if self._hexes is not None:
+            return self._hexes.get(position)
+        hex_tile = self.map.get_hex(position)
+        return hex_tile.to_dict() if hex_tile is not None else None
+
+    def sees(self, player: str, position) -> bool:
+        """Check whether a player saw a hex at this version."""
+        index = self.index_of(tuple(position))
+        return index >= 0 and self.masks[player][1][index] == 1
+
+    def _filters(self, player: Optional[str]) -> bool:
+        """Check whether state asked for as player has to be filtered."""
+        return player is not None and self.masks is not None and player in self.masks
+
+    def _unit_visible(self, player: str, unit: dict) -> bool:
+        return unit['owner'] == player or self.sees(player, unit['position'])
+
+    def _filter_city(self, player: str, city: dict) -> dict:
+        if city['owner'] == player:
+            return city
+        return {**city, **{field: None for field in PRIVATE_CITY_FIELDS}}
+
+    def _filter_hex(self, player: str, hex_data: dict) -> dict:
+        visible = self.sees(player, (hex_data['q'], hex_data['r']))
+        filtered = {**hex_data, 'visible': visible}
+        if not visible and hex_data['unit_id'] is not None:
+            unit = self.units.get(hex_data['unit_id'])
+            if unit is None or unit['owner'] != player:
+                filtered['unit_id'] = None
+        return filtered
+
+    def _filter_scalar(self, player: str, key: str):
+        value = self.scalars[key]
+        if key == 'resources':
+            return {player: value.get(player, 0)}
+        return value
+
+    def get_state(self, player: Optional[str] = None) -> Dict:
+        """Get the full state, in the same shape as GameController.get_state().
+
+        Args:
+            player: Get the state as this player sees it (with fog of war)
+        """
+        if self._filters(player):
+            return self._view(player, True)
+
+        if self._state is None:
+            state = self.get_state_without_hexes()
+            self._state = {**state, 'map': {**state['map'], 'hexes': list(self.hexes().values())}}
+        return self._state
+
+    def get_state_without_hexes(self, player: Optional[str] = None) -> Dict:
+        """Get the full state minus the hex list (for clients using map tiles)."""
+        if self._filters(player):
+            return self._view(player, False)
+
+        if self._state_without_hexes is None:
+            self._state_without_hexes = {
+                'version': self.version,
+                'turn': self.scalars['turn'],
+                'current_player': self.scalars['current_player'],
+                'map': {
+                    'width': self.width,
+                    'height': self.height
+                },
+                'units': list(self.units.values()),
+                'cities': list(self.cities.values()),
+                'resources': self.scalars['resources'],
+                'game_over': self.scalars['game_over'],
+                'winner': self.scalars['winner'],
+                'fog': self.scalars['fog']
+            }
+        return self._state_without_hexes
+
+    def _view(self, player: str, include_hexes: bool) -> Dict:
+        """Get (building on first use) the full state as a player sees it."""
+        key = (player, include_hexes)
+        view = self._views.get(key)
+        if view is None:
+            state = self.get_state_without_hexes()
+            view = {
+                **state,
+                'map': {'width': self.width, 'height': self.height},
+                'units': [unit for unit in state['units'] if self._unit_visible(player, unit)],
+                'cities': [self._filter_city(player, city) for city in state['cities']],
+                'resources': self._filter_scalar(player, 'resources'),
+                'player': player
+            }
+            if include_hexes:
+                view['map']['hexes'] = [self._filter_hex(player, hex_data) for hex_data in self.hexes().values()]
+            self._views[key] = view
+        return view
+
+    def get_delta(self, since_version: int, player: Optional[str] = None) -> Dict:
+        """Get the changes committed after ``since_version``.
+
+        Falls back to the full state (``full`` set to True) when the change
+        journal no longer reaches back to ``since_version``.
+
+        Args:
+            since_version: Version the client holds
+            player: Get the changes this player sees (with fog of war): units
+                leaving the player's sight are listed as removed and units
+                coming into it as changed, along with the hexes whose
+                visibility flipped
+        """
+        changed = changes_since(self.journal, since_version, self.version)
+        if changed is None:
+            return {'full': True, 'version': self.version, 'state': self.get_state(player)}
+        if self._filters(player):
+            return self._filtered_delta(since_version, changed, player)
+
+        delta = {
+            'full': False,
+            'version': self.version,
+            'since_version': since_version,
+            'units': [],
+            'removed_units': [],
+            'cities': [],
+            'hexes': []
+        }
+
+        for kind, key in changed:
+            if kind == 'unit':
+                unit = self.units.get(key)
+                if unit:
+                    delta['units'].append(unit)
+                else:
+                    delta['removed_units'].append(key)
+            elif kind == 'city':
+                city = self.cities.get(key)
+                if city:
+                    delta['cities'].append(city)
+            elif kind == 'hex':
+                hex_data = self._hex(key)
+                if hex_data:
+                    delta['hexes'].append(hex_data)
+            elif kind == 'scalar':
+                delta[key] = self.scalars[key]
+
+        return delta
+
+    def _filtered_delta(self, since_version: int, changed: set, player: str) -> Dict:
+        """get_delta() as a player sees it.
+
+        Units the player sees that changed or came into sight are sent;
+        units that went out of sight (or died in view) are listed as
+        removed; nothing is said about units changing out of sight. Changes
+        on hexes the player does not see are left out.
+        """
+        delta = {
+            'full': False,
+            'version': self.version,
+            'since_version': since_version,
+            'units': [],
+            'removed_units': [],
+            'cities': [],
+            'hexes': []
+        }
+        unit_ids = set()
+        flipped_units = set()
+        positions = set()
+
+        for kind, key in changed:
+            if kind == 'unit':
+                unit_ids.add(key)
+            elif kind == 'city':
+                city = self.cities.get(key)
+                if city:
+                    delta['cities'].append(self._filter_city(player, city))
+            elif kind == 'hex':
+                if self.sees(player, key):
+                    positions.add(key)
+            elif kind == 'sight':
+                if key[0] == player:
+                    positions.add(key[1])
+            elif kind == 'view':
+                if key[0] == player:
+                    flipped_units.add(key[1])
+            elif kind == 'scalar':
+                delta[key] = self._filter_scalar(player, key)
+
+        for unit_id in unit_ids | flipped_units:
+            unit = self.units.get(unit_id)
+            if unit and self._unit_visible(player, unit):
+                delta['units'].append(unit)
+            elif unit_id in flipped_units:
+                delta['removed_units'].append(unit_id)
+
+        for position in positions:
+            hex_data = self._hex(position)
+            if hex_data:
+                delta['hexes'].append(self._filter_hex(player, hex_data))
+
+        return delta
+
+    def map_tiles(self, chunks: List[Tuple[int, int, Optional[int]]], player: Optional[str] = None) -> Dict:
+        """Get map chunks that changed since the versions the client holds.
+
+        Args:
+            chunks: (cx, cy, known_version) triples; known_version is None
+                when the client has no copy of the chunk
+            player: Leave out enemy units this player does not see (with fog
+                of war; a chunk's version also changes with its visibility)
+
+        Returns:
+            Dictionary with the changed ``tiles`` (each stamped with its
+            chunk ``version``) and the ``unchanged`` chunks as [cx, cy].
+        """
+        tiles = []
+        unchanged = []
+        filters = self._filters(player)
+
+        for cx, cy, known_version in chunks:
+            tile = self.map.chunk_to_dict(cx, cy)
+            if tile is None:
+                continue
+
+            version = self.chunk_versions[cy * self.map.chunks_x + cx]
+            if known_version is not None and known_version >= version:
+                unchanged.append([cx, cy])
+            else:
+                tile['version'] = version
+                if filters:
+                    tile['units'] = [entry for entry in tile['units']
+                                     if self.units[entry[2]]['owner'] == player or
+                                     self.sees(player, (entry[0], entry[1]))]
+                tiles.append(tile)
+
+        return {
+            'version': self.version,
+            'tiles': tiles,
+            'unchanged': unchanged
+        }
+
+    def map_layout(self) -> Dict:
+        """Get the chunk grid and the version of every chunk."""
+        return {
+            'version': self.version,
+            'width': self.width,
+            'height': self.height,
+            'chunk_size': self.map.chunk_size,
+            'chunks_x': self.map.chunks_x,
+            'chunks_y': self.map.chunks_y,
+            'chunk_versions': self.chunk_versions.tolist()
+        }
+
+def changes_since(journal: tuple, since_version: int, version: int) -> Optional[set]:
+    """Collect the change keys committed after ``since_version``.
+
+    Returns:
+        Set of (kind, key) pairs, or None if the journal does not reach back
+        far enough (or ``since_version`` is from the future).
+    """
+    if since_version > version:
+        return None
+    if since_version == version:
+        return set()
+
+    oldest = journal[0][0] if journal else version + 1
+    if oldest > since_version + 1:
+        return None
+
+    changed = set()
+    for entry_version, changes in reversed(journal):
+        if entry_version <= since_version:
+            break
+        changed |= changes
+    return changed
@@ -0,0 +1,157 @@
+"""Spatial index for within-radius queries on the hex grid."""
+
+from typing import Dict, List, Optional, Tuple
+from server.utils.hex_utils import hex_distance
+from server.config import Config
+
+class SpatialIndex:
+    """Bucketed index of entity positions.
+
+    Entities are kept in square buckets of axial coordinates. Queries scan
+    only the rings of buckets around the query position that the radius
+    reaches. Results are (distance, entity_id) pairs ordered by distance,
+    then id, so ties break the same way in every process.
+
+    A clone() shares the buckets' member dicts with the original; each
+    index copies a bucket the first time it changes it.
+    """
+
+    def __init__(self, bucket_size: int = Config.SPATIAL_BUCKET_SIZE):
+        self.bucket_size = bucket_size
+        # entity_id -> (position, owner, domain)
+        self._entries: Dict[str, Tuple[Tuple[int, int], Optional[str], Optional[str]]] = {}
+        # bucket -> ids in it (a dict keeps iteration order deterministic)
+        self._buckets: Dict[Tuple[int, int], Dict[str, None]] = {}
+        self._bounds: Optional[List[int]] = None  # min bq, max bq, min br, max br
+        # Buckets this index may change in place (None: all of them)
+        self._owned: Optional[set] = None
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, entity_id: str) -> bool:
+        return entity_id in self._entries
+
+    def clone(self) -> 'SpatialIndex':
+        """Copy the index, sharing bucket contents until they change."""
+        index = SpatialIndex(self.bucket_size)
+        index._entries = dict(self._entries)
+        index._buckets = dict(self._buckets)
+        index._bounds = list(self._bounds) if self._bounds is not None else None
+        index._owned = set()
+        self._owned = set()
+        return index
+
+    def _writable_bucket(self, bucket: Tuple[int, int]) -> Dict[str, None]:
+        """Get a bucket's members for changing, copying them if shared."""
+        members = self._buckets.get(bucket)
+        if members is None:
+            members = self._buckets[bucket] = {}
+        elif self._owned is not None and bucket not in self._owned:
+            members = self._buckets[bucket] = dict(members)
+        if self._owned is not None:
+            self._owned.add(bucket)
+        return members
+
+    def _bucket_of(self, position: Tuple[int, int]) -> Tuple[int, int]:
+        return (position[0] // self.bucket_size, position[1] // self.bucket_size)
+
+    def insert(self, entity_id: str, position: Tuple[int, int],
+               owner: Optional[str] = None, domain: Optional[str] = None):
+        """Add an entity (or replace its entry)."""
+        if entity_id in self._entries:
+            self.remove(entity_id)
+
+        self._entries[entity_id] = (position, owner, domain)
+        bucket = self._bucket_of(position)
+        self._writable_bucket(bucket)[entity_id] = None
+
+        bq, br = bucket
+        if self._bounds is None:
+            self._bounds = [bq, bq, br, br]
+        else:
+            bounds = self._bounds
+            bounds[0] = min(bounds[0], bq)
+            bounds[1] = max(bounds[1], bq)
+            bounds[2] = min(bounds[2], br)
+            bounds[3] = max(bounds[3], br)
+
+    def remove(self, entity_id: str):
+        """Remove an entity if present."""
+        entry = self._entries.pop(entity_id, None)
+        if entry is None:
+            return
+
+        bucket = self._bucket_of(entry[0])
+        if bucket in self._buckets:
+            members = self._writable_bucket(bucket)
+            members.pop(entity_id, None)
+            if not members:
+                del self._buckets[bucket]
+
+    def move(self, entity_id: str, position: Tuple[int, int]):
+        """Update an entity's position."""
+        _, owner, domain = self._entries[entity_id]
+        self.insert(entity_id, position, owner, domain)
+
+    def position_of(self, entity_id: str) -> Optional[Tuple[int, int]]:
+        """Get the indexed position of an entity."""
+        entry = self._entries.get(entity_id)
+        return entry[0] if entry else None
+
+    def _scan_ring(self, center: Tuple[int, int], ring: int, results: List[Tuple[int, str]],
+                   max_distance: Optional[int], owner: Optional[str],
+                   exclude_owner: Optional[str], domain: Optional[str]):
+        """Collect matching entities from the buckets ``ring`` steps away."""
+        cq, cr = self._bucket_of(center)
+        entries = self._entries
+
+        for bq in range(cq - ring, cq + ring + 1):
+            edge = bq == cq - ring or bq == cq + ring
+            step = 1 if edge else 2 * ring
+            for br in range(cr - ring, cr + ring + 1, max(step, 1)):
+                members = self._buckets.get((bq, br))
+                if not members:
+                    continue
+
+                for entity_id in members:
+                    position, entity_owner, entity_domain = entries[entity_id]
+                    if owner is not None and entity_owner != owner:
+                        continue
+                    if exclude_owner is not None and entity_owner == exclude_owner:
+                        continue
+                    if domain is not None and entity_domain != domain:
+                        continue
+
+                    distance = hex_distance(center, position)
+                    if max_distance is None or distance <= max_distance:
+                        results.append((distance, entity_id))
+
+    def _max_ring(self, center: Tuple[int, int]) -> int:
+        """Get the ring beyond which no bucket holds entities."""
+        if self._bounds is None:
+            return -1
+        cq, cr = self._bucket_of(center)
+        min_q, max_q, min_r, max_r = self._bounds
+        return max(cq - min_q, max_q - cq, cr - min_r, max_r - cr)
+
+    def within(self, center: Tuple[int, int], radius: int, owner: Optional[str] = None,
+               exclude_owner: Optional[str] = None,
+               domain: Optional[str] = None) -> List[Tuple[int, str]]:
+        """Find all entities within radius of center.
+
+        Args:
+            center: Query position
+            radius: Largest distance to match
+            owner: Only match entities owned by this player
+            exclude_owner: Skip entities owned by this player
+            domain: Only match entities of this movement domain
+        """
+        results: List[Tuple[int, str]] = []
+        rings = min(self._max_ring(center), (radius - 1) // self.bucket_size + 1 if radius > 0 else 0)
+
+        for ring in range(rings + 1):
+            self._scan_ring(center, ring, results, radius, owner, exclude_owner, domain)
+
+        results.sort()
+        return results
@@ -0,0 +1,106 @@
+"""Vectorized terrain generation (requires NumPy)."""
+
+import math
+from typing import Tuple
+
+import numpy as np
+
+# Share of the map that is water, of the land that is forest, and of the
+# remaining land that is mountain (the proportions of the legacy generator)
+WATER_SHARE = 0.2
+FOREST_SHARE = 0.15
+MOUNTAIN_SHARE = 0.1
+
+# Noise octaves, and the amplitude falloff between them
+OCTAVES = 4
+PERSISTENCE = 0.5
+
+def _smoothstep(t: np.ndarray) -> np.ndarray:
+    return t * t * (3 - 2 * t)
+
+def value_noise(gen: np.random.Generator, width: int, height: int,
+                feature_size: float, octaves: int = OCTAVES) -> np.ndarray:
+    """Sample fractal value noise at the hex centers, shaped (height, width).
+
+    Each octave is a lattice of random values, spaced feature_size apart
+    and halving with every octave, interpolated with a smoothstep. Hex
+    centers sit on odd rows shifted half a hex right, with rows sqrt(3)/2
+    apart, so the noise looks the same in every direction. Since every row
+    of a parity shares its x coordinates, the interpolation is separable:
+    lattice rows are first interpolated along x for both parities and
+    whole rows are then blended along y.
+    """
+    xs = np.stack([np.arange(width, dtype=np.float64),
+                   np.arange(width, dtype=np.float64) + 0.5])
+    ys = np.arange(height, dtype=np.float64) * (math.sqrt(3) / 2)
+    parity = np.arange(height) % 2
+
+    total = np.zeros((height, width))
+    amplitude = 1.0
+    norm = 0.0
+
+    for octave in range(octaves):
+        spacing = max(feature_size / (2 ** octave), 1.0)
+        gx = xs / spacing
+        gy = ys / spacing
+        x0 = np.floor(gx).astype(np.intp)
+        y0 = np.floor(gy).astype(np.intp)
+        tx = _smoothstep(gx - x0)
+        ty = _smoothstep(gy - y0)[:, None]
+
+        lattice = gen.random((int(y0.max()) + 2, int(x0.max()) + 2))
+        # (parity, lattice row, column), interpolated along x
+        along_x = lattice[:, x0] * (1 - tx)[None] + lattice[:, x0 + 1] * tx[None]
+        along_x = along_x.transpose(1, 0, 2)
+
+        total += amplitude * (along_x[parity, y0] * (1 - ty) + along_x[parity, y0 + 1] * ty)
+        norm += amplitude
+        amplitude *= PERSISTENCE
+
+    return total / norm
+
+def _lowest(values: np.ndarray, count: int) -> np.ndarray:
+    """Get a mask of the count lowest values (ties broken by position)."""
+    mask = np.zeros(values.shape, dtype=bool)
+    if count > 0:
+        mask[np.argpartition(values, count - 1)[:count]] = True
+    return mask
+
+def generate_noise_terrain(terrain: bytearray, width: int, height: int, seed: int,
+                           codes: Tuple[int, int, int, int]):
+    """Fill a packed terrain grid from elevation and moisture noise.
+
+    The lowest WATER_SHARE of elevation becomes water; of the land, the
+    wettest FOREST_SHARE becomes forest and then the highest
+    MOUNTAIN_SHARE of what is left becomes mountain.
+
+    Args:
+        terrain: Row-major terrain grid to fill in place
+        width: Map width
+        height: Map height
+        seed: Noise seed
+        codes: Terrain codes for water, land, forest and mountain
+    """
+    size = width * height
+    if size == 0:
+        return
+
+    water, land, forest, mountain = codes
+    gen = np.random.default_rng(seed)
+    feature_size = max(width, height) / 4
+    elevation = value_noise(gen, width, height, feature_size).ravel()
+    moisture = value_noise(gen, width, height, feature_size / 2).ravel()
+
+    grid = np.frombuffer(terrain, dtype=np.uint8)
+    grid[:] = land
+
+    is_water = _lowest(elevation, int(size * WATER_SHARE))
+    grid[is_water] = water
+
+    land_indexes = np.flatnonzero(~is_water)
+    forests = land_indexes[_lowest(-moisture[land_indexes], int(len(land_indexes) * FOREST_SHARE))]
+    grid[forests] = forest
+
+    remaining = np.flatnonzero(grid == land)
+    mountains = remaining[_lowest(-elevation[remaining], int(len(remaining) * MOUNTAIN_SHARE))]
+    grid[mountains] = mountain
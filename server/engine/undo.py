@@ -0,0 +1,49 @@
+"""Undo entries: the state a command changed, recorded before each change."""
+
+from array import array
+from typing import Dict, List, Optional
+
+from server.models.unit import Unit
+from server.models.city import City
+
+class UndoEntry:
+    """Inverse of one applied command.
+
+    Rather than a copy of the whole game, an entry holds the prior state
+    of just what the command touched: every unit and city as it was before
+    its first change (None for ones the command created), the game
+    scalars and the RNG state, so undoing costs in proportion to the size
+    of the change. GameController records into the entry through
+    _writable_unit() and _writable_city(), which every change goes
+    through, and restores it in _restore_undo_entry().
+    """
+
+    __slots__ = ('command', 'units', 'cities', 'unit_order', 'scalars', 'rng_state')
+
+    def __init__(self, game, command: Dict):
+        """Start an entry for a command about to be applied to game."""
+        self.command = command
+        self.units: Dict[str, Optional[Unit]] = {}
+        self.cities: Dict[str, Optional[City]] = {}
+        # Unit ids in order before the first unit was removed, so restored
+        # units take their old place (the AI plays units in this order)
+        self.unit_order: Optional[List[str]] = None
+        self.scalars = (game.turn, game.current_player, dict(game.resources), game.game_over,
+                        game.winner, game._unit_counter, game._city_counter)
+        version, internal, gauss = game.rng.getstate()
+        self.rng_state = (version, array('I', internal), gauss)
+
+    def save_unit(self, unit_id: str, unit: Optional[Unit]):
+        """Remember a unit as it is now, unless it was already saved."""
+        if unit_id not in self.units:
+            self.units[unit_id] = unit.copy() if unit is not None else None
+
+    def save_city(self, city_id: str, city: Optional[City]):
+        """Remember a city as it is now, unless it was already saved."""
+        if city_id not in self.cities:
+            self.cities[city_id] = city.copy() if city is not None else None
+
+    def save_unit_order(self, unit_ids):
+        """Remember the unit order, before the first removal."""
+        if self.unit_order is None:
+            self.unit_order = list(unit_ids)
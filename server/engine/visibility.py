@@ -0,0 +1,129 @@
+"""Per-player fog of war."""
+
+from array import array
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# Hexes around an owned city its owner sees
+CITY_SIGHT = 2
+
+# A sight source: (player, grid index, sight range)
+Source = Tuple[str, int, int]
+
+class Visibility:
+    """Which hexes each player sees, kept up to date incrementally.
+
+    Units and owned cities are sight sources covering the hexes within
+    their sight range. For each player the number of its sources covering
+    every hex is kept in a count grid, and the hexes it sees (a count above
+    zero) in a mask with one byte per hex, so moving, adding or removing a
+    source only touches the hexes in its old and new range. The hexes whose
+    visibility flipped are collected for the change journal (see
+    take_changes()).
+
+    The units each player sees (their own included) are kept as sets, so
+    that only units coming into or going out of a player's sight need to be
+    reported to that player (see update_seen()).
+    """
+
+    def __init__(self, hex_map, players: Iterable[str]):
+        self.map = hex_map
+        self.counts: Dict[str, array] = {}
+        self.masks: Dict[str, bytearray] = {}
+        # Bumped whenever a player's mask changes
+        self.revisions: Dict[str, int] = {}
+        self.seen: Dict[str, set] = {}
+        for player in players:
+            self.counts[player] = array('H', bytes(2 * hex_map.size))
+            self.masks[player] = bytearray(hex_map.size)
+            self.revisions[player] = 0
+            self.seen[player] = set()
+
+        self._sources: Dict[str, Source] = {}
+        self._changes: List[Tuple[str, Tuple[int, int]]] = []
+
+    def place(self, source_id: str, owner: Optional[str], position: Tuple[int, int], sight: int):
+        """Set where a unit or city sees from (a no-op if nothing changed)."""
+        source = None
+        if owner in self.counts:
+            source = (owner, self.map.index_of(position), sight)
+
+        previous = self._sources.get(source_id)
+        if source == previous:
+            return
+
+        # Cover the new range before uncovering the old one, so hexes in
+        # both never flip
+        if source is not None:
+            self._sources[source_id] = source
+            self._cover(source, 1)
+        else:
+            del self._sources[source_id]
+        if previous is not None:
+            self._cover(previous, -1)
+
+    def remove(self, source_id: str):
+        """Stop a unit or city seeing (it died, or a city lost its owner)."""
+        previous = self._sources.pop(source_id, None)
+        if previous is not None:
+            self._cover(previous, -1)
+
+    def _cover(self, source: Source, step: int):
+        """Add (step 1) or take away (step -1) a source's coverage."""
+        player, index, sight = source
+        if index < 0:
+            return
+
+        counts = self.counts[player]
+        mask = self.masks[player]
+        position_of = self.map.position_of
+        flipped = False
+
+        for i in self.map.kernel.disk(index, sight):
+            count = counts[i] + step
+            counts[i] = count
+            if count == 0 or (count == 1 and step > 0):
+                mask[i] = 1 if count else 0
+                self._changes.append((player, position_of(i)))
+                flipped = True
+
+        if flipped:
+            self.revisions[player] += 1
+
+    def sees(self, player: str, position: Tuple[int, int]) -> bool:
+        """Check whether a player sees a hex."""
+        index = self.map.index_of(position)
+        return index >= 0 and self.masks[player][index] == 1
+
+    def seen_by(self, *positions: Tuple[int, int]) -> List[str]:
+        """List the players who see any of the given hexes."""
+        return [player for player in self.masks
+                if any(self.sees(player, position) for position in positions)]
+
+    def update_seen(self, unit_ids: Iterable[str], units: Dict) -> List[Tuple[str, str]]:
+        """Re-check which players see the given units.
+
+        Args:
+            unit_ids: Units that changed or stand on hexes whose visibility
+                flipped (units no longer in units are gone)
+            units: The game's units by id
+
+        Returns:
+            (player, unit_id) pairs whose visibility flipped.
+        """
+        flips = []
+        for player, seen in self.seen.items():
+            for unit_id in unit_ids:
+                unit = units.get(unit_id)
+                visible = unit is not None and (unit.owner == player or self.sees(player, unit.position))
+                if visible != (unit_id in seen):
+                    if visible:
+                        seen.add(unit_id)
+                    else:
+                        seen.discard(unit_id)
+                    flips.append((player, unit_id))
+        return flips
+
+    def take_changes(self) -> List[Tuple[str, Tuple[int, int]]]:
+        """Get and forget the (player, position) pairs whose visibility flipped."""
+        changes, self._changes = self._changes, []
+        return changes
@@ -41,6 +41,11 @@ class City:
 
         return None
 
+    def copy(self) -> 'City':
+        """Copy the city."""
+        return City(self.id, self.name, self.position, self.owner, self.production_capacity,
+                    self.current_production, self.production_progress)
+
     def to_dict(self) -> dict:
         """Convert to dictionary."""
         return asdict(self)
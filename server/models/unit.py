@@ -3,6 +3,11 @@
 from dataclasses import dataclass, asdict
 from typing import Tuple, Optional
 
+# Movement domains: which terrain a unit can enter
+DOMAIN_LAND = 'land'
+DOMAIN_SEA = 'sea'
+DOMAIN_AIR = 'air'
+
 # Unit type configurations
 UNIT_STATS = {
     'infantry': {
@@ -11,9 +16,11 @@ UNIT_STATS = {
         'attack': 3,
         'defense': 4,
         'range': 1,
+        'sight': 2,
         'cost': 50,
         'max_health': 10,
-        'can_capture': True
+        'can_capture': True,
+        'domain': DOMAIN_LAND
     },
     'tank': {
         'name': 'Tank',
@@ -21,9 +28,11 @@ UNIT_STATS = {
         'attack': 8,
         'defense': 6,
         'range': 1,
+        'sight': 2,
         'cost': 100,
         'max_health': 15,
-        'can_capture': False
+        'can_capture': False,
+        'domain': DOMAIN_LAND
     },
     'fighter': {
         'name': 'Fighter',
@@ -31,9 +40,11 @@ UNIT_STATS = {
         'attack': 6,
         'defense': 4,
         'range': 1,
+        'sight': 4,
         'cost': 80,
         'max_health': 8,
-        'can_capture': False
+        'can_capture': False,
+        'domain': DOMAIN_AIR
     },
     'bomber': {
         'name': 'Bomber',
@@ -41,9 +52,11 @@ UNIT_STATS = {
         'attack': 10,
         'defense': 2,
         'range': 1,
+        'sight': 3,
         'cost': 120,
         'max_health': 10,
-        'can_capture': False
+        'can_capture': False,
+        'domain': DOMAIN_AIR
     },
     'transport': {
         'name': 'Transport',
@@ -51,9 +64,11 @@ UNIT_STATS = {
         'attack': 0,
         'defense': 3,
         'range': 0,
+        'sight': 2,
         'cost': 70,
         'max_health': 12,
-        'can_capture': False
+        'can_capture': False,
+        'domain': DOMAIN_SEA
     },
     'destroyer': {
         'name': 'Destroyer',
@@ -61,9 +76,11 @@ UNIT_STATS = {
         'attack': 7,
         'defense': 5,
         'range': 2,
+        'sight': 3,
         'cost': 90,
         'max_health': 12,
-        'can_capture': False
+        'can_capture': False,
+        'domain': DOMAIN_SEA
     }
 }
 
@@ -96,6 +113,11 @@ class Unit:
         """Check if unit can attack."""
         return not self.has_attacked and self.health > 0
 
+    def copy(self) -> 'Unit':
+        """Copy the unit."""
+        return Unit(self.id, self.type, self.owner, self.position, self.health,
+                    self.movement_remaining, self.has_attacked)
+
     def to_dict(self) -> dict:
         """Convert to dictionary."""
         data = asdict(self)
@@ -1,27 +1,227 @@
 """API routes for game operations."""
 
-from flask import Blueprint, jsonify, request
+import json
+import time
+from typing import Optional
+from flask import Blueprint, Response, g, jsonify, request
 from server.engine.game import GameController
+from server.engine.ai import AI_PLAYERS
+from server.engine.catalog import save_catalog
+from server.engine.events import parse_event_id
+from server.engine.jobs import AIJobRunner, TurnBudget, COMPLETED
+from server.engine.journal import GameJournal
+from server.engine.registry import GameRegistry
+from server.engine.snapshot import StateSnapshot
+from server.utils.metrics import REGISTRY, SIZE_BUCKETS
+from server.config import Config
 
 bp = Blueprint('game', __name__, url_prefix='/api/game')
 
-# Global game controller instance (in production, use session management)
-game_controller = None
+# Active games, keyed by the game id handed out by /new and /load
+registry = GameRegistry()
+
+# Background AI turns
+ai_jobs = AIJobRunner()
+
+# Route metrics, labeled by URL rule (not the URL, which holds ids)
+REQUEST_SECONDS = REGISTRY.histogram(
+    'http_request_duration_seconds', 'Time to build the response of each route', ('route', 'method'))
+REQUESTS = REGISTRY.counter('http_requests_total', 'Requests answered', ('route', 'method', 'status'))
+STATE_PAYLOAD_BYTES = REGISTRY.histogram(
+    'game_state_payload_bytes', 'Size of responses carrying a state (full, without hexes) or delta',
+    ('variant',), SIZE_BUCKETS)
+
+@bp.before_request
+def _start_request_timer():
+    """Note when the request started, for _record_request()."""
+    g.request_started = time.perf_counter()
+
+@bp.teardown_request
+def _release_games(exception=None):
+    """Let the registry evict the games the request pinned again."""
+    for game_id in g.pop('pinned_games', ()):
+        registry.release(game_id)
+
+@bp.after_request
+def _record_request(response):
+    """Record a request's latency and status, and the size of a state it carried.
+
+    Streamed responses (/events) are timed until the stream starts.
+    """
+    route = request.url_rule.rule if request.url_rule else 'unmatched'
+    REQUEST_SECONDS.labels(route, request.method).observe(time.perf_counter() - g.request_started)
+    REQUESTS.labels(route, request.method, response.status_code).inc()
+
+    variant = g.get('state_variant')
+    if variant is not None and not response.is_streamed and response.content_length is not None:
+        STATE_PAYLOAD_BYTES.labels(variant).observe(response.content_length)
+    return response
+
+def _game_id():
+    """Get the game id from the X-Game-Id header or game_id query parameter."""
+    return request.headers.get('X-Game-Id') or request.args.get('game_id')
+
+def _get_game(writable: bool = False):
+    """Look up the game addressed by the current request.
+
+    Args:
+        writable: The request changes the game, so refuse it (409) while
+            a background AI turn is queued or running
+
+    Returns:
+        (game, error_response) tuple; exactly one of them is None. The game
+        stays pinned in memory until the request ends (see _release_games()).
+    """
+    game_id = _game_id()
+    if not game_id:
+        return None, (jsonify({'success': False, 'error': 'No active game'}), 400)
+
+    game = registry.get(game_id, pin=True)
+    if game is None:
+        return None, (jsonify({'success': False, 'error': 'Game not found'}), 404)
+    g.setdefault('pinned_games', []).append(game_id)
+
+    if writable:
+        busy = _ai_busy()
+        if busy:
+            return None, busy
+
+    return game, None
+
+def _ai_busy():
+    """Get the 409 response for a change to the addressed game while a
+    background AI turn of it is queued or running, else None.
+
+    Write routes check again once they hold ``game.lock``, since a job
+    queued after _get_game() would otherwise let the change through around
+    that AI turn.
+    """
+    if ai_jobs.active(_game_id()):
+        return jsonify({'success': False, 'error': 'AI turn in progress'}), 409
+    return None
+
+def _viewer(game: GameController) -> Optional[str]:
+    """Get the player whose view of a fog-of-war game the request gets.
+
+    That is the ``player`` parameter (or X-Player header) when it names a
+    player of the game, else the game's default viewer; None, the whole
+    state, for games without fog.
+    """
+    if not game.fog:
+        return None
+    player = request.args.get('player') or request.headers.get('X-Player')
+    if player in game.resources:
+        return player
+    return game.default_viewer()
+
+def _int_param(value, name: str):
+    """Parse an optional integer parameter of a request.
+
+    Returns:
+        (value, error_response) tuple; value is None when the request did
+        not pass one, error_response is None unless it is not an integer
+        (400).
+    """
+    if value is None:
+        return None, None
+    try:
+        return int(str(value)), None
+    except ValueError:
+        return None, (jsonify({'success': False, 'error': f'{name} must be an integer'}), 400)
+
+def _since_version(value):
+    """Parse the ``since_version`` of a request (see _int_param())."""
+    return _int_param(value, 'since_version')
+
+def _get_job(job_id: str):
+    """Look up a background AI job of the game addressed by the request.
+
+    Returns:
+        (job, error_response) tuple; exactly one of them is None.
+    """
+    job = ai_jobs.get(job_id)
+    if job is None or job.game_id != _game_id():
+        return None, (jsonify({'success': False, 'error': 'Job not found'}), 404)
+    return job, None
+
+def _time_budget(data: dict):
+    """Get the AI time budget of a request, capped by the configured budget."""
+    budget = Config.AI_TURN_TIME_BUDGET
+    if data.get('time_budget') is not None:
+        requested = float(data['time_budget'])
+        budget = requested if budget is None else min(requested, budget)
+    return budget
+
+def _state_payload(snapshot: StateSnapshot, since_version: Optional[int] = None, include_hexes: bool = True,
+                   player: Optional[str] = None) -> dict:
+    """Build the state part of a response from a published snapshot.
+
+    Clients that pass ``since_version`` get only the changes made after that
+    version under ``delta``; everyone else gets the full ``state``, without
+    the hex list if they load the map through /map/tiles instead. Either is
+    filtered to what ``player`` sees in fog-of-war games (see _viewer()).
+    """
+    if since_version is None:
+        if not include_hexes:
+            g.state_variant = 'nohexes'
+            return {'state': snapshot.get_state_without_hexes(player)}
+        g.state_variant = 'full'
+        return {'state': snapshot.get_state(player)}
+    g.state_variant = 'delta'
+    return {'delta': snapshot.get_delta(since_version, player)}
+
+def _state_etag(game_id: str, version: int, since_version: Optional[int] = None, include_hexes: bool = True,
+                player: Optional[str] = None) -> str:
+    """Get the ETag of a /state response; it changes with every state version."""
+    if since_version is not None:
+        variant = f'delta{since_version}'
+    else:
+        variant = 'full' if include_hexes else 'nohexes'
+    if player is not None:
+        variant += f'-{player}'
+    return f'{game_id}-{version}-{variant}'
+
+def _cacheable(response, etag: str):
+    """Tag a response for conditional polling.
+
+    ``no-cache`` lets clients keep the response but makes them revalidate
+    on every poll, which costs a 304 while the state is unchanged.
+    """
+    response.set_etag(etag)
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    return response
+
+def _parse_chunks(value: str):
+    """Parse a ``cx:cy[:version],...`` chunk list into (cx, cy, version) triples."""
+    chunks = []
+    for item in value.split(','):
+        parts = [int(part) for part in item.split(':')]
+        if len(parts) not in (2, 3):
+            raise ValueError(f'Invalid chunk: {item}')
+        chunks.append((parts[0], parts[1], parts[2] if len(parts) == 3 else None))
+    return chunks
 
 @bp.route('/new', methods=['POST'])
 def new_game():
-    """Start a new game."""
-    global game_controller
+    """Start a new game (``ai`` picks the opponent: 'rules' or 'mcts';
+    ``fog`` turns fog of war on or off)."""
     try:
         data = request.get_json() or {}
-        width = data.get('width', 30)
-        height = data.get('height', 20)
+        width = max(1, min(int(data.get('width', 30)), Config.MAX_MAP_SIZE))
+        height = max(1, min(int(data.get('height', 20)), Config.MAX_MAP_SIZE))
+        ai_opponent = data.get('ai', Config.AI_OPPONENT)
+        if ai_opponent not in AI_PLAYERS:
+            return jsonify({'success': False, 'error': f'Unknown AI: {ai_opponent}'}), 400
 
-        game_controller = GameController(width, height)
-        state = game_controller.get_state()
+        game_id, game = registry.create(width, height, ai_opponent,
+                                        bool(data.get('fog', Config.FOG_OF_WAR)))
+        state = game.snapshot.get_state(game.default_viewer())
+        g.state_variant = 'full'
 
         return jsonify({
             'success': True,
+            'game_id': game_id,
             'state': state
         })
     except Exception as e:
@@ -29,38 +229,142 @@ def new_game():
 
 @bp.route('/state', methods=['GET'])
 def get_state():
-    """Get current game state."""
-    global game_controller
-    if game_controller is None:
-        return jsonify({'success': False, 'error': 'No active game'}), 400
+    """Get current game state (``hexes=false`` leaves out the hex list).
+
+    In fog-of-war games the state is what ``player`` sees (see _viewer()).
+    Responses carry an ETag naming the game, state version and response
+    variant (viewer included), so a poll with a matching ``If-None-Match``
+    is answered with 304 Not Modified without serializing anything.
+    """
+    game, error = _get_game()
+    if error:
+        return error
 
     try:
-        state = game_controller.get_state()
-        return jsonify({
+        since_version, error = _since_version(request.args.get('since_version'))
+        if error:
+            return error
+        snapshot = game.snapshot
+        include_hexes = request.args.get('hexes', 'true').lower() != 'false'
+        player = _viewer(game)
+
+        etag = _state_etag(_game_id(), snapshot.version, since_version, include_hexes, player)
+        if request.if_none_match.contains(etag):
+            return _cacheable(Response(status=304), etag)
+
+        return _cacheable(jsonify({
             'success': True,
-            'state': state
-        })
+            **_state_payload(snapshot, since_version, include_hexes, player)
+        }), etag)
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@bp.route('/events', methods=['GET'])
+def event_stream():
+    """Stream game events as Server-Sent Events.
+
+    Pass the game as ``game_id`` (EventSource cannot set headers). Events
+    are named by type and carry JSON data including the state version they
+    belong to. Reconnecting clients resume after ``Last-Event-ID`` (or the
+    ``last_event_id`` parameter); if the server no longer holds the events
+    they missed, they get a ``reset`` event and should reload the state.
+    In fog-of-war games only the events ``player`` may see are sent.
+    """
+    game, error = _get_game()
+    if error:
+        return error
+
+    stream = game.events
+    player = _viewer(game)
+    position = parse_event_id(request.headers.get('Last-Event-ID') or
+                              request.args.get('last_event_id'))
+    if position is None:
+        position = stream.last_position()
+
+    def generate():
+        nonlocal position
+        while True:
+            events, complete = stream.wait(position, Config.EVENT_KEEPALIVE_SECONDS)
+
+            if not complete:
+                position = stream.last_position()
+                yield (f'id: {position[0]}.{position[1]}\nevent: reset\n'
+                       f'data: {json.dumps({"version": game.version})}\n\n')
+                continue
+
+            for event in events:
+                if event.visible_to(player):
+                    yield f'id: {event.id}\nevent: {event.type}\ndata: {json.dumps(event.to_dict())}\n\n'
+                position = event.position
+
+            if stream.closed:
+                return
+            if not events:
+                yield ': keep-alive\n\n'
+
+    return Response(generate(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@bp.route('/map/tiles', methods=['GET'])
+def map_tiles():
+    """Get map chunks for the client's viewport.
+
+    ``chunks`` lists the wanted chunks as ``cx:cy`` or ``cx:cy:version``,
+    comma separated; chunks whose version the client already holds are
+    reported as unchanged instead of resent. Without ``chunks`` the chunk
+    grid and every chunk's version are returned.
+    """
+    game, error = _get_game()
+    if error:
+        return error
+
+    try:
+        chunks = request.args.get('chunks')
+        snapshot = game.snapshot
+        if chunks is None:
+            return jsonify({'success': True, **snapshot.map_layout()})
+
+        try:
+            chunks = _parse_chunks(chunks)
+        except ValueError as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
+        if len(chunks) > Config.MAX_TILE_CHUNKS:
+            return jsonify({'success': False,
+                            'error': f'At most {Config.MAX_TILE_CHUNKS} chunks per request'}), 400
+
+        result = snapshot.map_tiles(chunks, _viewer(game))
+
+        return jsonify({'success': True, **result})
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
 @bp.route('/move', methods=['POST'])
 def move_unit():
     """Move a unit."""
-    global game_controller
-    if game_controller is None:
-        return jsonify({'success': False, 'error': 'No active game'}), 400
+    game, error = _get_game(writable=True)
+    if error:
+        return error
 
     try:
         data = request.get_json()
+        since_version, error = _since_version(data.get('since_version'))
+        if error:
+            return error
         unit_id = data.get('unit_id')
         target = data.get('target_hex')
 
-        result = game_controller.move_unit(unit_id, (target['q'], target['r']))
+        with game.lock:
+            busy = _ai_busy()
+            if busy:
+                return busy
+            result = game.apply_command({'op': 'move', 'unit_id': unit_id,
+                                         'target': [target['q'], target['r']]})
+            snapshot = game.publish_snapshot()
 
         return jsonify({
             'success': result['success'],
             'message': result.get('message', ''),
-            'state': game_controller.get_state()
+            **_state_payload(snapshot, since_version, player=_viewer(game))
         })
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
@@ -68,76 +372,369 @@ def move_unit():
 @bp.route('/attack', methods=['POST'])
 def attack():
     """Attack with a unit."""
-    global game_controller
-    if game_controller is None:
-        return jsonify({'success': False, 'error': 'No active game'}), 400
+    game, error = _get_game(writable=True)
+    if error:
+        return error
 
     try:
         data = request.get_json()
+        since_version, error = _since_version(data.get('since_version'))
+        if error:
+            return error
         attacker_id = data.get('attacker_id')
         defender_id = data.get('defender_id')
 
-        result = game_controller.attack(attacker_id, defender_id)
+        with game.lock:
+            busy = _ai_busy()
+            if busy:
+                return busy
+            result = game.apply_command({'op': 'attack', 'attacker_id': attacker_id,
+                                         'defender_id': defender_id})
+            snapshot = game.publish_snapshot()
 
         return jsonify({
             'success': result['success'],
             'result': result,
-            'state': game_controller.get_state()
+            **_state_payload(snapshot, since_version, player=_viewer(game))
         })
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
+@bp.route('/reachable', methods=['GET'])
+def reachable():
+    """List the hexes a unit can move to, with movement costs and paths.
+
+    In fog-of-war games only the viewer's own units can be asked about.
+    """
+    game, error = _get_game()
+    if error:
+        return error
+
+    try:
+        unit_id = request.args.get('unit_id')
+
+        with game.lock:
+            if game.visible_unit(unit_id, _viewer(game), own=True) is None:
+                return jsonify({'success': False, 'error': 'Unit not found'}), 404
+            hexes = game.reachable(unit_id).to_list()
+
+        return jsonify({
+            'success': True,
+            'unit_id': unit_id,
+            'reachable': hexes
+        })
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@bp.route('/targets', methods=['GET'])
+def attack_targets():
+    """List the enemy units a unit can attack, line of sight included (for highlighting).
+
+    In fog-of-war games the unit must be the viewer's own and only targets
+    the viewer sees are listed.
+    """
+    game, error = _get_game()
+    if error:
+        return error
+
+    try:
+        unit_id = request.args.get('unit_id')
+
+        with game.lock:
+            viewer = _viewer(game)
+            if game.visible_unit(unit_id, viewer, own=True) is None:
+                return jsonify({'success': False, 'error': 'Unit not found'}), 404
+            targets = [target_id for target_id in game.attack_targets(unit_id)
+                       if game.visible_unit(target_id, viewer) is not None]
+
+        return jsonify({
+            'success': True,
+            'unit_id': unit_id,
+            'targets': targets
+        })
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@bp.route('/attack-preview', methods=['GET'])
+def attack_preview():
+    """Get the exact odds of an attack (for previews before attacking).
+
+    In fog-of-war games the attacker must be the viewer's own unit and the
+    defender one the viewer sees; hidden units are reported as not found.
+    """
+    game, error = _get_game()
+    if error:
+        return error
+
+    try:
+        attacker_id = request.args.get('attacker_id')
+        defender_id = request.args.get('defender_id')
+
+        with game.lock:
+            viewer = _viewer(game)
+            if (game.visible_unit(attacker_id, viewer, own=True) is None
+                    or game.visible_unit(defender_id, viewer) is None):
+                return jsonify({'success': False, 'error': 'Unit not found'}), 404
+            result = game.attack_preview(attacker_id, defender_id)
+
+        return jsonify(result)
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
 @bp.route('/produce', methods=['POST'])
 def produce_unit():
     """Produce a unit in a city."""
-    global game_controller
-    if game_controller is None:
-        return jsonify({'success': False, 'error': 'No active game'}), 400
+    game, error = _get_game(writable=True)
+    if error:
+        return error
 
     try:
         data = request.get_json()
+        since_version, error = _since_version(data.get('since_version'))
+        if error:
+            return error
         city_id = data.get('city_id')
         unit_type = data.get('unit_type')
 
-        result = game_controller.start_production(city_id, unit_type)
+        with game.lock:
+            busy = _ai_busy()
+            if busy:
+                return busy
+            result = game.apply_command({'op': 'produce', 'city_id': city_id,
+                                         'unit_type': unit_type})
+            snapshot = game.publish_snapshot()
 
         return jsonify({
             'success': result['success'],
             'message': result.get('message', ''),
-            'state': game_controller.get_state()
+            **_state_payload(snapshot, since_version, player=_viewer(game))
+        })
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@bp.route('/commands', methods=['POST'])
+def apply_commands():
+    """Apply a batch of orders with one round trip and one state response.
+
+    ``commands`` is an ordered list of commands as the journal records
+    them: {'op': 'move', 'unit_id', 'target': [q, r]}, {'op': 'attack',
+    'attacker_id', 'defender_id'} or {'op': 'produce', 'city_id',
+    'unit_type'}. The batch stops at the first failure; with ``atomic``
+    (the default) the commands before it are rolled back as well.
+    """
+    game, error = _get_game(writable=True)
+    if error:
+        return error
+
+    try:
+        data = request.get_json(silent=True) or {}
+        since_version, error = _since_version(data.get('since_version'))
+        if error:
+            return error
+        commands = data.get('commands')
+        if not isinstance(commands, list):
+            return jsonify({'success': False, 'error': 'commands must be a list'}), 400
+        if len(commands) > Config.MAX_BATCH_COMMANDS:
+            return jsonify({'success': False,
+                            'error': f'At most {Config.MAX_BATCH_COMMANDS} commands per batch'}), 400
+
+        with game.lock:
+            busy = _ai_busy()
+            if busy:
+                return busy
+            result = game.apply_commands(commands, bool(data.get('atomic', True)))
+            snapshot = game.publish_snapshot()
+
+        return jsonify({
+            **result,
+            **_state_payload(snapshot, since_version, player=_viewer(game))
         })
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
 @bp.route('/end-turn', methods=['POST'])
 def end_turn():
-    """End current player's turn."""
-    global game_controller
-    if game_controller is None:
-        return jsonify({'success': False, 'error': 'No active game'}), 400
+    """End current player's turn.
+
+    The AI's reply is limited to ``time_budget`` seconds (at most
+    Config.AI_TURN_TIME_BUDGET). With ``background`` set the turn runs on
+    the AI worker pool instead and the response (202) is a job handle for
+    the /ai-jobs endpoints; the game refuses other writes until it is done.
+    """
+    game, error = _get_game(writable=True)
+    if error:
+        return error
 
     try:
-        game_controller.end_turn()
+        data = request.get_json(silent=True) or {}
+        since_version, error = _since_version(data.get('since_version'))
+        if error:
+            return error
+        budget = TurnBudget(_time_budget(data))
+
+        if data.get('background'):
+            # The job keeps the game in memory until it is done
+            game_id = _game_id()
+            registry.pin(game_id)
+            job = ai_jobs.submit(game_id, lambda budget: _play_end_turn(game_id, game, budget), budget)
+            if job is None:
+                registry.release(game_id)
+                return jsonify({'success': False, 'error': 'AI turn in progress'}), 409
+            return jsonify({'success': True, 'job': job.to_dict()}), 202
+
+        with game.lock:
+            busy = _ai_busy()
+            if busy:
+                return busy
+            result = game.apply_command({'op': 'end_turn'}, budget)
+            snapshot = game.publish_snapshot()
 
         return jsonify({
             'success': True,
-            'state': game_controller.get_state()
+            'ai_steps': result['ai_steps'],
+            'ai_stopped': budget.stopped or COMPLETED,
+            **_state_payload(snapshot, since_version, player=_viewer(game))
         })
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
+def _play_end_turn(game_id: str, game: GameController, budget: TurnBudget) -> dict:
+    """End the turn of a game within an AI budget (background job body),
+    then drop the job's pin on the game."""
+    try:
+        with game.lock:
+            result = game.apply_command({'op': 'end_turn'}, budget)
+            game.publish_snapshot()
+    finally:
+        registry.release(game_id)
+
+    budget.stopped = budget.stopped or COMPLETED
+    return {
+        'ai_steps': result['ai_steps'],
+        'ai_stopped': budget.stopped,
+        'version': game.version
+    }
+
+@bp.route('/undo', methods=['POST'])
+def undo():
+    """Take back the last command; after an end turn, the AI's turn goes too.
+
+    Up to Config.UNDO_DEPTH commands can be taken back, while the game
+    stays in memory (undo history is not saved).
+    """
+    return _history_command('undo')
+
+@bp.route('/redo', methods=['POST'])
+def redo():
+    """Apply the last undone command again, with the same outcome."""
+    return _history_command('redo')
+
+def _history_command(op: str):
+    """Apply an 'undo' or 'redo' command to the addressed game."""
+    game, error = _get_game(writable=True)
+    if error:
+        return error
+
+    try:
+        data = request.get_json(silent=True) or {}
+        since_version, error = _since_version(data.get('since_version'))
+        if error:
+            return error
+
+        with game.lock:
+            busy = _ai_busy()
+            if busy:
+                return busy
+            result = game.apply_command({'op': op})
+            history = game.undo_status()
+            snapshot = game.publish_snapshot()
+
+        return jsonify({
+            'success': result['success'],
+            'message': result.get('message', ''),
+            'op': result.get('op'),
+            'history': history,
+            **_state_payload(snapshot, since_version, player=_viewer(game))
+        })
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@bp.route('/ai-jobs/<job_id>', methods=['GET'])
+def ai_job_status(job_id):
+    """Get the status and progress of a background AI turn."""
+    job, error = _get_job(job_id)
+    if error:
+        return error
+
+    return jsonify({'success': True, 'job': job.to_dict()})
+
+@bp.route('/ai-jobs/<job_id>/result', methods=['GET'])
+def ai_job_result(job_id):
+    """Get the outcome of a finished background AI turn.
+
+    Responds 202 with the job status while it is still running. Once done,
+    includes the game state (or delta with ``since_version``).
+    """
+    job, error = _get_job(job_id)
+    if error:
+        return error
+
+    if not job.done.is_set():
+        return jsonify({'success': True, 'done': False, 'job': job.to_dict()}), 202
+    if job.error is not None:
+        return jsonify({'success': False, 'done': True, 'job': job.to_dict(), 'error': job.error}), 500
+
+    game, error = _get_game()
+    if error:
+        return error
+    since_version, error = _since_version(request.args.get('since_version'))
+    if error:
+        return error
+
+    return jsonify({
+        'success': True,
+        'done': True,
+        'job': job.to_dict(),
+        **job.result,
+        **_state_payload(game.snapshot, since_version, player=_viewer(game))
+    })
+
+@bp.route('/ai-jobs/<job_id>/cancel', methods=['POST'])
+def cancel_ai_job(job_id):
+    """Stop a background AI turn after the unit it is playing.
+
+    The units played so far keep their moves and the turn passes back
+    to the player as usual.
+    """
+    job, error = _get_job(job_id)
+    if error:
+        return error
+
+    job.cancel()
+    return jsonify({'success': True, 'job': job.to_dict()})
+
 @bp.route('/save', methods=['POST'])
 def save_game():
-    """Save current game."""
-    global game_controller
-    if game_controller is None:
-        return jsonify({'success': False, 'error': 'No active game'}), 400
+    """Save current game.
+
+    ``format`` selects 'json' or the compact 'binary' save format. With
+    ``journal`` set, starts a journal under ``filename`` instead: the
+    game is snapshotted once and every later command is appended to it.
+    """
+    game, error = _get_game()
+    if error:
+        return error
 
     try:
         data = request.get_json()
         filename = data.get('filename', 'savegame')
 
-        filepath = game_controller.save_game(filename)
+        with game.lock:
+            if data.get('journal'):
+                game.journal = GameJournal.create(filename, game)
+                filepath = game.journal.directory
+            else:
+                filepath = game.save_game(filename, save_format=data.get('format', Config.SAVE_FORMAT))
 
         return jsonify({
             'success': True,
@@ -146,19 +743,57 @@ def save_game():
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
+@bp.route('/saves', methods=['GET'])
+def list_saves():
+    """List saves from the save catalog, newest first.
+
+    Optional filters: ``player``, ``winner``, ``game_over`` (true/false),
+    ``min_turn``, ``max_turn``, ``width``, ``height`` and ``limit``.
+    """
+    try:
+        game_over = request.args.get('game_over')
+        saves = save_catalog.list(
+            player=request.args.get('player'),
+            winner=request.args.get('winner'),
+            game_over=None if game_over is None else game_over.lower() == 'true',
+            min_turn=request.args.get('min_turn', type=int),
+            max_turn=request.args.get('max_turn', type=int),
+            width=request.args.get('width', type=int),
+            height=request.args.get('height', type=int),
+            limit=request.args.get('limit', type=int)
+        )
+
+        return jsonify({
+            'success': True,
+            'saves': saves
+        })
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
 @bp.route('/load', methods=['POST'])
 def load_game():
-    """Load a saved game."""
-    global game_controller
+    """Load a saved game into a new session.
+
+    Either ``filename`` of a save file, or ``journal`` with the name of a
+    journal and optionally the ``turn`` to rewind to.
+    """
     try:
         data = request.get_json()
-        filename = data.get('filename')
 
-        game_controller = GameController.load_game(filename)
+        if data.get('journal'):
+            turn, error = _int_param(data.get('turn'), 'turn')
+            if error:
+                return error
+            game = GameJournal(data['journal']).load(turn=turn)
+        else:
+            game = GameController.load_game(data.get('filename'))
+        game_id = registry.add(game)
+        g.state_variant = 'full'
 
         return jsonify({
             'success': True,
-            'state': game_controller.get_state()
+            'game_id': game_id,
+            'state': game.snapshot.get_state(game.default_viewer())
         })
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
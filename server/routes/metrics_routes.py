@@ -0,0 +1,31 @@
+"""Prometheus metrics endpoint."""
+
+from flask import Blueprint, Response
+from server.routes.game_routes import registry, ai_jobs
+from server.utils.metrics import CONTENT_TYPE, REGISTRY
+
+bp = Blueprint('metrics', __name__)
+
+def _units_by_owner():
+    """Count the units of the games in memory by owner, from their snapshots."""
+    counts = {}
+    for game in registry.games():
+        for unit in game.snapshot.units.values():
+            key = (unit['owner'],)
+            counts[key] = counts.get(key, 0) + 1
+    return counts
+
+def _map_hexes():
+    """Count the hexes of the maps of the games in memory."""
+    return sum(game.map.size for game in registry.games())
+
+# Live gauges, read from the games in memory when /metrics is scraped
+REGISTRY.gauge('game_active_games', 'Games held in memory', lambda: len(registry))
+REGISTRY.gauge('game_units', 'Units in the games held in memory', _units_by_owner, ('owner',))
+REGISTRY.gauge('game_map_hexes', 'Map hexes of the games held in memory', _map_hexes)
+REGISTRY.gauge('game_ai_jobs_active', 'Background AI turns queued or running', ai_jobs.active_count)
+
+@bp.route('/metrics', methods=['GET'])
+def metrics():
+    """Get engine and route metrics in the Prometheus text format."""
+    return Response(REGISTRY.render(), content_type=CONTENT_TYPE)
@@ -1,7 +1,9 @@
 """Hexagonal grid utilities using axial coordinates."""
 
 import math
-from typing import Tuple, List
+from array import array
+from functools import lru_cache
+from typing import Dict, Iterator, Tuple, List
 
 # Axial directions: E, NE, NW, W, SW, SE
 HEX_DIRECTIONS = [
@@ -9,6 +11,29 @@ HEX_DIRECTIONS = [
     (-1, 0), (-1, 1), (0, 1)
 ]
 
+# Axial offsets of the hexes within (disk) and at (ring) each distance of
+# the origin, in hex_in_range() order, by radius
+_disk_offsets: Dict[int, Tuple[Tuple[int, int], ...]] = {}
+_ring_offsets: Dict[int, Tuple[Tuple[int, int], ...]] = {}
+
+# Off-map entry in HexKernel.neighbors
+OFF_MAP = -1
+
+# Map shapes whose HexKernel is kept for reuse (a kernel takes 24 bytes
+# per hex, about 4MB for a 400x400 map)
+_KERNEL_CACHE_SIZE = 4
+
+# The hexes a line passes between its ends, step by step; a step is one
+# hex, or two where the line runs along the edge between them
+LineSteps = Tuple[Tuple[Tuple[int, int], ...], ...]
+
+# Lines from the origin to every offset within _line_table_range
+_line_table: Dict[Tuple[int, int], LineSteps] = {}
+_line_table_range = 1
+
+# Nudge (q, r) that pushes a line off hex edges to one side
+_LINE_NUDGE = (1e-6, 2e-6)
+
 def hex_distance(a: Tuple[int, int], b: Tuple[int, int]) -> int:
     """Calculate distance between two hexes in axial coordinates."""
     q1, r1 = a
@@ -23,18 +48,143 @@ def hex_neighbor(hex_pos: Tuple[int, int], direction: int) -> Tuple[int, int]:
 
 def hex_neighbors(hex_pos: Tuple[int, int]) -> List[Tuple[int, int]]:
     """Get all 6 neighbors of a hex."""
-    return [hex_neighbor(hex_pos, i) for i in range(6)]
+    q, r = hex_pos
+    return [(q + dq, r + dr) for dq, dr in HEX_DIRECTIONS]
 
 def hex_in_range(center: Tuple[int, int], radius: int) -> List[Tuple[int, int]]:
     """Get all hexes within given radius of center hex."""
-    results = []
     q, r = center
+    return [(q + dq, r + dr) for dq, dr in hex_disk_offsets(radius)]
 
-    for dq in range(-radius, radius + 1):
-        for dr in range(max(-radius, -dq - radius), min(radius, -dq + radius) + 1):
-            results.append((q + dq, r + dr))
+def hex_disk_offsets(radius: int) -> Tuple[Tuple[int, int], ...]:
+    """Get the axial offsets of all hexes within radius of the origin.
 
-    return results
+    The offsets are ordered by dq, then dr (the order of hex_in_range()),
+    and computed once per radius.
+    """
+    offsets = _disk_offsets.get(radius)
+    if offsets is None:
+        offsets = tuple((dq, dr)
+                        for dq in range(-radius, radius + 1)
+                        for dr in range(max(-radius, -dq - radius), min(radius, -dq + radius) + 1))
+        _disk_offsets[radius] = offsets
+    return offsets
+
+def hex_ring_offsets(radius: int) -> Tuple[Tuple[int, int], ...]:
+    """Get the axial offsets of the hexes exactly radius from the origin
+    (in the order of hex_disk_offsets())."""
+    offsets = _ring_offsets.get(radius)
+    if offsets is None:
+        offsets = tuple(offset for offset in hex_disk_offsets(radius)
+                        if hex_distance((0, 0), offset) == radius)
+        _ring_offsets[radius] = offsets
+    return offsets
+
+class HexKernel:
+    """Precomputed grid index tables for one map shape.
+
+    Indexes follow the HexMap layout: a width x height rectangle of offset
+    coordinates (odd rows shifted right), hex (col, row) at index
+    row * width + col. Working on indexes through these tables avoids the
+    position tuples the axial helpers above allocate for every hex:
+
+    - ``neighbors`` holds the 6 neighbor indexes of every hex, in
+      HEX_DIRECTIONS order, at ``index * 6 + direction``, with OFF_MAP for
+      neighbors off the map.
+    - adjacent() iterates over the on-map neighbor indexes of a hex (same
+      order); hot loops slice ``neighbors`` directly and skip OFF_MAP.
+    - disk() and ring() walk the hexes around an index through per-radius
+      tables of index deltas (one per row parity), checking bounds only
+      near the map's edges.
+
+    Kernels are shared by every map of a shape (see hex_kernel()), so they
+    must not be modified.
+    """
+
+    def __init__(self, width: int, height: int):
+        self.width = width
+        self.height = height
+        self.size = width * height
+        self.neighbors = array('i', [OFF_MAP]) * (6 * self.size)
+        # radius -> (disk deltas, ring deltas), each a (drow, dcol, delta)
+        # tuple per row parity
+        self._deltas: Dict[int, Tuple] = {}
+
+        # Fill the table one row and direction at a time: the columns whose
+        # neighbor is on the map form a single run
+        neighbors = self.neighbors
+        directions = self._offset_deltas(HEX_DIRECTIONS)
+        for row in range(height):
+            base = row * width
+            for direction, (drow, dcol, delta) in enumerate(directions[row & 1]):
+                if not 0 <= row + drow < height:
+                    continue
+                first = max(0, -dcol)
+                last = min(width, width - dcol)
+                if first < last:
+                    neighbors[(base + first) * 6 + direction:(base + last) * 6:6] = \
+                        array('i', range(base + first + delta, base + last + delta))
+
+    def __reduce__(self):
+        # Pickled as its shape: rebuilt from (or found in) the kernel cache
+        return (hex_kernel, (self.width, self.height))
+
+    def _offset_deltas(self, offsets) -> Tuple[Tuple[Tuple[int, int, int], ...], ...]:
+        """Turn axial offsets into (drow, dcol, index delta) for even and odd rows."""
+        width = self.width
+        return tuple(
+            tuple((dr, dq + ((parity + dr) >> 1), dr * width + dq + ((parity + dr) >> 1))
+                  for dq, dr in offsets)
+            for parity in (0, 1)
+        )
+
+    def neighbor(self, index: int, direction: int) -> int:
+        """Get the index of a hex's neighbor in direction (0-5), or OFF_MAP."""
+        return self.neighbors[index * 6 + direction]
+
+    def adjacent(self, index: int) -> Iterator[int]:
+        """Iterate over the indexes of a hex's on-map neighbors, in
+        HEX_DIRECTIONS order."""
+        start = index * 6
+        for neighbor in self.neighbors[start:start + 6]:
+            if neighbor != OFF_MAP:
+                yield neighbor
+
+    def disk(self, index: int, radius: int) -> Iterator[int]:
+        """Iterate over the indexes of the on-map hexes within radius of a hex
+        (in hex_in_range() order)."""
+        return self._walk(index, radius, 0)
+
+    def ring(self, index: int, radius: int) -> Iterator[int]:
+        """Iterate over the indexes of the on-map hexes exactly radius from a hex."""
+        return self._walk(index, radius, 1)
+
+    def _walk(self, index: int, radius: int, table: int) -> Iterator[int]:
+        """Iterate over a disk (table 0) or ring (table 1) around a hex."""
+        deltas = self._deltas.get(radius)
+        if deltas is None:
+            deltas = self._deltas[radius] = (self._offset_deltas(hex_disk_offsets(radius)),
+                                             self._offset_deltas(hex_ring_offsets(radius)))
+
+        width = self.width
+        height = self.height
+        row, col = divmod(index, width)
+        row_deltas = deltas[table][row & 1]
+
+        # No hex within radius rows and columns of the edges has a disk
+        # reaching off the map
+        if radius <= row < height - radius and radius <= col < width - radius:
+            for _, _, delta in row_deltas:
+                yield index + delta
+        else:
+            for drow, dcol, delta in row_deltas:
+                if 0 <= row + drow < height and 0 <= col + dcol < width:
+                    yield index + delta
+
+@lru_cache(maxsize=_KERNEL_CACHE_SIZE)
+def hex_kernel(width: int, height: int) -> HexKernel:
+    """Get the (shared) HexKernel of a map shape."""
+    return HexKernel(width, height)
 
 def hex_to_pixel(q: int, r: int, size: int) -> Tuple[float, float]:
     """Convert axial hex coordinates to pixel coordinates.
@@ -100,3 +250,44 @@ def hex_line(a: Tuple[int, int], b: Tuple[int, int]) -> List[Tuple[int, int]]:
         results.append(hex_round(q, r))
 
     return results
+
+def hex_line_steps(offset: Tuple[int, int]) -> LineSteps:
+    """Get the hexes strictly between the origin and offset, step by step.
+
+    Lines are precomputed, relative to the origin, for every offset within
+    the longest distance asked for so far, so a lookup does no float math;
+    add the line's start to each hex for absolute positions. Where a line
+    runs along an edge both hexes are listed (the line is traced nudged to
+    either side), which also makes lines symmetric.
+    """
+    steps = _line_table.get(offset)
+    if steps is None:
+        distance = hex_distance((0, 0), offset)
+        if distance <= 1:
+            return ()
+        _extend_line_table(distance)
+        steps = _line_table[offset]
+    return steps
+
+def _extend_line_table(max_range: int):
+    """Precompute the lines to all offsets up to max_range hexes away."""
+    global _line_table_range
+    for offset in hex_in_range((0, 0), max_range):
+        distance = hex_distance((0, 0), offset)
+        if distance > _line_table_range:
+            _line_table[offset] = _trace_line(offset, distance)
+    _line_table_range = max(_line_table_range, max_range)
+
+def _trace_line(offset: Tuple[int, int], distance: int) -> LineSteps:
+    """Trace the line from the origin to offset (see hex_line_steps())."""
+    steps = []
+    for i in range(1, distance):
+        t = i / distance
+        step = []
+        for sign in (1, -1):
+            hex_pos = hex_round(offset[0] * t + sign * _LINE_NUDGE[0],
+                                offset[1] * t + sign * _LINE_NUDGE[1])
+            if hex_pos not in step:
+                step.append(hex_pos)
+        steps.append(tuple(step))
+    return tuple(steps)
@@ -0,0 +1,233 @@
+"""Counters, gauges and histograms exposed in the Prometheus text format."""
+
+import math
+import threading
+from bisect import bisect_left
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+# Content type of render() output
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# Default histogram bucket upper bounds, in seconds
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Histogram bucket upper bounds for payload sizes, in bytes
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+
+Labels = Tuple[str, ...]
+
+def _format_value(value: float) -> str:
+    """Format a sample value (integers without a fraction)."""
+    if value == math.inf:
+        return '+Inf'
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+def _format_labels(names: Iterable[str], values: Iterable[str]) -> str:
+    """Format a label set as ``{name="value",...}`` (empty without labels)."""
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+def _escape(value) -> str:
+    """Escape a label value."""
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+class _Metric:
+    """A named metric family with a fixed set of label names.
+
+    Children (one per label value combination) are created on first use
+    by labels() and kept for the life of the process, so label values
+    must come from small, fixed sets (route rules, phase names), never
+    from ids.
+    """
+
+    type_name = ''
+
+    def __init__(self, name: str, documentation: str, labelnames: Labels = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[Labels, object] = {}
+        self._lock = threading.Lock()
+        if not self.labelnames:
+            # Shown (as zero) before the first observation
+            self._children[()] = self._new_child()
+
+    def labels(self, *values) -> object:
+        """Get the child for a label value combination."""
+        key = tuple(str(value) for value in values)
+        child = self._children.get(key)
+        if child is None:
+            if len(key) != len(self.labelnames):
+                raise ValueError(f'{self.name} takes labels {self.labelnames}')
+            with self._lock:
+                child = self._children.setdefault(key, self._new_child())
+        return child
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def _items(self) -> List[Tuple[Labels, object]]:
+        """Get the (label values, child) pairs, sorted."""
+        with self._lock:
+            return sorted(self._children.items())
+
+    def samples(self) -> List[Tuple[str, str, float]]:
+        """Get the (sample name, formatted labels, value) lines of the family."""
+        raise NotImplementedError
+
+    def render(self) -> List[str]:
+        """Format the family in the text exposition format."""
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.type_name}']
+        lines += [f'{name}{labels} {_format_value(value)}' for name, labels, value in self.samples()]
+        return lines
+
+class _CounterChild:
+    __slots__ = ('value', '_lock')
+
+    def __init__(self):
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1):
+        """Add to the counter."""
+        with self._lock:
+            self.value += amount
+
+class Counter(_Metric):
+    """A monotonically increasing count (name it ``..._total``)."""
+
+    type_name = 'counter'
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def inc(self, amount: float = 1):
+        """Add to the counter (of a family without labels)."""
+        self.labels().inc(amount)
+
+    def samples(self):
+        return [(self.name, _format_labels(self.labelnames, key), child.value)
+                for key, child in self._items()]
+
+class _HistogramChild:
+    __slots__ = ('bounds', 'counts', 'sum', '_lock')
+
+    def __init__(self, bounds: Tuple[float, ...]):
+        self.bounds = bounds
+        # One count per bucket (not cumulative), the last for +Inf
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        """Record one observation."""
+        bucket = bisect_left(self.bounds, value)
+        with self._lock:
+            self.counts[bucket] += 1
+            self.sum += value
+
+class Histogram(_Metric):
+    """Observations counted into fixed buckets, with their sum."""
+
+    type_name = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labelnames: Labels = (),
+                 buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames)
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value: float):
+        """Record one observation (in a family without labels)."""
+        self.labels().observe(value)
+
+    def samples(self):
+        samples = []
+        bounds = self.buckets + (math.inf,)
+        for key, child in self._items():
+            with child._lock:
+                counts = list(child.counts)
+                total = child.sum
+            cumulative = 0
+            for bound, count in zip(bounds, counts):
+                cumulative += count
+                labels = _format_labels(self.labelnames + ('le',), key + (_format_value(bound),))
+                samples.append((f'{self.name}_bucket', labels, cumulative))
+            labels = _format_labels(self.labelnames, key)
+            samples.append((f'{self.name}_sum', labels, total))
+            samples.append((f'{self.name}_count', labels, cumulative))
+        return samples
+
+class Gauge(_Metric):
+    """A value read when the metrics are collected.
+
+    The callback returns the value, or for a family with labels a
+    dictionary of label value tuples to values. Reading live state only at
+    collection time keeps gauges free for the code they describe.
+    """
+
+    type_name = 'gauge'
+
+    def __init__(self, name: str, documentation: str, callback: Callable, labelnames: Labels = ()):
+        self.callback = callback
+        super().__init__(name, documentation, labelnames)
+
+    def _new_child(self):
+        return None
+
+    def samples(self):
+        values = self.callback()
+        if not self.labelnames:
+            return [(self.name, '', values)]
+        return [(self.name, _format_labels(self.labelnames, key), value)
+                for key, value in sorted(values.items())]
+
+class MetricsRegistry:
+    """The metric families of the process, rendered together by render()."""
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric: _Metric) -> _Metric:
+        """Add a metric family (names must be unique)."""
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f'Metric already registered: {metric.name}')
+            self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Labels = ()) -> Counter:
+        """Create and register a counter."""
+        return self.register(Counter(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: Labels = (),
+                  buckets: Tuple[float, ...] = LATENCY_BUCKETS) -> Histogram:
+        """Create and register a histogram."""
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def gauge(self, name: str, documentation: str, callback: Callable,
+              labelnames: Labels = ()) -> Gauge:
+        """Create and register a gauge read through callback."""
+        return self.register(Gauge(name, documentation, callback, labelnames))
+
+    def get(self, name: str) -> Optional[_Metric]:
+        """Get a registered metric family by name."""
+        return self._metrics.get(name)
+
+    def render(self) -> str:
+        """Format every metric family in the Prometheus text format."""
+        with self._lock:
+            metrics = list(self._metrics.values())
+
+        lines = []
+        for metric in metrics:
+            lines += metric.render()
+        return '\n'.join(lines) + '\n'
+
+# Metrics of this process
+REGISTRY = MetricsRegistry()
@@ -2,63 +2,210 @@
  * API client for game server communication
  */
 
+// Event types pushed by /events
+const GAME_EVENT_TYPES = ['unit_moved', 'combat', 'city_captured', 'production_completed',
+                          'turn_changed', 'game_over', 'undo', 'redo', 'reset'];
+
 class GameAPI {
     constructor(baseUrl = '/api/game') {
         this.baseUrl = baseUrl;
+        this.gameId = null;
+    }
+
+    headers() {
+        const headers = {'Content-Type': 'application/json'};
+        if (this.gameId) {
+            headers['X-Game-Id'] = this.gameId;
+        }
+        return headers;
+    }
+
+    trackGame(data) {
+        if (data.game_id) {
+            this.gameId = data.game_id;
+        }
+        return data;
     }
 
     async newGame(width = 30, height = 20) {
         const response = await fetch(`${this.baseUrl}/new`, {
             method: 'POST',
-            headers: {'Content-Type': 'application/json'},
+            headers: this.headers(),
             body: JSON.stringify({width, height})
         });
+        return this.trackGame(await response.json());
+    }
+
+    async getState(sinceVersion = null) {
+        const query = sinceVersion === null ? '' : `?since_version=${sinceVersion}`;
+        const response = await fetch(`${this.baseUrl}/state${query}`, {
+            headers: this.headers()
+        });
         return await response.json();
     }
 
-    async getState() {
-        const response = await fetch(`${this.baseUrl}/state`);
+    /**
+     * Fetch map chunks. chunks is a list of {cx, cy, version}; chunks whose
+     * version is already current come back under `unchanged`. Without
+     * chunks, returns the chunk grid and the version of every chunk.
+     */
+    async getMapTiles(chunks = null) {
+        const query = chunks === null ? '' : '?chunks=' + chunks
+            .map(({cx, cy, version}) => version === undefined || version === null ? `${cx}:${cy}` : `${cx}:${cy}:${version}`)
+            .join(',');
+        const response = await fetch(`${this.baseUrl}/map/tiles${query}`, {
+            headers: this.headers()
+        });
         return await response.json();
     }
 
-    async moveUnit(unitId, targetHex) {
+    async moveUnit(unitId, targetHex, sinceVersion = null) {
         const response = await fetch(`${this.baseUrl}/move`, {
             method: 'POST',
-            headers: {'Content-Type': 'application/json'},
-            body: JSON.stringify({unit_id: unitId, target_hex: targetHex})
+            headers: this.headers(),
+            body: JSON.stringify({unit_id: unitId, target_hex: targetHex, since_version: sinceVersion})
         });
         return await response.json();
     }
 
-    async attack(attackerId, defenderId) {
+    async attack(attackerId, defenderId, sinceVersion = null) {
         const response = await fetch(`${this.baseUrl}/attack`, {
             method: 'POST',
-            headers: {'Content-Type': 'application/json'},
-            body: JSON.stringify({attacker_id: attackerId, defender_id: defenderId})
+            headers: this.headers(),
+            body: JSON.stringify({attacker_id: attackerId, defender_id: defenderId, since_version: sinceVersion})
+        });
+        return await response.json();
+    }
+
+    async getReachable(unitId) {
+        const response = await fetch(`${this.baseUrl}/reachable?unit_id=${encodeURIComponent(unitId)}`, {
+            headers: this.headers()
+        });
+        return await response.json();
+    }
+
+    async getAttackTargets(unitId) {
+        const response = await fetch(`${this.baseUrl}/targets?unit_id=${encodeURIComponent(unitId)}`, {
+            headers: this.headers()
+        });
+        return await response.json();
+    }
+
+    async getAttackPreview(attackerId, defenderId) {
+        const params = `attacker_id=${encodeURIComponent(attackerId)}&defender_id=${encodeURIComponent(defenderId)}`;
+        const response = await fetch(`${this.baseUrl}/attack-preview?${params}`, {
+            headers: this.headers()
         });
         return await response.json();
     }
 
-    async produceUnit(cityId, unitType) {
+    async produceUnit(cityId, unitType, sinceVersion = null) {
         const response = await fetch(`${this.baseUrl}/produce`, {
             method: 'POST',
-            headers: {'Content-Type': 'application/json'},
-            body: JSON.stringify({city_id: cityId, unit_type: unitType})
+            headers: this.headers(),
+            body: JSON.stringify({city_id: cityId, unit_type: unitType, since_version: sinceVersion})
+        });
+        return await response.json();
+    }
+
+    async endTurn(sinceVersion = null) {
+        const response = await fetch(`${this.baseUrl}/end-turn`, {
+            method: 'POST',
+            headers: this.headers(),
+            body: JSON.stringify({since_version: sinceVersion})
+        });
+        return await response.json();
+    }
+
+    /**
+     * Apply several move/attack/produce commands in one request, e.g.
+     * {op: 'move', unit_id: 'unit_3', target: [q, r]}. With atomic set a
+     * failing command rolls back the whole batch.
+     */
+    async sendCommands(commands, atomic = true, sinceVersion = null) {
+        const response = await fetch(`${this.baseUrl}/commands`, {
+            method: 'POST',
+            headers: this.headers(),
+            body: JSON.stringify({commands: commands, atomic: atomic, since_version: sinceVersion})
+        });
+        return await response.json();
+    }
+
+    async undo(sinceVersion = null) {
+        const response = await fetch(`${this.baseUrl}/undo`, {
+            method: 'POST',
+            headers: this.headers(),
+            body: JSON.stringify({since_version: sinceVersion})
         });
         return await response.json();
     }
 
-    async endTurn() {
+    async redo(sinceVersion = null) {
+        const response = await fetch(`${this.baseUrl}/redo`, {
+            method: 'POST',
+            headers: this.headers(),
+            body: JSON.stringify({since_version: sinceVersion})
+        });
+        return await response.json();
+    }
+
+    /**
+     * End the turn with the AI reply running on the server's worker pool.
+     * Resolves with the job handle; poll getAIJobResult() for the outcome.
+     */
+    async endTurnInBackground(timeBudget = null) {
         const response = await fetch(`${this.baseUrl}/end-turn`, {
-            method: 'POST'
+            method: 'POST',
+            headers: this.headers(),
+            body: JSON.stringify({background: true, time_budget: timeBudget})
+        });
+        return await response.json();
+    }
+
+    async getAIJob(jobId) {
+        const response = await fetch(`${this.baseUrl}/ai-jobs/${jobId}`, {
+            headers: this.headers()
+        });
+        return await response.json();
+    }
+
+    async getAIJobResult(jobId, sinceVersion = null) {
+        const query = sinceVersion === null ? '' : `?since_version=${sinceVersion}`;
+        const response = await fetch(`${this.baseUrl}/ai-jobs/${jobId}/result${query}`, {
+            headers: this.headers()
         });
         return await response.json();
     }
 
+    async cancelAIJob(jobId) {
+        const response = await fetch(`${this.baseUrl}/ai-jobs/${jobId}/cancel`, {
+            method: 'POST',
+            headers: this.headers()
+        });
+        return await response.json();
+    }
+
+    /**
+     * Subscribe to the server-sent events of the current game, replacing
+     * any earlier subscription. onEvent receives (type, data); a `reset`
+     * event means events were missed and the state should be reloaded.
+     * The browser reconnects (resuming after the last event) by itself.
+     */
+    subscribeEvents(onEvent) {
+        if (this.eventSource) {
+            this.eventSource.close();
+        }
+        this.eventSource = new EventSource(`${this.baseUrl}/events?game_id=${encodeURIComponent(this.gameId)}`);
+        GAME_EVENT_TYPES.forEach(type => {
+            this.eventSource.addEventListener(type, message => onEvent(type, JSON.parse(message.data)));
+        });
+        return this.eventSource;
+    }
+
     async saveGame(filename) {
         const response = await fetch(`${this.baseUrl}/save`, {
             method: 'POST',
-            headers: {'Content-Type': 'application/json'},
+            headers: this.headers(),
             body: JSON.stringify({filename})
         });
         return await response.json();
@@ -67,10 +214,10 @@ class GameAPI {
     async loadGame(filename) {
         const response = await fetch(`${this.baseUrl}/load`, {
             method: 'POST',
-            headers: {'Content-Type': 'application/json'},
+            headers: this.headers(),
             body: JSON.stringify({filename})
         });
-        return await response.json();
+        return this.trackGame(await response.json());
     }
 }
 
@@ -145,51 +145,39 @@ class InputHandler {
         }
     }
 
-    highlightOptions(unit) {
+    async highlightOptions(unit) {
         const highlighted = [];
-        const currentPlayer = this.game.gameState.current_player;
 
-        // Get all hexes and units
-        this.game.gameState.map.hexes.forEach(hex => {
-            const distance = this.manhattanDistance(
-                unit.position[0], unit.position[1],
-                hex.q, hex.r
-            );
+        // Highlight move targets (green)
+        const reachable = await gameAPI.getReachable(unit.id);
+        if (this.selectedUnit !== unit) return;
 
-            // Highlight move targets (green)
-            if (distance <= unit.movement_remaining && distance > 0) {
-                const targetUnit = this.game.getUnitAt(hex.q, hex.r);
-                if (!targetUnit) {
-                    highlighted.push({q: hex.q, r: hex.r, color: '#00FF00'});
-                }
-            }
-        });
+        if (reachable.success) {
+            reachable.reachable.forEach(hex => {
+                highlighted.push({q: hex.q, r: hex.r, color: '#00FF00'});
+            });
+        }
+
+        this.renderer.highlightHexes(highlighted);
 
         // Highlight attack targets (red)
-        this.game.gameState.units.forEach(target => {
-            if (target.owner !== currentPlayer) {
-                const distance = this.manhattanDistance(
-                    unit.position[0], unit.position[1],
-                    target.position[0], target.position[1]
-                );
-
-                if (distance <= unit.stats.range) {
-                    highlighted.push({
-                        q: target.position[0],
-                        r: target.position[1],
-                        color: '#FF0000'
-                    });
-                }
+        const response = await gameAPI.getAttackTargets(unit.id);
+        if (!response.success || this.selectedUnit !== unit) return;
+
+        response.targets.forEach(targetId => {
+            const target = this.game.gameState.units.find(u => u.id === targetId);
+            if (target) {
+                highlighted.push({
+                    q: target.position[0],
+                    r: target.position[1],
+                    color: '#FF0000'
+                });
             }
         });
 
         this.renderer.highlightHexes(highlighted);
     }
 
-    manhattanDistance(q1, r1, q2, r2) {
-        return (Math.abs(q1 - q2) + Math.abs(q1 + r1 - q2 - r2) + Math.abs(r1 - r2)) / 2;
-    }
-
     clearSelection() {
         this.selectedUnit = null;
         this.selectedCity = null;
@@ -2,6 +2,9 @@
  * Main game application
  */
 
+// How often to check on the AI's turn
+const AI_POLL_INTERVAL_MS = 250;
+
 class Game {
     constructor() {
         this.canvas = document.getElementById('game-canvas');
@@ -9,6 +12,7 @@ class Game {
         this.inputHandler = new InputHandler(this.canvas, this.renderer, this);
 
         this.gameState = null;
+        this.refreshPending = false;
 
         this.setupUI();
         this.startNewGame();
@@ -27,6 +31,25 @@ class Game {
             this.endTurn();
         });
 
+        // Undo and redo buttons, and Ctrl+Z / Ctrl+Y (or Ctrl+Shift+Z)
+        document.getElementById('undo-btn').addEventListener('click', () => {
+            this.undo('undo');
+        });
+        document.getElementById('redo-btn').addEventListener('click', () => {
+            this.undo('redo');
+        });
+        document.addEventListener('keydown', event => {
+            if (!(event.ctrlKey || event.metaKey)) return;
+            const key = event.key.toLowerCase();
+            if (key === 'z' && !event.shiftKey) {
+                event.preventDefault();
+                this.undo('undo');
+            } else if (key === 'y' || (key === 'z' && event.shiftKey)) {
+                event.preventDefault();
+                this.undo('redo');
+            }
+        });
+
         // Save game button
         document.getElementById('save-game-btn').addEventListener('click', () => {
             const filename = prompt('Enter save name:', 'savegame');
@@ -54,6 +77,7 @@ class Game {
                 this.gameState = response.state;
                 this.renderer.update(this.gameState);
                 this.updateUI();
+                this.subscribeEvents();
                 this.addLog('New game started!', 'victory');
             } else {
                 this.addLog(`Error: ${response.error}`, 'error');
@@ -66,10 +90,10 @@ class Game {
 
     async refreshState() {
         try {
-            const response = await gameAPI.getState();
+            const response = await gameAPI.getState(this.currentVersion());
 
             if (response.success) {
-                this.gameState = response.state;
+                this.applyDelta(response.delta);
                 this.renderer.update(this.gameState);
                 this.updateUI();
 
@@ -102,10 +126,21 @@ class Game {
         try {
             this.addLog('Ending turn...', 'neutral');
 
-            const response = await gameAPI.endTurn();
+            const job = await gameAPI.endTurnInBackground();
+            if (!job.success) {
+                this.addLog(`Error: ${job.error}`, 'error');
+                return;
+            }
+
+            // The AI plays on the server; wait for it without holding a request open
+            let response = await gameAPI.getAIJobResult(job.job.job_id, this.currentVersion());
+            while (response.success && !response.done) {
+                await new Promise(resolve => setTimeout(resolve, AI_POLL_INTERVAL_MS));
+                response = await gameAPI.getAIJobResult(job.job.job_id, this.currentVersion());
+            }
 
             if (response.success) {
-                this.gameState = response.state;
+                this.applyDelta(response.delta);
                 this.renderer.update(this.gameState);
                 this.updateUI();
                 this.addLog(`Turn ${this.gameState.turn} - Your turn`, 'neutral');
@@ -121,6 +156,28 @@ class Game {
         }
     }
 
+    /**
+     * Take back ('undo') or replay ('redo') the last command.
+     */
+    async undo(op) {
+        try {
+            const version = this.currentVersion();
+            const response = op === 'undo' ? await gameAPI.undo(version) : await gameAPI.redo(version);
+
+            if (response.success) {
+                this.applyDelta(response.delta);
+                this.renderer.update(this.gameState);
+                this.updateUI();
+                this.addLog(response.message, 'neutral');
+            } else {
+                this.addLog(response.message || `Error: ${response.error}`, 'error');
+            }
+        } catch (error) {
+            this.addLog(`Failed to ${op}: ${error.message}`, 'error');
+            console.error(error);
+        }
+    }
+
     async saveGame(filename) {
         try {
             const response = await gameAPI.saveGame(filename);
@@ -143,6 +200,7 @@ class Game {
                 this.gameState = response.state;
                 this.renderer.update(this.gameState);
                 this.updateUI();
+                this.subscribeEvents();
                 this.addLog('Game loaded successfully', 'production');
             } else {
                 this.addLog(`Load failed: ${response.error}`, 'error');
@@ -152,6 +210,65 @@ class Game {
         }
     }
 
+    subscribeEvents() {
+        gameAPI.subscribeEvents((type, event) => {
+            if (type === 'city_captured' && event.owner !== 'player1') {
+                this.addLog('Enemy captured one of our cities!', 'combat');
+            } else if (type === 'production_completed' && event.owner === 'player1') {
+                this.addLog(`Production complete: ${event.unit_type}`, 'production');
+            }
+            this.scheduleRefresh(event.version);
+        });
+    }
+
+    scheduleRefresh(version) {
+        // Several events usually arrive for one version; fetch it once
+        const current = this.currentVersion();
+        if ((current !== null && version <= current) || this.refreshPending) {
+            return;
+        }
+
+        this.refreshPending = true;
+        setTimeout(async () => {
+            this.refreshPending = false;
+            await this.refreshState();
+        }, 0);
+    }
+
+    currentVersion() {
+        return this.gameState ? this.gameState.version : null;
+    }
+
+    applyDelta(delta) {
+        if (delta.full) {
+            this.gameState = delta.state;
+            return;
+        }
+
+        const state = this.gameState;
+
+        const units = new Map(state.units.map(unit => [unit.id, unit]));
+        delta.removed_units.forEach(id => units.delete(id));
+        delta.units.forEach(unit => units.set(unit.id, unit));
+        state.units = Array.from(units.values());
+
+        const cities = new Map(state.cities.map(city => [city.id, city]));
+        delta.cities.forEach(city => cities.set(city.id, city));
+        state.cities = Array.from(cities.values());
+
+        if (delta.hexes.length > 0) {
+            const hexes = new Map(delta.hexes.map(hex => [`${hex.q},${hex.r}`, hex]));
+            state.map.hexes = state.map.hexes.map(hex => hexes.get(`${hex.q},${hex.r}`) || hex);
+        }
+
+        ['turn', 'current_player', 'resources', 'game_over', 'winner'].forEach(key => {
+            if (key in delta) {
+                state[key] = delta[key];
+            }
+        });
+        state.version = delta.version;
+    }
+
     updateUI() {
         if (!this.gameState) return;
 
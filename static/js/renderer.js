@@ -95,8 +95,11 @@ class HexRenderer {
         this.gameState.map.hexes.forEach(hex => {
             const pixel = this.hexToPixel(hex.q, hex.r);
 
-            // Draw terrain
+            // Draw terrain, shaded where the player does not see
             spriteManager.drawTerrain(this.ctx, hex.terrain, pixel.x, pixel.y, this.hexSize);
+            if (hex.visible === false) {
+                spriteManager.drawFog(this.ctx, pixel.x, pixel.y, this.hexSize);
+            }
 
             // Draw grid
             spriteManager.drawHexOutline(this.ctx, pixel.x, pixel.y, this.hexSize);
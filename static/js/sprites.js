@@ -147,6 +147,14 @@ class SpriteManager {
         ctx.fill();
     }
 
+    /**
+     * Shade a hex the player does not see (fog of war)
+     */
+    drawFog(ctx, x, y, size) {
+        ctx.fillStyle = 'rgba(0, 0, 0, 0.5)';
+        this.drawHexagon(ctx, x, y, size);
+    }
+
     /**
      * Draw hex outline
      */